@@ -0,0 +1,170 @@
+"""
+Benchmark: Tribute subscriber list, whole‑body ``response.json()`` vs streaming.
+
+A local HTTP stub serves a synthetic subscriber list (100 000 entries by
+default, optionally split into cursor pages).  For each approach the
+script reports wall time and peak Python memory (tracemalloc) of:
+
+* a point lookup of a user near the start, in the middle, at the end
+  and of a user who is not in the list;
+* a full mirror sync into a temporary database.
+
+Usage::
+
+    python bench_tribute.py [--entries 100000] [--page-size 0] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from bot import config, database, tribute
+
+
+def make_pages(entries: int, page_size: int) -> Dict[Optional[str], bytes]:
+    expire_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 86400))
+    result = [
+        {
+            "id": n,
+            "telegramUserId": 10_000_000 + n,
+            "status": "active" if n % 10 else "cancelled",
+            "expireAt": expire_at,
+            "createdAt": "2024-01-01T00:00:00Z",
+            "subscription": {"id": 42, "name": "Book club", "period": "monthly", "price": 500},
+        }
+        for n in range(entries)
+    ]
+    if page_size <= 0:
+        return {None: json.dumps({"result": result}).encode()}
+    pages: Dict[Optional[str], bytes] = {}
+    for start in range(0, entries, page_size):
+        cursor = None if start == 0 else str(start)
+        following = start + page_size
+        pages[cursor] = json.dumps({
+            "result": result[start:following],
+            "nextCursor": str(following) if following < entries else None,
+        }).encode()
+    return pages
+
+
+def start_stub(pages: Dict[Optional[str], bytes]) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            cursor = parse_qs(urlsplit(self.path).query).get("cursor", [None])[0]
+            body = pages[cursor]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                for i in range(0, len(body), 65536):
+                    self.wfile.write(body[i:i + 65536])
+            except OSError:
+                pass  # the client stopped reading early
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def json_lookup(telegram_user_id: int) -> int:
+    """The old approach: download and decode everything, then scan."""
+    url: Optional[str] = config.TRIBUTE_API_URL
+    best = 0
+    while url:
+        response = requests.get(url, headers={"Api-Key": config.TRIBUTE_API_KEY}, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        for user_id, status, expire_at in tribute._entries(data.get("result", [])):
+            if user_id == telegram_user_id and tribute.is_active(status, expire_at):
+                best = max(best, expire_at)
+        url = tribute._next_page_url(url, data)
+    return best
+
+
+def json_sync() -> int:
+    url: Optional[str] = config.TRIBUTE_API_URL
+    entries = []
+    while url:
+        response = requests.get(url, headers={"Api-Key": config.TRIBUTE_API_KEY}, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        entries.extend(tribute._entries(data.get("result", [])))
+        url = tribute._next_page_url(url, data)
+    return database.sync_tribute_subscribers(entries, int(time.time()))[0]
+
+
+def streaming_sync() -> int:
+    status = tribute.sync()
+    if status["last_error"]:
+        raise RuntimeError(status["last_error"])
+    return status["count"]
+
+
+def measure(func: Callable[[], object], repeat: int) -> tuple[float, float]:
+    """Return (best wall time in ms, peak traced memory in MiB)."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=0, help="entries per page, 0 = one page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = make_pages(args.entries, args.page_size)
+    server = start_stub(pages)
+    tmp = tempfile.TemporaryDirectory()
+    config.TRIBUTE_API_URL = f"http://127.0.0.1:{server.server_port}/api/v1/subscribers"
+    config.DB_FILE = os.path.join(tmp.name, "bench.db")
+    database.init_db()
+    size = sum(len(body) for body in pages.values())
+    print(f"{args.entries} entries, {len(pages)} page(s), {size / 2**20:.1f} MiB of JSON\n")
+
+    # Every tenth entry is cancelled, so pick active users.
+    targets = {
+        "lookup, user at 1%": 10_000_000 + args.entries // 100 + 1,
+        "lookup, user at 50%": 10_000_000 + args.entries // 2 + 1,
+        "lookup, last user": 10_000_000 + args.entries - 1,
+        "lookup, unknown user": 1,
+    }
+    print(f"{'case':<24} {'json() ms':>10} {'MiB':>7} {'stream ms':>10} {'MiB':>7}")
+    for label, uid in targets.items():
+        old = measure(lambda: json_lookup(uid), args.repeat)
+        new = measure(lambda: tribute.lookup_upstream(uid), args.repeat)
+        print(f"{label:<24} {old[0]:>10.1f} {old[1]:>7.1f} {new[0]:>10.1f} {new[1]:>7.1f}")
+    old = measure(json_sync, args.repeat)
+    new = measure(streaming_sync, args.repeat)
+    print(f"{'full sync':<24} {old[0]:>10.1f} {old[1]:>7.1f} {new[0]:>10.1f} {new[1]:>7.1f}")
+
+    database.close_connections()
+    server.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
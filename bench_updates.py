@@ -0,0 +1,124 @@
+"""
+Benchmark: sequential vs concurrent, chat‑ordered update processing.
+
+Feeds synthetic updates from many chats into a real ``Application``
+(Bot API calls are answered locally, no network) whose only handler
+simulates work: a few milliseconds of awaiting for most updates, and a
+long wait — like ``/start`` waiting on Tribute — for a small fraction.
+For each mode the script reports throughput and the p50/p99 latency
+from putting an update on the queue to its handler finishing, and
+checks that each chat's updates were handled in order.
+
+* ``sequential`` — the ``Application`` default, one update at a time;
+* ``concurrent`` — ``ChatOrderedUpdateProcessor(--concurrency)``.
+
+Usage::
+
+    python bench_updates.py [--updates 2000] [--chats 200] [--concurrency 64]
+                            [--work-ms 2] [--slow-ms 500] [--slow-fraction 0.01]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+from bot.updateprocessor import ChatOrderedUpdateProcessor
+
+
+class OfflineRequest(BaseRequest):
+    """Answers the Bot API calls made by ``Application.initialize`` locally."""
+
+    @property
+    def read_timeout(self) -> float:
+        return 1.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        result = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bench_bot"}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def make_updates(count: int, chats: int, seed: int = 1) -> List[Update]:
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(count):
+        chat_id = rng.randrange(1, chats + 1)
+        message = Message(update_id, None, Chat(chat_id, "private"), from_user=User(chat_id, "U", False), text="/start")
+        updates.append(Update(update_id, message=message))
+    return updates
+
+
+async def run_mode(concurrency: int, updates: List[Update], args: argparse.Namespace) -> Dict[str, float]:
+    builder = Application.builder().token("1:BENCH").request(OfflineRequest()).get_updates_request(OfflineRequest())
+    if concurrency > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+    application = builder.build()
+    rng = random.Random(2)
+    delays = {u.update_id: (args.slow_ms if rng.random() < args.slow_fraction else args.work_ms) / 1000 for u in updates}
+    queued: Dict[int, float] = {}
+    latencies: List[float] = []
+    order: Dict[int, List[int]] = {}
+    done = asyncio.Event()
+
+    async def handle(update: Update, context) -> None:
+        order.setdefault(update.effective_chat.id, []).append(update.update_id)
+        await asyncio.sleep(delays[update.update_id])
+        latencies.append(time.perf_counter() - queued[update.update_id])
+        if len(latencies) == len(updates):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, handle))
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in updates:
+            queued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    for ids in order.values():
+        assert ids == sorted(ids), "updates of a chat were handled out of order"
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return {"rps": len(updates) / elapsed, "p50": pick(0.50), "p99": pick(0.99), "seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--work-ms", type=float, default=2)
+    parser.add_argument("--slow-ms", type=float, default=500)
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--modes", default="sequential,concurrent")
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates, args.chats)
+    print(f"{args.updates} updates from {args.chats} chats, {args.work_ms:g} ms of work each, "
+          f"{args.slow_fraction:.0%} waiting {args.slow_ms:g} ms\n")
+    print(f"{'mode':<12} {'updates/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'total s':>8}")
+    for mode in args.modes.split(","):
+        concurrency = 1 if mode == "sequential" else args.concurrency
+        result = asyncio.run(run_mode(concurrency, updates, args))
+        print(f"{mode:<12} {result['rps']:>10.0f} {result['p50']:>9.1f} {result['p99']:>9.1f} {result['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
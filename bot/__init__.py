@@ -7,7 +7,23 @@ associated web server.  See `main.py` for the entry point.
 
 __all__ = [
     "config",
+    "metrics",
     "database",
+    "catalog",
+    "async_database",
     "server",
+    "ratelimit",
+    "session",
+    "web",
+    "webhook",
+    "compression",
+    "assets",
     "handlers",
+    "updateprocessor",
+    "persistence",
+    "importer",
+    "httpclient",
+    "jsonstream",
+    "tribute",
+    "verifier",
 ]
\ No newline at end of file
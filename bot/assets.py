@@ -0,0 +1,210 @@
+"""
+Build‑time precompression of the web app's static files.
+
+``python -m bot.assets [webapp/dist]`` (run by ``build.sh``) writes a
+``.gz`` and, if the optional ``brotli`` package is installed, a ``.br``
+sibling next to every text asset, at maximum compression.
+:class:`Manifest` indexes the built directory once at startup and serves
+the best sibling the client accepts, from memory for small files, so
+static files are never compressed or looked up on disk per request.
+Content‑hashed files are cached by browsers forever; everything else,
+``index.html`` included, is revalidated against a strong ETag.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from flask import Response, abort, current_app, request, send_file
+
+from . import compression, config
+
+# File extension of the precompressed sibling for each encoding.
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Assets worth precompressing.
+EXTENSIONS = frozenset({
+    ".html", ".js", ".mjs", ".css", ".svg", ".json", ".map", ".txt", ".xml", ".ico", ".webmanifest",
+})
+
+
+def _compress_max(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return compression.brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress(directory: str, min_size: Optional[int] = None) -> List[str]:
+    """Write compressed siblings of the assets under ``directory``.
+
+    Only files of at least ``min_size`` bytes (default
+    ``config.COMPRESS_MIN_SIZE``) whose compressed form is actually
+    smaller get a sibling; outdated siblings are removed.  Returns the
+    paths written.
+    """
+    if min_size is None:
+        min_size = config.COMPRESS_MIN_SIZE
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as fh:
+                data = fh.read()
+            for encoding in compression.available_encodings():
+                target = path + SUFFIXES[encoding]
+                compressed = _compress_max(data, encoding) if len(data) >= min_size else data
+                if len(compressed) >= len(data):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, "wb") as fh:
+                    fh.write(compressed)
+                stat = os.stat(path)
+                os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                written.append(target)
+    return written
+
+
+# Vite writes content‑hashed files (``assets/index-BqK3x9aZ.js``) to its
+# assets directory; their URL changes whenever their content does.
+HASHED_NAME = re.compile(r"^assets/.+[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+
+
+class Asset(NamedTuple):
+    """One file of the manifest (a static file or a compressed sibling)."""
+
+    path: str
+    size: int
+    mtime: float
+    mimetype: str
+    etag: str
+    data: Optional[bytes]
+    variants: Dict[str, "Asset"]
+    immutable: bool
+
+
+def _load_asset(directory: str, path: str, mimetype: str, immutable: bool) -> Asset:
+    full = os.path.join(directory, path)
+    with open(full, "rb") as fh:
+        data = fh.read()
+    stat = os.stat(full)
+    return Asset(
+        path=path,
+        size=len(data),
+        mtime=stat.st_mtime,
+        mimetype=mimetype,
+        etag=hashlib.sha256(data).hexdigest()[:20],
+        data=data if len(data) <= config.STATIC_PRELOAD_MAX else None,
+        variants={},
+        immutable=immutable,
+    )
+
+
+class Manifest:
+    """Index of a built web app directory, scanned once.
+
+    Requests are answered from the index: unknown paths fall back to
+    ``index.html`` without a filesystem lookup, and files of up to
+    ``config.STATIC_PRELOAD_MAX`` bytes are served from memory.  A new
+    build needs a restart (or ``kill -HUP`` of gunicorn) to be picked up.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        sibling_suffixes = tuple(SUFFIXES.values())
+        for root, _, files in os.walk(directory):
+            for name in files:
+                full = os.path.join(root, name)
+                path = os.path.relpath(full, directory).replace(os.sep, "/")
+                if path.endswith(sibling_suffixes):
+                    continue
+                mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                asset = _load_asset(directory, path, mimetype, bool(HASHED_NAME.match(path)))
+                for encoding, suffix in SUFFIXES.items():
+                    sibling = full + suffix
+                    # Skip siblings left over from an older build.
+                    if os.path.isfile(sibling) and os.stat(sibling).st_mtime_ns >= os.stat(full).st_mtime_ns:
+                        variant = _load_asset(directory, path + suffix, mimetype, asset.immutable)
+                        asset.variants[encoding] = variant._replace(etag=f"{asset.etag}-{encoding}")
+                self.assets[path] = asset
+        self.index = self.assets.get("index.html")
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        """The asset for ``path``, ``index.html`` for unknown paths."""
+        return self.assets.get(path, self.index)
+
+    def send(self, path: str) -> Response:
+        """Build the response for ``path``, honouring ``If-None-Match``."""
+        asset = self.lookup(path)
+        if asset is None:
+            abort(404)
+        encoding = compression.negotiate(request, list(asset.variants)) if asset.variants else None
+        chosen = asset.variants[encoding] if encoding else asset
+        etag = chosen.etag
+        # Any representation the client holds is still current; keep its
+        # validator.
+        matched = next(
+            (tag for tag in compression.etag_variants(asset.etag) if request.if_none_match.contains(tag)),
+            None,
+        )
+        if matched is not None:
+            response = current_app.response_class(status=304)
+            etag = matched
+        elif chosen.data is not None:
+            response = current_app.response_class(chosen.data, mimetype=asset.mimetype)
+        else:
+            response = send_file(
+                os.path.join(self.directory, chosen.path),
+                mimetype=asset.mimetype,
+                conditional=False,
+                etag=False,
+                max_age=None,
+            )
+        if encoding and response.status_code == 200:
+            response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.last_modified = asset.mtime
+        response.headers["Cache-Control"] = (
+            config.STATIC_IMMUTABLE_CACHE_CONTROL if asset.immutable else config.STATIC_CACHE_CONTROL
+        )
+        if asset.variants or os.path.splitext(path)[1].lower() in EXTENSIONS:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+_manifests: Dict[str, Manifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def load_manifest(directory: str) -> Manifest:
+    """The manifest of ``directory``, scanned on first use."""
+    manifest = _manifests.get(directory)
+    if manifest is None:
+        with _manifests_lock:
+            manifest = _manifests.get(directory)
+            if manifest is None:
+                manifest = _manifests[directory] = Manifest(directory)
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompress the web app's static files.")
+    default = os.path.join(os.path.dirname(os.path.dirname(__file__)), "webapp", "dist")
+    parser.add_argument("directory", nargs="?", default=default)
+    args = parser.parse_args()
+    written = precompress(args.directory)
+    print(f"Precompressed {len(written)} files ({', '.join(compression.available_encodings())})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Asynchronous facade over the database layer for the bot handlers.
+
+SQLite calls block, and a write waits for an fsync, so calling
+``database`` functions directly from an ``async def`` handler stalls the
+python‑telegram‑bot event loop for every user.  The coroutines in this
+module have the same names and arguments as their ``database``
+counterparts but run them on a small, bounded thread pool, so the event
+loop keeps serving other updates while a query runs.  Writes are still
+serialised by the database layer itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from . import config, database
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.DB_EXECUTOR_WORKERS, thread_name_prefix="db"
+                )
+    return _executor
+
+
+async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking database‑bound callable on the database thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    """Stop the thread pool after pending calls finish.  It restarts on demand."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+async def init_db() -> None:
+    await run(database.init_db)
+
+
+async def get_books_summary(
+    include_chapters: bool = False, after: int = 0, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    return await run(database.get_books_summary, include_chapters, after, limit)
+
+
+async def get_book_detail(book_id: int) -> Optional[Dict[str, Any]]:
+    return await run(database.get_book_detail, book_id)
+
+
+async def get_chapter_detail(book_id: int, chapter_id: int) -> Optional[Dict[str, Any]]:
+    return await run(database.get_chapter_detail, book_id, chapter_id)
+
+
+async def get_chapter_page(book_id: int, chapter_id: int, page: int) -> Optional[Dict[str, Any]]:
+    return await run(database.get_chapter_page, book_id, chapter_id, page)
+
+
+async def add_book(title: str, description: str, cover_url: Optional[str]) -> int:
+    return await run(database.add_book, title, description, cover_url)
+
+
+async def add_chapter(book_id: int, title: str, content: str) -> int:
+    return await run(database.add_chapter, book_id, title, content)
+
+
+async def add_chapters(
+    book_id: int,
+    chapters: Iterable[tuple[str, str]],
+    progress: Optional[Callable[[int], None]] = None,
+    batch_size: int = 50,
+) -> List[int]:
+    return await run(database.add_chapters, book_id, chapters, progress, batch_size)
+
+
+async def search(query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    return await run(database.search, query, limit, offset)
+
+
+async def add_allowed_user(user_id: int) -> None:
+    await run(database.add_allowed_user, user_id)
+
+
+async def is_allowed_user(user_id: int) -> bool:
+    return await run(database.is_allowed_user, user_id)
+
+
+async def get_bot_persistence(kind: str, key: Optional[str] = None) -> Dict[str, str]:
+    return await run(database.get_bot_persistence, kind, key)
+
+
+async def save_bot_persistence(changes: Iterable[tuple[str, str, Optional[str]]]) -> None:
+    await run(database.save_bot_persistence, list(changes))
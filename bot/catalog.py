@@ -0,0 +1,160 @@
+"""
+In‑memory read model of the book catalog.
+
+The catalog is tiny compared with the number of requests for it, so
+instead of querying and serialising it on every ``/api/books`` or
+``/api/book/<id>`` call the whole of it is kept as a :class:`Snapshot`
+with compact per‑book records and pre‑encoded JSON bytes.  Snapshots
+are immutable; a new one is built after every committed catalog change
+in this process (see ``database.add_catalog_listener``) and swapped in
+with a single reference assignment.  :func:`current` also compares the
+snapshot with the catalog version in the database, so changes made by
+another process are picked up on the next request.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from . import config, database, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BookRecord(NamedTuple):
+    """What the bot and the validators need to know about a book."""
+
+    id: int
+    title: str
+    revision: int
+    chapter_count: int
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _join(items: List[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+class Snapshot:
+    """Immutable catalog state at one ``catalog_version``."""
+
+    __slots__ = (
+        "version",
+        "db_file",
+        "books",
+        "_ids",
+        "_by_id",
+        "_summaries",
+        "_summaries_with_chapters",
+        "_list",
+        "_list_with_chapters",
+        "_details",
+    )
+
+    def __init__(self, version: int, db_file: str, books: List[Dict[str, Any]]) -> None:
+        self.version = version
+        self.db_file = db_file
+        self.books = tuple(
+            BookRecord(book["id"], book["title"], book["revision"], book["chapter_count"])
+            for book in books
+        )
+        self._ids = [record.id for record in self.books]
+        self._by_id = {record.id: record for record in self.books}
+        summary_keys = ("id", "title", "description", "cover_url", "chapter_count")
+        self._summaries = []
+        self._summaries_with_chapters = []
+        self._details: Dict[int, bytes] = {}
+        for book in books:
+            summary = {key: book[key] for key in summary_keys}
+            self._summaries.append(_encode(summary))
+            summary["chapters"] = book["chapters"]
+            self._summaries_with_chapters.append(_encode(summary))
+            detail = dict(book)
+            del detail["chapter_count"]
+            self._details[book["id"]] = _encode(detail)
+        self._list = _join(self._summaries)
+        self._list_with_chapters = _join(self._summaries_with_chapters)
+
+    def book(self, book_id: int) -> Optional[BookRecord]:
+        return self._by_id.get(book_id)
+
+    def book_json(self, book_id: int) -> Optional[bytes]:
+        """Return the ``/api/book/<id>`` body or None if there is no such book."""
+        return self._details.get(book_id)
+
+    def books_json(
+        self, include_chapters: bool = False, after: int = 0, limit: Optional[int] = None
+    ) -> tuple[bytes, List[int]]:
+        """Return an ``/api/books`` body and the IDs of the books in it.
+
+        Same pagination as ``database.get_books_summary``.  The full list
+        is returned without any copying.
+        """
+        start = bisect.bisect_right(self._ids, after)
+        end = len(self._ids) if limit is None else min(len(self._ids), start + limit)
+        if start == 0 and end == len(self._ids):
+            body = self._list_with_chapters if include_chapters else self._list
+        else:
+            parts = self._summaries_with_chapters if include_chapters else self._summaries
+            body = _join(parts[start:end])
+        return body, self._ids[start:end]
+
+
+_snapshot: Optional[Snapshot] = None
+_build_lock = threading.Lock()
+
+
+def _build() -> Snapshot:
+    version, books = database.get_catalog()
+    return Snapshot(version, config.DB_FILE, books)
+
+
+def current() -> Snapshot:
+    """Return an up‑to‑date snapshot, rebuilding it if the catalog changed.
+
+    The check costs one lookup of the catalog version; concurrent callers
+    that find the snapshot outdated wait for a single rebuild.
+    """
+    version = database.get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version and snapshot.db_file == config.DB_FILE:
+        metrics.CACHE_REQUESTS.inc("catalog_snapshot", "hit")
+        return snapshot
+    metrics.CACHE_REQUESTS.inc("catalog_snapshot", "miss")
+    return refresh(version)
+
+
+def refresh(min_version: Optional[int] = None) -> Snapshot:
+    """Rebuild the snapshot unless one at least ``min_version`` is already in place."""
+    global _snapshot
+    with _build_lock:
+        snapshot = _snapshot
+        if (
+            min_version is not None
+            and snapshot is not None
+            and snapshot.db_file == config.DB_FILE
+            and snapshot.version >= min_version
+        ):
+            return snapshot
+        snapshot = _snapshot = _build()
+    return snapshot
+
+
+def _on_catalog_change() -> None:
+    # Runs in the writer's thread right after the commit; a failure here
+    # must not turn a successful write into an error.  current() will
+    # rebuild on the next request anyway.
+    try:
+        refresh()
+    except Exception:
+        logger.exception("Failed to rebuild the catalog snapshot")
+
+
+database.add_catalog_listener(_on_catalog_change)
@@ -0,0 +1,136 @@
+"""
+Content negotiation and compression of HTTP responses.
+
+:func:`init_app` installs an ``after_request`` hook that compresses
+API responses larger than ``config.COMPRESS_MIN_SIZE`` with brotli (if
+the optional ``brotli`` package is installed and the client accepts it)
+or gzip.  Responses with a strong ETag are cached in compressed form,
+keyed by request path and query, ETag and encoding, so repeat requests
+for the same catalog, book or chapter are not compressed again.  The ETag of a compressed
+response gets a ``-gzip``/``-br`` suffix, as a different representation
+must not share a strong validator with the uncompressed one.
+
+Static files of the web app are compressed at build time instead; see
+``assets.py``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from flask import Flask, Request, Response, request
+
+from . import config, metrics
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Media types worth compressing; images and archives already are.
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+    "image/svg+xml",
+})
+
+
+def available_encodings() -> tuple[str, ...]:
+    """Encodings this server can produce, best first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(req: Request, offered: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Pick the best encoding from ``offered`` that the client accepts, or None."""
+    for encoding in available_encodings() if offered is None else offered:
+        if req.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=config.COMPRESS_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=config.COMPRESS_GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding!r}")
+
+
+def etag_variants(etag: str) -> tuple[str, ...]:
+    """The ETag of every representation of a resource with base tag ``etag``."""
+    return (etag,) + tuple(f"{etag}-{encoding}" for encoding in available_encodings())
+
+
+class _CompressedCache:
+    """Small LRU of compressed bodies keyed by ``(full path, strong etag, encoding)``."""
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple[str, str, str], bytes]" = OrderedDict()
+
+    def get(self, key: tuple[str, str, str]) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: tuple[str, str, str], data: bytes) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+def _compress_response(response: Response, cache: _CompressedCache) -> Response:
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < config.COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate(request)
+    if encoding is None:
+        return response
+    etag, weak = response.get_etag()
+    # The ETag alone does not have to tell the query variants of a URL apart.
+    key = (request.full_path, etag, encoding)
+    compressed = cache.get(key) if etag and not weak else None
+    metrics.CACHE_REQUESTS.inc("compressed_body", "miss" if compressed is None else "hit")
+    if compressed is None:
+        compressed = compress(body, encoding)
+        if etag and not weak:
+            cache.put(key, compressed)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Compress eligible responses of ``app`` according to Accept-Encoding."""
+    cache = _CompressedCache(config.COMPRESS_CACHE_ENTRIES)
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        return _compress_response(response, cache)
@@ -35,4 +35,200 @@ SERVER_URL = "https://regal-salamander-db6185.netlify.app/"
 # Path to the SQLite database.  The database stores books, chapters and
 # allowed subscribers.  It is created automatically on first run.
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-DB_FILE = os.path.join(BASE_DIR, "app.db")
\ No newline at end of file
+DB_FILE = os.environ.get("DB_FILE", os.path.join(BASE_DIR, "app.db"))
+
+# SQLite tuning.  Connections are pooled and kept open for the lifetime
+# of the process (see ``database.py``).  The database runs in WAL mode so
+# readers never block the single writer.  ``DB_CACHE_SIZE_KB`` is the
+# page cache per connection and ``DB_MMAP_SIZE`` the number of bytes
+# mapped into memory (0 disables memory mapping).
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", "8"))
+DB_STATEMENT_CACHE = int(os.environ.get("DB_STATEMENT_CACHE", "256"))
+
+# What ``python -m bot.main`` runs when no mode is given: ``all`` (bot
+# and web server), ``bot`` or ``web``.  Running the bot and the web
+# server as separate services lets each be restarted on its own.
+RUN_MODE = os.environ.get("RUN_MODE", "all")
+
+# Telegram webhook (see ``webhook.py``).  With ``WEBHOOK_URL`` set to the
+# public HTTPS address of the webhook (e.g.
+# ``https://example.com/telegram/webhook``) the bot registers it with
+# Telegram and receives updates on ``WEBHOOK_HOST``:``WEBHOOK_PORT``
+# instead of long polling; nginx forwards the URL's path there.  Telegram
+# sends ``WEBHOOK_SECRET`` (by default derived from the bot token) with
+# every update and uses up to ``WEBHOOK_MAX_CONNECTIONS`` connections.
+# If Telegram refuses the webhook, the bot falls back to polling.
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# How many Telegram updates the bot handles at the same time (see
+# ``updateprocessor.py``).  Updates from the same chat are always
+# handled one after another; 1 handles all updates sequentially.
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "64"))
+
+# Bot state persistence (see ``persistence.py``).  Conversations and
+# ``user_data``/``chat_data``/``bot_data`` survive restarts: changes are
+# written to the database in one transaction every
+# ``PERSISTENCE_INTERVAL`` seconds and at shutdown.
+PERSISTENCE_ENABLED = os.environ.get("PERSISTENCE_ENABLED", "1").lower() not in {"0", "false", "no"}
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "10"))
+
+# Web server.  In production the Flask app runs under gunicorn with
+# ``WEB_WORKERS`` processes of ``WEB_THREADS`` threads each; all of them
+# read the SQLite database concurrently.  Idle keep‑alive connections
+# are held for ``WEB_KEEPALIVE`` seconds, a request may take up to
+# ``WEB_TIMEOUT`` seconds, and on shutdown workers get
+# ``WEB_GRACEFUL_TIMEOUT`` seconds to finish the requests in progress.
+WEB_HOST = os.environ.get("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.environ.get("WEB_PORT", "8000"))
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "0")) or (os.cpu_count() or 1) * 2 + 1
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "4"))
+WEB_KEEPALIVE = int(os.environ.get("WEB_KEEPALIVE", "5"))
+WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", "30"))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+
+# Metrics (see ``metrics.py``), served at ``/metrics``.  The bot and the
+# web workers publish their metrics in ``METRICS_DIR`` every
+# ``METRICS_FLUSH_INTERVAL`` seconds so that ``/metrics`` covers all of
+# them.  When empty, ``python -m bot.main`` creates a temporary
+# directory; set it to the same path for ``bot`` and ``web`` services
+# that run separately.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in {"0", "false", "no"}
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+
+# Bearer token for the operator endpoints, ``/metrics`` and
+# ``/api/tribute/status``.  They reveal latencies, error messages and
+# process details, so while it is empty they answer 404.
+OPERATOR_TOKEN = os.environ.get("OPERATOR_TOKEN", "")
+
+# Token‑bucket rate limits (see ``ratelimit.py``): a steady rate in
+# requests per second plus a burst allowance.  Every API request counts
+# against the client IP's ``API`` bucket; ``/api/verify`` also against
+# the stricter ``VERIFY`` buckets of the IP and of the user id asked
+# about.  ``/start`` and ``/catalog`` are limited per Telegram user.
+# With ``RATE_LIMIT_BACKEND=memory`` each web worker counts on its own;
+# ``sqlite`` shares the buckets between workers through
+# ``RATE_LIMIT_DB``.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1").lower() not in {"0", "false", "no"}
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB", os.path.join(BASE_DIR, "ratelimit.db"))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_API_RATE = float(os.environ.get("RATE_LIMIT_API_RATE", "20"))
+RATE_LIMIT_API_BURST = float(os.environ.get("RATE_LIMIT_API_BURST", "100"))
+RATE_LIMIT_VERIFY_RATE = float(os.environ.get("RATE_LIMIT_VERIFY_RATE", "0.5"))
+RATE_LIMIT_VERIFY_BURST = float(os.environ.get("RATE_LIMIT_VERIFY_BURST", "10"))
+RATE_LIMIT_COMMAND_RATE = float(os.environ.get("RATE_LIMIT_COMMAND_RATE", "0.2"))
+RATE_LIMIT_COMMAND_BURST = float(os.environ.get("RATE_LIMIT_COMMAND_BURST", "5"))
+
+# Web app sessions (see ``session.py``).  ``/api/session`` exchanges the
+# Telegram ``initData`` (accepted for ``INIT_DATA_MAX_AGE`` seconds after
+# Telegram signed it) for a token valid for ``SESSION_TTL`` seconds or
+# until the subscription ends, whichever is sooner.  Tokens are signed
+# with ``SESSION_SECRET``, by default derived from the bot token.  With
+# ``SESSION_REQUIRED`` off, content endpoints do not ask for a token.
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "")
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "3600"))
+INIT_DATA_MAX_AGE = int(os.environ.get("INIT_DATA_MAX_AGE", "86400"))
+SESSION_REQUIRED = os.environ.get("SESSION_REQUIRED", "1").lower() not in {"0", "false", "no"}
+
+# Number of reverse proxies (nginx) in front of the web server whose
+# ``X-Forwarded-For`` can be trusted for the client IP.  Leave at 0 when
+# clients connect directly, or the header can be forged.
+WEB_PROXY_COUNT = int(os.environ.get("WEB_PROXY_COUNT", "0"))
+
+# Upper bound for the ``limit`` parameter of the paginated catalog API.
+CATALOG_PAGE_MAX = int(os.environ.get("CATALOG_PAGE_MAX", "200"))
+
+# ``Cache-Control`` sent with catalog, book and chapter JSON.  Responses
+# carry strong ETags, so with the default the browser keeps a copy but
+# revalidates it on every use and gets a bodyless 304 if nothing changed.
+API_CACHE_CONTROL = os.environ.get("API_CACHE_CONTROL", "no-cache")
+
+# API responses of at least ``COMPRESS_MIN_SIZE`` bytes are compressed
+# with brotli (if the optional ``brotli`` package is installed) or gzip,
+# whichever the client accepts.  Up to ``COMPRESS_CACHE_ENTRIES``
+# compressed bodies are kept, keyed by ETag.  Static files are
+# precompressed at build time (``python -m bot.assets``).
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
+COMPRESS_CACHE_ENTRIES = int(os.environ.get("COMPRESS_CACHE_ENTRIES", "256"))
+
+# Static files of the web app are indexed once at startup; files of up to
+# ``STATIC_PRELOAD_MAX`` bytes are kept in memory.  Vite's content‑hashed
+# assets never change under the same URL and are cached for a year;
+# other files, ``index.html`` included, are revalidated by ETag.
+STATIC_PRELOAD_MAX = int(os.environ.get("STATIC_PRELOAD_MAX", str(256 * 1024)))
+STATIC_CACHE_CONTROL = os.environ.get("STATIC_CACHE_CONTROL", "no-cache")
+STATIC_IMMUTABLE_CACHE_CONTROL = os.environ.get(
+    "STATIC_IMMUTABLE_CACHE_CONTROL", "public, max-age=31536000, immutable"
+)
+
+# Chapter text storage.  With ``"zlib"`` new chapters are stored
+# compressed and existing plain‑text rows are converted in place by
+# ``database.init_db``; ``"none"`` stores plain TEXT.  Both formats can
+# be read regardless of this setting.
+CHAPTER_COMPRESSION = os.environ.get("CHAPTER_COMPRESSION", "zlib")
+CHAPTER_COMPRESSION_LEVEL = int(os.environ.get("CHAPTER_COMPRESSION_LEVEL", "9"))
+
+# Approximate page size, in characters, used to split long chapters for
+# ``/api/book/<id>/chapter/<id>?page=N``.  Pages break at paragraph
+# boundaries where possible.  Changing it only affects new chapters.
+CHAPTER_PAGE_CHARS = int(os.environ.get("CHAPTER_PAGE_CHARS", "8000"))
+
+# Size of the thread pool the bot uses for database calls (see
+# ``async_database.py``), i.e. how many queries may run at once without
+# blocking the event loop.
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", "4"))
+
+# The Tribute subscriber list is mirrored into the local database by a
+# background job every ``TRIBUTE_SYNC_INTERVAL`` seconds.  While the last
+# successful sync is younger than ``TRIBUTE_STALE_AFTER`` seconds,
+# subscription checks are answered from the mirror alone; after that
+# they fall back to asking Tribute directly.
+TRIBUTE_SYNC_INTERVAL = int(os.environ.get("TRIBUTE_SYNC_INTERVAL", "300"))
+TRIBUTE_STALE_AFTER = int(os.environ.get("TRIBUTE_STALE_AFTER", "900"))
+
+# Tribute responses are parsed as a stream, ``TRIBUTE_CHUNK_SIZE`` bytes
+# at a time, instead of being loaded whole.  Paginated responses are
+# followed for at most ``TRIBUTE_MAX_PAGES`` pages.
+TRIBUTE_CHUNK_SIZE = int(os.environ.get("TRIBUTE_CHUNK_SIZE", "65536"))
+TRIBUTE_MAX_PAGES = int(os.environ.get("TRIBUTE_MAX_PAGES", "1000"))
+
+# HTTP calls to Tribute (see ``httpclient.py``) reuse up to
+# ``TRIBUTE_POOL_SIZE`` keep‑alive connections, give up after the
+# connect/read timeouts (seconds) and are retried ``TRIBUTE_RETRIES``
+# times with jittered backoff starting at ``TRIBUTE_RETRY_BACKOFF``
+# seconds.  After ``TRIBUTE_BREAKER_THRESHOLD`` failed calls in a row the
+# circuit opens and calls fail fast for ``TRIBUTE_BREAKER_RESET`` seconds.
+TRIBUTE_POOL_SIZE = int(os.environ.get("TRIBUTE_POOL_SIZE", "10"))
+TRIBUTE_CONNECT_TIMEOUT = float(os.environ.get("TRIBUTE_CONNECT_TIMEOUT", "3.05"))
+TRIBUTE_READ_TIMEOUT = float(os.environ.get("TRIBUTE_READ_TIMEOUT", "5"))
+TRIBUTE_RETRIES = int(os.environ.get("TRIBUTE_RETRIES", "2"))
+TRIBUTE_RETRY_BACKOFF = float(os.environ.get("TRIBUTE_RETRY_BACKOFF", "0.25"))
+TRIBUTE_BREAKER_THRESHOLD = int(os.environ.get("TRIBUTE_BREAKER_THRESHOLD", "5"))
+TRIBUTE_BREAKER_RESET = float(os.environ.get("TRIBUTE_BREAKER_RESET", "30"))
+
+# Subscription check cache (see ``verifier.py``).  Positive results are
+# kept until the subscription expires, but at most
+# ``VERIFY_POSITIVE_MAX_TTL`` seconds; negative results for
+# ``VERIFY_NEGATIVE_TTL`` seconds so new subscribers get in quickly.
+# Every process checks at most every ``VERIFY_REVISION_INTERVAL``
+# seconds whether any process changed a subscription (e.g. a webhook
+# cancelled one) and then drops its cached results.
+VERIFY_CACHE_SIZE = int(os.environ.get("VERIFY_CACHE_SIZE", "10000"))
+VERIFY_POSITIVE_MAX_TTL = int(os.environ.get("VERIFY_POSITIVE_MAX_TTL", "21600"))
+VERIFY_NEGATIVE_TTL = int(os.environ.get("VERIFY_NEGATIVE_TTL", "30"))
+VERIFY_REVISION_INTERVAL = float(os.environ.get("VERIFY_REVISION_INTERVAL", "1"))
+
+# Upper bound on the number of chapters returned by one
+# ``/api/book/<id>/chapters`` request (``?ids=`` or ``?from=&count=``).
+CHAPTER_BATCH_MAX = int(os.environ.get("CHAPTER_BATCH_MAX", "10"))
@@ -3,25 +3,331 @@ Database layer for the book bot.
 
 This module wraps all interactions with the SQLite database.  It
 provides functions to initialise the schema, add and retrieve books,
-chapters and allowed users.  All connections are opened and closed
-inside each function for simplicity; for high‑traffic scenarios you
-could consider using a connection pool.
+chapters and allowed users.
+
+Connections are long‑lived and shared by the Flask threads and the bot.
+Readers borrow a connection from a small pool, while all writes go
+through a single connection guarded by a lock, which matches SQLite's
+one‑writer model.  The database runs in WAL mode so readers are never
+blocked by the writer.
 """
 
 from __future__ import annotations
 
+import itertools
+import os
+import queue
+import re
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from . import config, metrics
+
+
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+# Words of a search query; everything else (FTS5 operators, quotes,
+# punctuation) is dropped so user input can never break the MATCH syntax.
+_SEARCH_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class _ConnectionManager:
+    """Pool of reader connections plus one serialised writer connection.
+
+    Connections are bound to the database path and the process ID they
+    were opened with; if either changes (tests pointing ``config.DB_FILE``
+    elsewhere, or a forked worker process) the old connections are
+    discarded and new ones are opened on demand.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._key: Optional[tuple[str, int]] = None
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._on_commit: List[Callable[[], None]] = []
+
+    def _open(self, readonly: bool) -> sqlite3.Connection:
+        synchronous = config.DB_SYNCHRONOUS.upper()
+        if synchronous not in _SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid DB_SYNCHRONOUS value: {config.DB_SYNCHRONOUS!r}")
+        conn = sqlite3.connect(
+            config.DB_FILE,
+            timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=config.DB_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.create_function("chapter_text", 3, _decode_content, deterministic=True)
+        if not readonly:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.execute(f"PRAGMA cache_size={-int(config.DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)}")
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def _check_key(self) -> None:
+        key = (config.DB_FILE, os.getpid())
+        if self._key == key:
+            return
+        with self._lock:
+            if self._key == key:
+                return
+            # Connections inherited from a parent process must not be
+            # used (or closed) in the child, so only drop the references.
+            inherited = self._key is not None and self._key[1] != key[1]
+            self._discard(close=not inherited)
+            self._key = key
+
+    def _discard(self, close: bool) -> None:
+        while True:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                break
+            if close:
+                conn.close()
+        if self._writer is not None and close:
+            self._writer.close()
+        self._writer = None
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read‑only connection from the pool."""
+        self._check_key()
+        key = self._key
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open(readonly=True)
+        try:
+            yield conn
+        finally:
+            if key == self._key and self._readers.qsize() < config.DB_READ_POOL_SIZE:
+                self._readers.put(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Run a block inside a write transaction on the shared writer.
+
+        The transaction is committed when the block exits normally and
+        rolled back if it raises.  Nested use from the same thread joins
+        the outer transaction.
+        """
+        self._check_key()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open(readonly=False)
+            conn = self._writer
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            self._on_commit = []
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            callbacks, self._on_commit = self._on_commit, []
+        for callback in dict.fromkeys(callbacks):
+            callback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` once the current write transaction commits.
+
+        Must be called inside :meth:`write`.  Callbacks run outside the
+        writer lock and are dropped if the transaction rolls back; the
+        same callback registered several times runs once.
+        """
+        self._on_commit.append(callback)
+
+    @contextmanager
+    def maintenance(self) -> Iterator[sqlite3.Connection]:
+        """Yield the writer outside of a transaction (for VACUUM and similar)."""
+        self._check_key()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open(readonly=False)
+            yield self._writer
+
+    def close(self) -> None:
+        with self._lock, self._write_lock:
+            self._discard(close=True)
+            self._key = None
+
+
+_manager = _ConnectionManager()
+
+
+def close_connections() -> None:
+    """Close every pooled connection.  They are reopened on next use."""
+    _manager.close()
+
 
-from . import config
+# Called after a transaction that added books or chapters commits.
+_catalog_listeners: List[Callable[[], None]] = []
+
+
+def add_catalog_listener(callback: Callable[[], None]) -> None:
+    """Register ``callback`` to run after every committed catalog change."""
+    _catalog_listeners.append(callback)
+
+
+def _catalog_changed() -> None:
+    for callback in _catalog_listeners:
+        callback()
+
+
+class _EncodedChapter(NamedTuple):
+    """Chapter text in its stored form plus the page offset index."""
+
+    content: Optional[str]
+    content_z: Optional[bytes]
+    content_encoding: Optional[str]
+    content_bytes: int
+    content_chars: int
+    # (char_start, char_end, byte_start, byte_end, z_start, z_end) per page
+    pages: List[tuple[int, int, int, int, Optional[int], Optional[int]]]
+
+    def row(self) -> tuple:
+        return (
+            self.content,
+            self.content_z,
+            self.content_encoding,
+            self.content_bytes,
+            self.content_chars,
+            len(self.pages),
+        )
+
+
+def _page_bounds(text: str) -> List[tuple[int, int]]:
+    """Split ``text`` into ``(start, end)`` character ranges of at most
+    ``config.CHAPTER_PAGE_CHARS`` characters, preferring to break after
+    a paragraph, then after a line, then after a word."""
+    limit = max(1, config.CHAPTER_PAGE_CHARS)
+    bounds: List[tuple[int, int]] = []
+    start = 0
+    while len(text) - start > limit:
+        end = start + limit
+        for sep in ("\n\n", "\n", " "):
+            cut = text.rfind(sep, start + 1, end)
+            if cut != -1:
+                end = cut + len(sep)
+                break
+        bounds.append((start, end))
+        start = end
+    bounds.append((start, len(text)))
+    return bounds
+
+
+def _encode_content(content: str) -> _EncodedChapter:
+    """Prepare chapter text for storage and compute its page index.
+
+    With zlib, a full flush is written at every page boundary, so each
+    page can later be inflated on its own from its compressed byte range
+    (see :func:`get_chapter_page`) while the whole stream still
+    decompresses normally.
+    """
+    codec = config.CHAPTER_COMPRESSION.lower()
+    if codec not in {"zlib", "none"}:
+        raise ValueError(f"Unsupported CHAPTER_COMPRESSION: {config.CHAPTER_COMPRESSION!r}")
+    compressor = zlib.compressobj(config.CHAPTER_COMPRESSION_LEVEL) if codec == "zlib" else None
+    compressed = bytearray()
+    pages = []
+    byte_pos = 0
+    for start, end in _page_bounds(content):
+        raw = content[start:end].encode("utf-8")
+        z_start = z_end = None
+        if compressor is not None:
+            # The 2‑byte zlib header precedes the first page's data.
+            z_start = len(compressed) or 2
+            compressed += compressor.compress(raw)
+            compressed += compressor.flush(zlib.Z_FULL_FLUSH)
+            z_end = len(compressed)
+        pages.append((start, end, byte_pos, byte_pos + len(raw), z_start, z_end))
+        byte_pos += len(raw)
+    if compressor is None:
+        return _EncodedChapter(content, None, None, byte_pos, len(content), pages)
+    compressed += compressor.flush()
+    # The plain column is left empty rather than NULL so databases created
+    # from create_tables.sql (content NOT NULL) accept compressed rows.
+    return _EncodedChapter("", bytes(compressed), "zlib", byte_pos, len(content), pages)
+
+
+def _decode_content(
+    content: Optional[str], content_z: Optional[bytes], encoding: Optional[str]
+) -> Optional[str]:
+    """Return the plain text of a chapter stored by :func:`_encode_content`."""
+    if encoding is None:
+        return content
+    if encoding == "zlib":
+        return zlib.decompress(content_z).decode("utf-8")
+    raise ValueError(f"Unknown chapter content encoding: {encoding!r}")
+
+
+def _store_chapter(conn: sqlite3.Connection, chapter_id: int, encoded: _EncodedChapter) -> None:
+    """Write the text and page index of an existing chapter row."""
+    conn.execute(
+        "UPDATE chapters SET content = ?, content_z = ?, content_encoding = ?, "
+        "content_bytes = ?, content_chars = ?, page_count = ? WHERE id = ?",
+        (*encoded.row(), chapter_id),
+    )
+    conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+    conn.executemany(
+        "INSERT INTO chapter_pages (chapter_id, page, char_start, char_end, "
+        "byte_start, byte_end, z_start, z_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(chapter_id, n, *page) for n, page in enumerate(encoded.pages, start=1)],
+    )
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    """Add ``column`` to ``table`` unless it already exists."""
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 
 def init_db() -> None:
-    """Initialise the SQLite database and create tables if they do not exist."""
-    conn = sqlite3.connect(config.DB_FILE)
-    cur = conn.cursor()
+    """Initialise the SQLite database and bring its schema up to date.
+
+    Pending migrations from :data:`_MIGRATIONS` are applied in order and
+    the reached version is recorded in the ``schema_version`` table.
+    Chapters left over from older versions are then re‑encoded in place
+    (see :func:`reencode_chapters`).
+    """
+    migrate()
+    if reencode_chapters():
+        with _manager.maintenance() as conn:
+            conn.execute("VACUUM")
+
+
+def _migration_base_tables(conn: sqlite3.Connection) -> None:
+    """Books, chapters and allowed users as created by the first versions."""
     # Books table: optional cover_url
-    cur.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS books (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -32,7 +338,7 @@ def init_db() -> None:
         """
     )
     # Chapters table referencing books
-    cur.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS chapters (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,129 +350,874 @@ def init_db() -> None:
         """
     )
     # Allowed users table
-    cur.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS allowed_users (
             telegram_user_id INTEGER PRIMARY KEY
         )
         """
     )
-    conn.commit()
-    conn.close()
 
 
-def get_books_summary() -> List[Dict[str, Any]]:
-    """Return a list of all books with chapter metadata.
+def _migration_chapter_storage(conn: sqlite3.Connection) -> None:
+    """Compressed chapter text and the page offset index."""
+    # Storage format of the chapter text, see _encode_content().  The
+    # byte and character lengths are kept so they can be reported
+    # without loading or decompressing the text.  Existing rows are
+    # converted by reencode_chapters().
+    _ensure_column(conn, "chapters", "content_z", "BLOB")
+    _ensure_column(conn, "chapters", "content_encoding", "TEXT")
+    _ensure_column(conn, "chapters", "content_bytes", "INTEGER")
+    _ensure_column(conn, "chapters", "content_chars", "INTEGER")
+    _ensure_column(conn, "chapters", "page_count", "INTEGER")
+    # Page offset index, computed once when a chapter is stored.
+    # Offsets are half‑open ranges into the text (characters), its
+    # UTF‑8 encoding (bytes) and, for zlib, the compressed stream.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chapter_pages (
+            chapter_id INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            char_start INTEGER NOT NULL,
+            char_end INTEGER NOT NULL,
+            byte_start INTEGER NOT NULL,
+            byte_end INTEGER NOT NULL,
+            z_start INTEGER,
+            z_end INTEGER,
+            PRIMARY KEY (chapter_id, page)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migration_search_index(conn: sqlite3.Connection) -> None:
+    """Full‑text search index over book descriptions and chapter text.
+
+    It is maintained by add_book/add_chapter rather than triggers so it
+    always indexes the plain text, whatever the storage format.
+    """
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            title,
+            body,
+            book_id UNINDEXED,
+            chapter_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    _rebuild_search_index(conn)
+
+
+def _migration_chapter_order(conn: sqlite3.Connection) -> None:
+    """Explicit chapter ordering, creation times and a covering index."""
+    _ensure_column(conn, "books", "created_at", "TIMESTAMP")
+    _ensure_column(conn, "chapters", "created_at", "TIMESTAMP")
+    _ensure_column(conn, "chapters", "position", "INTEGER")
+    # Number existing chapters 1..n within each book in insertion order.
+    conn.execute(
+        "UPDATE chapters SET position = (SELECT COUNT(*) FROM chapters c "
+        "WHERE c.book_id = chapters.book_id AND c.id <= chapters.id) "
+        "WHERE position IS NULL"
+    )
+    # Covers listing, counting and ordering chapters of a book without
+    # touching the (large) chapter rows themselves.
+    conn.execute("DROP INDEX IF EXISTS idx_chapters_book_id")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chapters_book_position "
+        "ON chapters(book_id, position, id, title)"
+    )
+
+
+def _migration_tribute_mirror(conn: sqlite3.Connection) -> None:
+    """Local mirror of the Tribute subscriber list and a key/value state table."""
+    # expire_at and updated_at are Unix timestamps (UTC seconds).
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tribute_subscribers (
+            telegram_user_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            expire_at INTEGER,
+            updated_at INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """
+    )
+
+
+def _migration_tribute_events(conn: sqlite3.Connection) -> None:
+    """Webhook events already applied, keyed by a hash of the request body."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tribute_events (
+            event_key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            telegram_user_id INTEGER,
+            received_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migration_revisions(conn: sqlite3.Connection) -> None:
+    """Catalog version counter and per‑book/per‑chapter revision stamps.
+
+    Triggers bump ``catalog_version`` on every change to books or
+    chapters and stamp the changed book and chapter rows with the new
+    version, so HTTP validators (ETags) stay correct whichever code path
+    writes.  A book's revision also changes when its chapter list does.
+    The counter starts at the current Unix time, so stamps do not repeat
+    if the database is recreated.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_version ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO catalog_version (id, version) "
+        "VALUES (1, CAST(strftime('%s', 'now') AS INTEGER))"
+    )
+    _ensure_column(conn, "books", "revision", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(conn, "chapters", "revision", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE books SET revision = (SELECT version FROM catalog_version)")
+    conn.execute("UPDATE chapters SET revision = (SELECT version FROM catalog_version)")
+    bump = "UPDATE catalog_version SET version = version + 1;"
+    current = "(SELECT version FROM catalog_version)"
+    triggers = {
+        "books_revision_insert": (
+            "AFTER INSERT ON books",
+            f"{bump} UPDATE books SET revision = {current} WHERE id = NEW.id;",
+        ),
+        "books_revision_update": (
+            "AFTER UPDATE OF title, description, cover_url ON books",
+            f"{bump} UPDATE books SET revision = {current} WHERE id = NEW.id;",
+        ),
+        "books_revision_delete": ("AFTER DELETE ON books", bump),
+        "chapters_revision_insert": (
+            "AFTER INSERT ON chapters",
+            f"{bump} UPDATE chapters SET revision = {current} WHERE id = NEW.id; "
+            f"UPDATE books SET revision = {current} WHERE id = NEW.book_id;",
+        ),
+        "chapters_revision_update": (
+            "AFTER UPDATE OF book_id, title, position, content, content_z ON chapters",
+            f"{bump} UPDATE chapters SET revision = {current} WHERE id = NEW.id; "
+            f"UPDATE books SET revision = {current} WHERE id IN (OLD.book_id, NEW.book_id);",
+        ),
+        "chapters_revision_delete": (
+            "AFTER DELETE ON chapters",
+            f"{bump} UPDATE books SET revision = {current} WHERE id = OLD.book_id;",
+        ),
+    }
+    for name, (event, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+
+def _migration_bot_persistence(conn: sqlite3.Connection) -> None:
+    """python-telegram-bot state (see ``persistence.py``), JSON per kind and key."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bot_persistence (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migration_subscription_version(conn: sqlite3.Connection) -> None:
+    """Counter bumped by triggers on every change to who has access.
+
+    Covers the Tribute mirror (sync and webhooks) and ``allowed_users``,
+    so each process's subscription cache (``verifier.py``) notices
+    changes made by any other process.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS subscription_version ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    )
+    conn.execute("INSERT OR IGNORE INTO subscription_version (id, version) VALUES (1, 0)")
+    bump = "UPDATE subscription_version SET version = version + 1;"
+    for table in ("tribute_subscribers", "allowed_users"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} "
+                f"AFTER {event} ON {table} BEGIN {bump} END"
+            )
+
+
+# Schema migrations in order; the 1‑based position of each function is
+# its schema version.  Only ever append to this list.  Migrations must
+# tolerate databases created by create_tables.sql or by versions that
+# predate the schema_version table.
+_MIGRATIONS = [
+    _migration_base_tables,
+    _migration_chapter_storage,
+    _migration_search_index,
+    _migration_chapter_order,
+    _migration_tribute_mirror,
+    _migration_tribute_events,
+    _migration_revisions,
+    _migration_bot_persistence,
+    _migration_subscription_version,
+]
+
+
+def get_schema_version() -> int:
+    """Return the schema version recorded in the database (0 if none)."""
+    with _manager.read() as conn:
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if has_table is None:
+            return 0
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate() -> int:
+    """Apply pending schema migrations and return the resulting version.
+
+    Each migration runs in its own write transaction together with the
+    version bump, and the current version is re‑read inside it, so
+    concurrent processes starting at the same time apply each migration
+    exactly once.
+    """
+    with _manager.write() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    for version, migration in enumerate(_MIGRATIONS, start=1):
+        with _manager.write() as conn:
+            current = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            if current >= version:
+                continue
+            migration(conn)
+            conn.execute("DELETE FROM schema_version")
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+    return len(_MIGRATIONS)
+
+
+def _rebuild_search_index(conn: sqlite3.Connection) -> None:
+    """Fill the search index from the books and chapters tables."""
+    conn.execute("DELETE FROM search_index")
+    conn.execute(
+        "INSERT INTO search_index (title, body, book_id, chapter_id) "
+        "SELECT title, COALESCE(description, ''), id, NULL FROM books"
+    )
+    conn.execute(
+        "INSERT INTO search_index (title, body, book_id, chapter_id) "
+        "SELECT title, COALESCE(chapter_text(content, content_z, content_encoding), ''), "
+        "book_id, id FROM chapters"
+    )
+
+
+def get_books_summary(
+    include_chapters: bool = False,
+    after: int = 0,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Return books ordered by ID with chapter metadata.
 
     Each dictionary contains the keys ``id``, ``title``, ``description``,
-    ``cover_url`` and a ``chapters`` list of dictionaries with ``id`` and
-    ``title`` fields.
-    """
-    conn = sqlite3.connect(config.DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM books")
-    books = [dict(row) for row in cur.fetchall()]
-    for book in books:
-        cur.execute(
-            "SELECT id, title FROM chapters WHERE book_id = ? ORDER BY id ASC",
-            (book["id"],),
+    ``cover_url`` and ``chapter_count``.  When ``include_chapters`` is
+    true a ``chapters`` list of dictionaries with ``id`` and ``title``
+    fields is added as well, fetched with one extra query for the whole
+    page rather than one query per book.
+
+    Pagination is keyset based: only books with an ID greater than
+    ``after`` are returned, at most ``limit`` of them (all when None).
+    """
+    with _manager.read() as conn:
+        cur = conn.execute(
+            "SELECT b.id, b.title, b.description, b.cover_url, "
+            "(SELECT COUNT(*) FROM chapters c WHERE c.book_id = b.id) AS chapter_count "
+            "FROM books b WHERE b.id > ? ORDER BY b.id ASC LIMIT ?",
+            (after, -1 if limit is None else limit),
         )
-        book["chapters"] = [dict(r) for r in cur.fetchall()]
-    conn.close()
+        books = [dict(row) for row in cur.fetchall()]
+        if include_chapters and books:
+            by_id = {book["id"]: book for book in books}
+            for book in books:
+                book["chapters"] = []
+            cur = conn.execute(
+                "SELECT book_id, id, title FROM chapters "
+                "WHERE book_id BETWEEN ? AND ? ORDER BY book_id ASC, position ASC, id ASC",
+                (books[0]["id"], books[-1]["id"]),
+            )
+            for book_id, chapter_id, title in cur:
+                book = by_id.get(book_id)
+                if book is not None:
+                    book["chapters"].append({"id": chapter_id, "title": title})
     return books
 
 
+def get_catalog() -> tuple[int, List[Dict[str, Any]]]:
+    """Return the catalog version and every book with its chapter list.
+
+    Everything is read in one read transaction, so the books match the
+    version.  Books are ordered by ID and have all ``books`` columns plus
+    ``chapter_count`` and ``chapters`` (``id`` and ``title`` in reading
+    order).  Used to build the in‑memory snapshot in ``catalog.py``.
+    """
+    with _manager.read() as conn:
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT version FROM catalog_version").fetchone()[0]
+            books = [dict(row) for row in conn.execute("SELECT * FROM books ORDER BY id")]
+            by_id = {book["id"]: book for book in books}
+            for book in books:
+                book["chapters"] = []
+            cur = conn.execute(
+                "SELECT book_id, id, title FROM chapters ORDER BY book_id, position, id"
+            )
+            for book_id, chapter_id, title in cur:
+                book = by_id.get(book_id)
+                if book is not None:
+                    book["chapters"].append({"id": chapter_id, "title": title})
+        finally:
+            conn.execute("COMMIT")
+    for book in books:
+        book["chapter_count"] = len(book["chapters"])
+    return version, books
+
+
+def get_catalog_version() -> int:
+    """Return a number that changes whenever any book or chapter changes."""
+    with _manager.read() as conn:
+        return conn.execute("SELECT version FROM catalog_version").fetchone()[0]
+
+
+def get_subscription_version() -> int:
+    """Return a number that changes whenever a subscription or allowed user changes."""
+    with _manager.read() as conn:
+        return conn.execute("SELECT version FROM subscription_version").fetchone()[0]
+
+
+def get_book_revision(book_id: int) -> Optional[int]:
+    """Return the revision stamp of a book (and its chapter list) or None."""
+    with _manager.read() as conn:
+        row = conn.execute("SELECT revision FROM books WHERE id = ?", (book_id,)).fetchone()
+    return None if row is None else row[0]
+
+
+def get_chapter_revision(book_id: int, chapter_id: int) -> Optional[int]:
+    """Return the revision stamp of a chapter or None if it does not exist.
+
+    Only the chapter's key and revision are read, never its content.
+    """
+    with _manager.read() as conn:
+        row = conn.execute(
+            "SELECT revision FROM chapters WHERE id = ? AND book_id = ?", (chapter_id, book_id)
+        ).fetchone()
+    return None if row is None else row[0]
+
+
 def get_book_detail(book_id: int) -> Optional[Dict[str, Any]]:
     """Return a single book with its chapters or None if not found."""
-    conn = sqlite3.connect(config.DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM books WHERE id = ?", (book_id,))
-    row = cur.fetchone()
-    if row is None:
-        conn.close()
-        return None
-    book = dict(row)
-    cur.execute(
-        "SELECT id, title FROM chapters WHERE book_id = ? ORDER BY id ASC",
-        (book_id,),
-    )
-    book["chapters"] = [dict(r) for r in cur.fetchall()]
-    conn.close()
+    with _manager.read() as conn:
+        row = conn.execute("SELECT * FROM books WHERE id = ?", (book_id,)).fetchone()
+        if row is None:
+            return None
+        book = dict(row)
+        cur = conn.execute(
+            "SELECT id, title FROM chapters WHERE book_id = ? ORDER BY position ASC, id ASC",
+            (book_id,),
+        )
+        book["chapters"] = [dict(r) for r in cur.fetchall()]
     return book
 
 
+# IDs of the chapters before and after ``c`` in reading order, looked up
+# in idx_chapters_book_position without touching chapter rows.
+_NEIGHBOURS = (
+    "(SELECT p.id FROM chapters p WHERE p.book_id = c.book_id "
+    "AND (p.position, p.id) < (c.position, c.id) "
+    "ORDER BY p.position DESC, p.id DESC LIMIT 1) AS prev_id, "
+    "(SELECT n.id FROM chapters n WHERE n.book_id = c.book_id "
+    "AND (n.position, n.id) > (c.position, c.id) "
+    "ORDER BY n.position ASC, n.id ASC LIMIT 1) AS next_id"
+)
+
+_CHAPTER_COLUMNS = (
+    "c.id AS chapter_id, c.title AS title, c.content AS content, "
+    "c.content_z AS content_z, c.content_encoding AS content_encoding, "
+    "c.page_count AS page_count, c.book_id AS book_id, " + _NEIGHBOURS
+)
+
+
+def _chapter_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "bookId": row["book_id"],
+        "chapterId": row["chapter_id"],
+        "title": row["title"],
+        "content": _decode_content(row["content"], row["content_z"], row["content_encoding"]),
+        "pages": row["page_count"],
+        "prevChapterId": row["prev_id"],
+        "nextChapterId": row["next_id"],
+    }
+
+
+def get_chapter_stamp(book_id: int, chapter_id: int) -> Optional[tuple[int, Optional[int], Optional[int]]]:
+    """Return ``(revision, prev_id, next_id)`` of a chapter or None.
+
+    Besides the content this is everything a chapter response depends
+    on, so it makes a complete HTTP validator; only the index and the
+    chapter's revision are read.
+    """
+    with _manager.read() as conn:
+        row = conn.execute(
+            f"SELECT c.revision, {_NEIGHBOURS} FROM chapters c WHERE c.id = ? AND c.book_id = ?",
+            (chapter_id, book_id),
+        ).fetchone()
+    return None if row is None else tuple(row)
+
+
 def get_chapter_detail(book_id: int, chapter_id: int) -> Optional[Dict[str, Any]]:
-    """Return the full details of a chapter or None if not found."""
-    conn = sqlite3.connect(config.DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT c.id AS chapter_id, c.title AS title, c.content AS content, b.id AS book_id "
-        "FROM chapters c JOIN books b ON c.book_id = b.id WHERE c.book_id = ? AND c.id = ?",
-        (book_id, chapter_id),
-    )
-    row = cur.fetchone()
-    conn.close()
-    if row is None:
-        return None
+    """Return the full details of a chapter or None if not found.
+
+    ``prevChapterId`` and ``nextChapterId`` (None at either end of the
+    book) let the reader prefetch its neighbours.
+    """
+    with _manager.read() as conn:
+        row = conn.execute(
+            f"SELECT {_CHAPTER_COLUMNS} FROM chapters c WHERE c.book_id = ? AND c.id = ?",
+            (book_id, chapter_id),
+        ).fetchone()
+    return None if row is None else _chapter_from_row(row)
+
+
+def get_chapters(
+    book_id: int,
+    ids: Optional[Iterable[int]] = None,
+    start: Optional[int] = None,
+    count: int = 1,
+) -> List[Dict[str, Any]]:
+    """Return several chapters of a book in reading order with one query.
+
+    Either the chapters with the given ``ids`` (unknown IDs are skipped)
+    or up to ``count`` chapters starting with chapter ``start``.  Each
+    item has the keys of :func:`get_chapter_detail`.
+    """
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        where = f"c.book_id = ? AND c.id IN ({', '.join('?' * len(ids))})"
+        params: List[Any] = [book_id, *ids, len(ids)]
+    elif start is not None:
+        where = (
+            "c.book_id = ? AND (c.position, c.id) >= "
+            "(SELECT s.position, s.id FROM chapters s WHERE s.id = ? AND s.book_id = ?)"
+        )
+        params = [book_id, start, book_id, max(1, count)]
+    else:
+        raise ValueError("either ids or start is required")
+    with _manager.read() as conn:
+        rows = conn.execute(
+            f"SELECT {_CHAPTER_COLUMNS} FROM chapters c WHERE {where} "
+            "ORDER BY c.position ASC, c.id ASC LIMIT ?",
+            params,
+        ).fetchall()
+    return [_chapter_from_row(row) for row in rows]
+
+
+def get_chapter_page(book_id: int, chapter_id: int, page: int) -> Optional[Dict[str, Any]]:
+    """Return one page of a chapter or None if the chapter or page does not exist.
+
+    Only the requested slice is read: ``substr`` for plain text, or the
+    page's compressed byte range (read through an incremental blob
+    handle) for zlib.  The result has the same keys as
+    :func:`get_chapter_detail` plus ``page``.
+    """
+    with _manager.read() as conn:
+        row = conn.execute(
+            "SELECT c.id AS chapter_id, c.title AS title, c.book_id AS book_id, "
+            "c.content_encoding AS content_encoding, c.page_count AS page_count, "
+            f"{_NEIGHBOURS}, p.z_start AS z_start, p.z_end AS z_end, "
+            "CASE WHEN c.content_encoding IS NULL "
+            "THEN substr(c.content, p.char_start + 1, p.char_end - p.char_start) END AS text "
+            "FROM chapters c JOIN chapter_pages p ON p.chapter_id = c.id "
+            "WHERE c.book_id = ? AND c.id = ? AND p.page = ?",
+            (book_id, chapter_id, page),
+        ).fetchone()
+        if row is None:
+            return None
+        text = row["text"]
+        if row["content_encoding"] == "zlib":
+            with conn.blobopen("chapters", "content_z", chapter_id, readonly=True) as blob:
+                blob.seek(row["z_start"])
+                chunk = blob.read(row["z_end"] - row["z_start"])
+            text = zlib.decompressobj(-zlib.MAX_WBITS).decompress(chunk).decode("utf-8")
+        elif row["content_encoding"] is not None:
+            raise ValueError(f"Unknown chapter content encoding: {row['content_encoding']!r}")
     return {
         "bookId": row["book_id"],
         "chapterId": row["chapter_id"],
         "title": row["title"],
-        "content": row["content"],
+        "content": text,
+        "page": page,
+        "pages": row["page_count"],
+        "prevChapterId": row["prev_id"],
+        "nextChapterId": row["next_id"],
     }
 
 
 def add_book(title: str, description: str, cover_url: Optional[str]) -> int:
     """Insert a new book into the database and return its ID."""
-    conn = sqlite3.connect(config.DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO books (title, description, cover_url) VALUES (?, ?, ?)",
-        (title, description, cover_url),
-    )
-    book_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return book_id
+    with _manager.write() as conn:
+        cur = conn.execute(
+            "INSERT INTO books (title, description, cover_url, created_at) "
+            "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            (title, description, cover_url),
+        )
+        conn.execute(
+            "INSERT INTO search_index (title, body, book_id, chapter_id) VALUES (?, ?, ?, NULL)",
+            (title, description or "", cur.lastrowid),
+        )
+        _manager.after_commit(_catalog_changed)
+    return cur.lastrowid
 
 
 def add_chapter(book_id: int, title: str, content: str) -> int:
     """Insert a new chapter and return its ID."""
-    conn = sqlite3.connect(config.DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO chapters (book_id, title, content) VALUES (?, ?, ?)",
-        (book_id, title, content),
+    return add_chapters(book_id, [(title, content)])[0]
+
+
+def add_chapters(
+    book_id: int,
+    chapters: Iterable[tuple[str, str]],
+    progress: Optional[Callable[[int], None]] = None,
+    batch_size: int = 50,
+) -> List[int]:
+    """Append ``(title, content)`` chapters to a book in one transaction.
+
+    ``chapters`` may be a lazy iterator; it is consumed in batches of
+    ``batch_size`` which are written with ``executemany``.  After every
+    batch ``progress`` is called with the number of chapters stored so
+    far.  Returns the new chapter IDs in order.  Either all chapters are
+    stored or, if the iterator or a write fails, none of them.
+    """
+    chapter_ids: List[int] = []
+    batch: List[tuple[str, str]] = []
+    with _manager.write() as conn:
+        position = conn.execute(
+            "SELECT COALESCE(MAX(position), 0) FROM chapters WHERE book_id = ?",
+            (book_id,),
+        ).fetchone()[0]
+        for chapter in chapters:
+            batch.append(chapter)
+            if len(batch) >= batch_size:
+                chapter_ids += _insert_chapters(conn, book_id, position, batch)
+                position += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(len(chapter_ids))
+        if batch:
+            chapter_ids += _insert_chapters(conn, book_id, position, batch)
+            if progress is not None:
+                progress(len(chapter_ids))
+    return chapter_ids
+
+
+def _insert_chapters(
+    conn: sqlite3.Connection, book_id: int, position: int, batch: List[tuple[str, str]]
+) -> List[int]:
+    """Insert chapters at ``position + 1`` onwards and return their IDs."""
+    encoded = [_encode_content(content or "") for _, content in batch]
+    conn.executemany(
+        "INSERT INTO chapters (book_id, title, position, content, content_z, content_encoding, "
+        "content_bytes, content_chars, page_count, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        [
+            (book_id, title, position + n, *enc.row())
+            for n, ((title, _), enc) in enumerate(zip(batch, encoded), start=1)
+        ],
+    )
+    chapter_ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT id FROM chapters WHERE book_id = ? AND position > ? "
+            "ORDER BY position LIMIT ?",
+            (book_id, position, len(batch)),
+        )
+    ]
+    conn.executemany(
+        "INSERT INTO chapter_pages (chapter_id, page, char_start, char_end, "
+        "byte_start, byte_end, z_start, z_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (chapter_id, n, *page)
+            for chapter_id, enc in zip(chapter_ids, encoded)
+            for n, page in enumerate(enc.pages, start=1)
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO search_index (title, body, book_id, chapter_id) VALUES (?, ?, ?, ?)",
+        [
+            (title, content or "", book_id, chapter_id)
+            for chapter_id, (title, content) in zip(chapter_ids, batch)
+        ],
     )
-    chapter_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return chapter_id
+    _manager.after_commit(_catalog_changed)
+    return chapter_ids
+
+
+def transaction() -> ContextManager[sqlite3.Connection]:
+    """Group several write functions into one transaction.
+
+    Writes made inside ``with database.transaction():`` (for example
+    :func:`add_book` followed by :func:`add_chapters`) are committed
+    together when the block exits, or rolled back if it raises.
+    """
+    return _manager.write()
+
+
+def search(query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """Full‑text search over books and chapters ranked by BM25.
+
+    Every word of ``query`` must match; the last word is treated as a
+    prefix so results appear while the user is still typing.  Matches
+    in titles weigh more than matches in the text.  Returns a dictionary
+    with the ``total`` number of matches and a ``results`` list whose
+    entries contain ``bookId``, ``chapterId`` (None for a book match),
+    a highlighted ``title`` and a ``snippet`` of the matching text.
+    Highlights are wrapped in ``<mark>`` tags.
+    """
+    terms = _SEARCH_TERM_RE.findall(query)
+    if not terms:
+        return {"total": 0, "results": []}
+    match = " ".join(f'"{term}"' for term in terms) + "*"
+    with _manager.read() as conn:
+        total = conn.execute(
+            "SELECT COUNT(*) FROM search_index WHERE search_index MATCH ?", (match,)
+        ).fetchone()[0]
+        cur = conn.execute(
+            "SELECT book_id, chapter_id, "
+            "highlight(search_index, 0, '<mark>', '</mark>') AS title, "
+            "snippet(search_index, 1, '<mark>', '</mark>', '…', 16) AS snippet "
+            "FROM search_index WHERE search_index MATCH ? "
+            "ORDER BY bm25(search_index, 5.0, 1.0) LIMIT ? OFFSET ?",
+            (match, limit, offset),
+        )
+        results = [
+            {
+                "bookId": row["book_id"],
+                "chapterId": row["chapter_id"],
+                "title": row["title"],
+                "snippet": row["snippet"],
+            }
+            for row in cur
+        ]
+    return {"total": total, "results": results}
+
+
+def reencode_chapters(batch_size: int = 200) -> int:
+    """Re‑encode chapters stored by older versions and return how many changed.
+
+    This covers chapters without a page index and, when compression is
+    enabled, plain‑text chapters.  Rows are converted in batches of
+    ``batch_size``, each in its own transaction, so readers are never
+    blocked for long.  Freed pages are only returned to the file system
+    by a following ``VACUUM``.
+    """
+    condition = "page_count IS NULL"
+    if config.CHAPTER_COMPRESSION.lower() != "none":
+        condition += " OR content_encoding IS NULL"
+    converted = 0
+    while True:
+        with _manager.write() as conn:
+            rows = conn.execute(
+                "SELECT id, chapter_text(content, content_z, content_encoding) AS text "
+                f"FROM chapters WHERE {condition} LIMIT ?",
+                (batch_size,),
+            ).fetchall()
+            for row in rows:
+                _store_chapter(conn, row["id"], _encode_content(row["text"] or ""))
+        converted += len(rows)
+        if len(rows) < batch_size:
+            return converted
 
 
 def add_allowed_user(user_id: int) -> None:
     """Add a user ID to the allowed_users table."""
-    conn = sqlite3.connect(config.DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR IGNORE INTO allowed_users (telegram_user_id) VALUES (?)",
-        (user_id,),
-    )
-    conn.commit()
-    conn.close()
+    with _manager.write() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO allowed_users (telegram_user_id) VALUES (?)",
+            (user_id,),
+        )
 
 
 def is_allowed_user(user_id: int) -> bool:
     """Return True if the user ID is in the allowed_users table."""
-    conn = sqlite3.connect(config.DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT 1 FROM allowed_users WHERE telegram_user_id = ? LIMIT 1",
-        (user_id,),
-    )
-    result = cur.fetchone()
-    conn.close()
-    return result is not None
\ No newline at end of file
+    with _manager.read() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM allowed_users WHERE telegram_user_id = ? LIMIT 1",
+            (user_id,),
+        ).fetchone()
+    return row is not None
+
+
+def get_state(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Return a value from the ``app_state`` key/value table."""
+    with _manager.read() as conn:
+        row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+def set_state(values: Dict[str, Optional[str]]) -> None:
+    """Store several ``app_state`` values in one transaction."""
+    with _manager.write() as conn:
+        conn.executemany(
+            "INSERT INTO app_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            list(values.items()),
+        )
+
+
+def get_bot_persistence(kind: str, key: Optional[str] = None) -> Dict[str, str]:
+    """Return the stored JSON values of ``kind`` by key (only ``key`` if given)."""
+    with _manager.read() as conn:
+        if key is None:
+            rows = conn.execute("SELECT key, value FROM bot_persistence WHERE kind = ?", (kind,))
+        else:
+            rows = conn.execute("SELECT key, value FROM bot_persistence WHERE kind = ? AND key = ?", (kind, key))
+        return {row[0]: row[1] for row in rows}
+
+
+def save_bot_persistence(changes: Iterable[tuple[str, str, Optional[str]]]) -> None:
+    """Store ``(kind, key, value)`` entries in one transaction; a None value deletes."""
+    changes = list(changes)
+    with _manager.write() as conn:
+        conn.executemany(
+            "INSERT INTO bot_persistence (kind, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(kind, key) DO UPDATE SET value = excluded.value",
+            [change for change in changes if change[2] is not None],
+        )
+        conn.executemany(
+            "DELETE FROM bot_persistence WHERE kind = ? AND key = ?",
+            [change[:2] for change in changes if change[2] is None],
+        )
+
+
+def sync_tribute_subscribers(
+    entries: Iterable[tuple[int, str, Optional[int]]],
+    started_at: int,
+    batch_size: int = 1000,
+) -> tuple[int, int]:
+    """Make the local mirror match a full Tribute subscriber list.
+
+    ``entries`` are ``(telegram_user_id, status, expire_at)`` tuples and
+    may be a lazy iterator, e.g. one that is still downloading.  It is
+    staged in a temporary table in batches of ``batch_size``, each in its
+    own short transaction, so the writer is not held for the duration of
+    the download.  When a user appears more than once, an active entry
+    with the latest expiry wins.  Only rows whose status or expiry
+    actually changed are written; users missing from the list are
+    removed unless they were updated after ``started_at`` (for example
+    by a webhook that arrived while the list was being downloaded).
+    Returns ``(subscriber_count, changed_rows)``.
+    """
+    with _manager.write() as conn:
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS tribute_import ("
+            "telegram_user_id INTEGER PRIMARY KEY, status TEXT NOT NULL, expire_at INTEGER)"
+        )
+        conn.execute("DELETE FROM tribute_import")
+    iterator = iter(entries)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            break
+        with _manager.write() as conn:
+            conn.executemany(
+                "INSERT INTO tribute_import (telegram_user_id, status, expire_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(telegram_user_id) DO UPDATE SET "
+                "status = excluded.status, expire_at = excluded.expire_at "
+                "WHERE excluded.status = 'active' AND (status != 'active' "
+                "OR COALESCE(excluded.expire_at, 0) > COALESCE(expire_at, 0))",
+                batch,
+            )
+    with _manager.write() as conn:
+        # rowcount, unlike total_changes, leaves out the triggers' writes.
+        changed = conn.execute(
+            "INSERT INTO tribute_subscribers (telegram_user_id, status, expire_at, updated_at) "
+            "SELECT telegram_user_id, status, expire_at, ? FROM tribute_import WHERE true "
+            "ON CONFLICT(telegram_user_id) DO UPDATE SET "
+            "status = excluded.status, expire_at = excluded.expire_at, "
+            "updated_at = excluded.updated_at "
+            "WHERE (status != excluded.status OR expire_at IS NOT excluded.expire_at) "
+            "AND updated_at <= excluded.updated_at",
+            (started_at,),
+        ).rowcount
+        changed += conn.execute(
+            "DELETE FROM tribute_subscribers WHERE updated_at <= ? AND telegram_user_id "
+            "NOT IN (SELECT telegram_user_id FROM tribute_import)",
+            (started_at,),
+        ).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM tribute_import").fetchone()[0]
+        conn.execute("DELETE FROM tribute_import")
+    return count, changed
+
+
+def apply_tribute_event(
+    event_key: str,
+    name: str,
+    user_id: int,
+    status: str,
+    expire_at: Optional[int],
+    event_at: int,
+    retention: int = 30 * 86400,
+) -> bool:
+    """Record a Tribute webhook event and apply it to the local mirror.
+
+    An event whose ``event_key`` was seen before is ignored, so replays
+    and retries are harmless.  The mirrored row is only replaced if it is
+    not newer than ``event_at``, so a late event cannot undo a more recent
+    sync or event.  Keys older than ``retention`` seconds are forgotten.
+    Returns False for a duplicate event.
+    """
+    now = int(time.time())
+    with _manager.write() as conn:
+        cursor = conn.execute(
+            "INSERT INTO tribute_events (event_key, name, telegram_user_id, received_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(event_key) DO NOTHING",
+            (event_key, name, user_id, now),
+        )
+        if cursor.rowcount == 0:
+            return False
+        conn.execute(
+            "INSERT INTO tribute_subscribers (telegram_user_id, status, expire_at, updated_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(telegram_user_id) DO UPDATE SET "
+            "status = excluded.status, expire_at = excluded.expire_at, "
+            "updated_at = excluded.updated_at "
+            "WHERE updated_at <= excluded.updated_at",
+            (user_id, status, expire_at, event_at),
+        )
+        conn.execute("DELETE FROM tribute_events WHERE received_at < ?", (now - retention,))
+    return True
+
+
+def get_tribute_subscription(user_id: int) -> Optional[Dict[str, Any]]:
+    """Return the mirrored Tribute entry of a user or None if unknown.
+
+    The dictionary has ``status`` and ``expire_at`` (Unix seconds or None).
+    """
+    with _manager.read() as conn:
+        row = conn.execute(
+            "SELECT status, expire_at FROM tribute_subscribers WHERE telegram_user_id = ?",
+            (user_id,),
+        ).fetchone()
+    return None if row is None else dict(row)
+
+
+# Record the latency of every query function (see metrics.py).
+metrics.instrument_module(
+    globals(), metrics.DB_LATENCY, exclude=("transaction", "add_catalog_listener", "close_connections")
+)
@@ -2,20 +2,25 @@
 Telegram command and callback handlers for the book bot.
 
 This module contains all of the asynchronous handler functions used by the
-Telegram bot.  They rely on the database layer for persistent storage
-and the configuration module for API keys and other settings.
+Telegram bot.  They reach the database through ``async_database`` so
+that SQLite calls never block the event loop, and use the configuration
+module for API keys and other settings.
 """
 
 from __future__ import annotations
 
 import asyncio
-import datetime as _dt
+import math
+import os
+import sqlite3
+import tempfile
+import time
 from typing import Optional
 
-import requests
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
+    BaseHandler,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
@@ -24,47 +29,40 @@ from telegram.ext import (
     filters,
 )
 
-from . import config, database
+from . import async_database, config, importer, metrics, ratelimit, verifier
+from . import catalog as catalog_snapshot
 
 # Conversation state enumerations
 ADD_BOOK_TITLE, ADD_BOOK_DESCRIPTION, ADD_BOOK_COVER = range(3)
 CHOOSE_BOOK, CHAPTER_TITLE, CHAPTER_CONTENT = range(3)
 ADD_ALLOWED_USER_ID = 100
+IMPORT_BOOK_FILE = 200
 
 
 async def is_user_subscribed(telegram_user_id: int) -> bool:
     """Return True if the user has an active subscription.
 
-    First checks the local allowed_users table.  If the user is not
-    found there, the function queries the Tribute API.  Only entries
-    with status ``active`` and an ``expireAt`` timestamp later than
-    the current time count as subscribed.
+    See :mod:`verifier`; on a cache miss the database is queried on the
+    database thread pool and Tribute, if needed, through the async client.
     """
-    # Check the local database
-    if database.is_allowed_user(telegram_user_id):
-        return True
-    try:
-        response = requests.get(
-            config.TRIBUTE_API_URL,
-            headers={"Api-Key": config.TRIBUTE_API_KEY},
-            timeout=10,
-        )
-        response.raise_for_status()
-        data = response.json()
-        now = _dt.datetime.utcnow().replace(tzinfo=_dt.timezone.utc)
-        for entry in data.get("result", []):
-            if entry.get("telegramUserId") == telegram_user_id:
-                if entry.get("status") == "active":
-                    expire_str = entry.get("expireAt")
-                    try:
-                        expire_dt = _dt.datetime.fromisoformat(expire_str.replace("Z", "+00:00"))
-                        if expire_dt > now:
-                            return True
-                    except Exception:
-                        pass
+    return await verifier.is_subscribed_async(telegram_user_id)
+
+
+# The bot is a single process, so its command limits live in memory.
+_command_limiter = ratelimit.MemoryLimiter(config.RATE_LIMIT_MAX_KEYS)
+
+
+async def _throttled(update: Update, user_id: int) -> bool:
+    """Apply the per‑user command limit; tell the user when it is hit."""
+    if not config.RATE_LIMIT_ENABLED:
         return False
-    except Exception:
+    wait = ratelimit.check(_command_limiter, [("command", str(user_id))])
+    if wait <= 0:
         return False
+    await update.message.reply_text(
+        f"Слишком много запросов. Попробуйте снова через {max(1, math.ceil(wait))} с."
+    )
+    return True
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -74,11 +72,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     Otherwise instructs the user to subscribe.
     """
     user = update.effective_user
-    if user is None:
+    if user is None or await _throttled(update, user.id):
         return
-    subscribed = await asyncio.get_event_loop().run_in_executor(
-        None, is_user_subscribed, user.id
-    )
+    subscribed = await is_user_subscribed(user.id)
     if subscribed:
         # Compose the URL with the UID parameter
         base_url = config.SERVER_URL
@@ -109,11 +105,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def catalog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /catalog command - quick access to book catalog."""
     user = update.effective_user
-    if user is None:
+    if user is None or await _throttled(update, user.id):
         return
-    subscribed = await asyncio.get_event_loop().run_in_executor(
-        None, is_user_subscribed, user.id
-    )
+    subscribed = await is_user_subscribed(user.id)
     if subscribed:
         # Compose the URL with the UID parameter
         base_url = config.SERVER_URL
@@ -149,6 +143,7 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     keyboard = [
         [InlineKeyboardButton("Добавить книгу", callback_data="admin_addbook")],
         [InlineKeyboardButton("Добавить главу", callback_data="admin_addchapter")],
+        [InlineKeyboardButton("Импортировать книгу из файла", callback_data="admin_import")],
         [InlineKeyboardButton("Добавить подписчика", callback_data="admin_addsubscriber")],
     ]
     await update.message.reply_text(
@@ -194,7 +189,7 @@ async def add_book_cover(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     try:
-        book_id = database.add_book(title, description, cover_url)
+        book_id = await async_database.add_book(title, description, cover_url)
         await update.message.reply_text(
             f"Книга '{title}' добавлена с id {book_id}."
         )
@@ -208,15 +203,15 @@ async def add_book_cover(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # Chapter creation flow
 async def add_chapter_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.callback_query.answer()
-    # Build inline keyboard with available books
+    # Build inline keyboard with available books from the catalog snapshot
     try:
-        books = database.get_books_summary()
-    except Exception:
-        books = []
+        books = (await async_database.run(catalog_snapshot.current)).books
+    except sqlite3.Error:
+        books = ()
     keyboard: list[list[InlineKeyboardButton]] = []
     for book in books:
         keyboard.append([
-            InlineKeyboardButton(book["title"], callback_data=f"choose_book_{book['id']}")
+            InlineKeyboardButton(book.title, callback_data=f"choose_book_{book.id}")
         ])
     if not keyboard:
         await update.callback_query.edit_message_text(
@@ -257,11 +252,11 @@ async def chapter_content(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     # Verify book exists and insert chapter
-    if database.get_book_detail(book_id) is None:
+    if await async_database.get_book_detail(book_id) is None:
         await update.message.reply_text("Книга не найдена. Попробуйте снова.")
         return ConversationHandler.END
     try:
-        chapter_id = database.add_chapter(book_id, title, content)
+        chapter_id = await async_database.add_chapter(book_id, title, content)
         await update.message.reply_text(
             f"Глава '{title}' добавлена в книгу с id {book_id}. Id главы: {chapter_id}."
         )
@@ -272,6 +267,63 @@ async def chapter_content(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     return ConversationHandler.END
 
 
+# Book import flow
+async def import_book_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    await update.callback_query.edit_message_text(
+        "Отправьте файл книги документом: FB2, EPUB, Markdown/TXT "
+        "или zip‑архив с главами в Markdown."
+    )
+    return IMPORT_BOOK_FILE
+
+
+async def import_book_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    document = update.message.document
+    name = document.file_name or "book"
+    if not name.lower().endswith(importer.SUPPORTED_EXTENSIONS):
+        await update.message.reply_text(
+            "Этот формат не поддерживается. Отправьте FB2, EPUB, MD, TXT или ZIP:"
+        )
+        return IMPORT_BOOK_FILE
+    status = await update.message.reply_text("Загружаю файл…")
+    loop = asyncio.get_running_loop()
+    last_report = 0.0
+    pending_edits = []
+
+    def report(done: int) -> None:
+        # Called from the import thread; edit the status message at most
+        # once every two seconds to stay within Telegram's rate limits.
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report >= 2:
+            last_report = now
+            pending_edits.append(asyncio.run_coroutine_threadsafe(
+                status.edit_text(f"Импортировано глав: {done}…"), loop
+            ))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, os.path.basename(name))
+        try:
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_drive(path)
+            await status.edit_text("Импортирую главы…")
+            book_id, count = await async_database.run(
+                importer.import_book, path, progress=report
+            )
+        except Exception as exc:
+            book_id = None
+            error = exc
+        # Let progress edits land first so they cannot overwrite the result.
+        await asyncio.gather(
+            *(asyncio.wrap_future(f) for f in pending_edits), return_exceptions=True
+        )
+    if book_id is None:
+        await status.edit_text(f"Не удалось импортировать книгу: {error}")
+        return ConversationHandler.END
+    await status.edit_text(f"Книга добавлена с id {book_id}. Глав импортировано: {count}.")
+    return ConversationHandler.END
+
+
 # Manual subscriber flow
 async def add_subscriber_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.callback_query.answer()
@@ -291,12 +343,13 @@ async def add_subscriber_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ADD_ALLOWED_USER_ID
     try:
-        if database.is_allowed_user(uid):
+        if await async_database.is_allowed_user(uid):
             await update.message.reply_text(
                 f"Пользователь {uid} уже находится в списке подписчиков."
             )
         else:
-            database.add_allowed_user(uid)
+            await async_database.add_allowed_user(uid)
+            verifier.invalidate(uid)
             await update.message.reply_text(
                 f"Пользователь {uid} добавлен в список подписчиков."
             )
@@ -314,6 +367,9 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 def register_handlers(application: Application) -> None:
     """Register all command, conversation and callback handlers with the application."""
+    # Conversations survive restarts when the application has persistence
+    persistent = application.persistence is not None
+
     # Core commands
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("catalog", catalog))
@@ -328,6 +384,8 @@ def register_handlers(application: Application) -> None:
             ADD_BOOK_COVER: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_book_cover)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_book",
+        persistent=persistent,
     )
     application.add_handler(addbook_conv)
 
@@ -340,9 +398,23 @@ def register_handlers(application: Application) -> None:
             CHAPTER_CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, chapter_content)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_chapter",
+        persistent=persistent,
     )
     application.add_handler(addchapter_conv)
 
+    # Import book conversation
+    import_conv = ConversationHandler(
+        entry_points=[CallbackQueryHandler(import_book_entry, pattern="^admin_import$")],
+        states={
+            IMPORT_BOOK_FILE: [MessageHandler(filters.Document.ALL, import_book_file)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="import_book",
+        persistent=persistent,
+    )
+    application.add_handler(import_conv)
+
     # Add subscriber conversation
     addsubscriber_conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(add_subscriber_entry, pattern="^admin_addsubscriber$")],
@@ -350,5 +422,23 @@ def register_handlers(application: Application) -> None:
             ADD_ALLOWED_USER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_subscriber_id)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_subscriber",
+        persistent=persistent,
     )
-    application.add_handler(addsubscriber_conv)
\ No newline at end of file
+    application.add_handler(addsubscriber_conv)
+
+    # Time every callback, including those nested in conversations.
+    for group in application.handlers.values():
+        for handler in group:
+            _instrument_handler(handler)
+
+
+def _instrument_handler(handler: BaseHandler) -> None:
+    if isinstance(handler, ConversationHandler):
+        nested = [*handler.entry_points, *handler.fallbacks]
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for inner in nested:
+            _instrument_handler(inner)
+    else:
+        handler.callback = metrics.timed_callback(handler.callback)
@@ -0,0 +1,276 @@
+"""
+Pooled HTTP clients with retry and a circuit breaker for external APIs.
+
+``requests.get`` opens a new TCP and TLS connection for every call.
+:class:`HTTPClient` keeps a per‑process :class:`requests.Session` whose
+connections are reused, and :class:`AsyncHTTPClient` is its ``httpx``
+counterpart for code running on the bot's event loop.  Both use short
+connect and read timeouts, retry connection errors and 429/5xx answers
+with jittered exponential backoff, and share a :class:`CircuitBreaker`:
+after repeated failures calls fail immediately with
+:class:`CircuitOpenError` instead of tying up a worker for the full
+timeout, and callers fall back to local state.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+# Answers worth retrying: rate limiting and server‑side failures.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Classic closed → open → half‑open circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    :meth:`allow` refuses calls for ``reset_timeout`` seconds.  Then a
+    single trial call is let through (half‑open); its success closes the
+    circuit again, its failure re‑opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.opened_total = 0
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (
+                state == self.CLOSED and self._failures >= self._failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._trial_running = False
+                self.opened_total += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the state, consecutive failures and how often the circuit opened."""
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = max(0.0, self._opened_at + self._reset_timeout - self._clock())
+            return {
+                "state": state,
+                "failures": self._failures,
+                "opened_total": self.opened_total,
+                "retry_in": retry_in,
+            }
+
+
+def retry_delay(attempt: int, backoff: float) -> float:
+    """Full‑jitter exponential backoff before retry number ``attempt`` (0‑based)."""
+    return random.uniform(0, backoff * 2**attempt)
+
+
+def _observe(name: str, started: float, outcome: str) -> None:
+    metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, name, outcome)
+
+
+class HTTPClient:
+    """Blocking client: pooled ``requests`` session, retries, circuit breaker.
+
+    Responses are returned for any status that is not retried (including
+    4xx); the caller checks the status and, for ``stream=True`` requests,
+    closes the response.  Every attempt is timed in
+    ``metrics.UPSTREAM_LATENCY`` under ``name``.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.25,
+        name: str = "upstream",
+    ) -> None:
+        self.breaker = breaker
+        # Label of this client's upstream_request_duration_seconds.
+        self.name = name
+        self._pool_size = pool_size
+        self._timeout = (connect_timeout, read_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._pid = 0
+
+    def session(self) -> requests.Session:
+        """Return the shared session, creating a fresh one after a fork."""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open, not calling {url}")
+        kwargs.setdefault("timeout", self._timeout)
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session().get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                _observe(self.name, started, "error")
+                error: Exception = exc
+            except Exception:
+                _observe(self.name, started, "error")
+                self.breaker.record_failure()
+                raise
+            else:
+                _observe(self.name, started, f"{response.status_code // 100}xx")
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+                response.close()
+            if attempt >= self._retries:
+                self.breaker.record_failure()
+                raise error
+            time.sleep(retry_delay(attempt, self._backoff))
+            attempt += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AsyncHTTPClient:
+    """``httpx`` twin of :class:`HTTPClient` for coroutines.
+
+    One ``httpx.AsyncClient`` is kept per event loop.  :meth:`get` returns
+    a streaming response that the caller must ``aclose()``.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.25,
+        name: str = "upstream",
+    ) -> None:
+        self.breaker = breaker
+        # Label of this client's upstream_request_duration_seconds.
+        self.name = name
+        self._limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+            self._loop = loop
+        return self._client
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open, not calling {url}")
+        client = self.client()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await client.send(client.build_request("GET", url, **kwargs), stream=True)
+            except httpx.TransportError as exc:
+                _observe(self.name, started, "error")
+                error: Exception = exc
+            except Exception:
+                _observe(self.name, started, "error")
+                self.breaker.record_failure()
+                raise
+            else:
+                _observe(self.name, started, f"{response.status_code // 100}xx")
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {url}", request=response.request, response=response
+                )
+                await response.aclose()
+            if attempt >= self._retries:
+                self.breaker.record_failure()
+                raise error
+            await asyncio.sleep(retry_delay(attempt, self._backoff))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,415 @@
+"""
+Bulk import of whole books.
+
+Books can be imported from FB2 (optionally zipped), EPUB, a single
+Markdown/text file split on its headings, or a folder (or zip archive)
+of Markdown/text files with one chapter per file.  Parsing is streamed:
+chapters are produced one at a time and written in batches inside a
+single transaction (see ``database.add_chapters``), so even very large
+books never have to fit in memory.
+
+The importer is used by the admin document upload in ``handlers.py``
+and can be run from the command line::
+
+    python -m bot.importer path/to/book.fb2 --title "Другое название"
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import posixpath
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import ExitStack, closing
+from html.parser import HTMLParser
+from typing import IO, Any, Callable, Iterator, List, NamedTuple, Optional
+
+from . import database
+
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown", ".txt")
+SUPPORTED_EXTENSIONS = (".fb2", ".epub", ".zip") + MARKDOWN_EXTENSIONS
+
+# FB2 elements whose text makes up the body of a section.
+_FB2_TEXT_TAGS = {"p", "subtitle", "poem", "cite", "epigraph", "text-author", "table"}
+# XHTML elements that start a new paragraph when extracting EPUB text.
+_HTML_BLOCK_TAGS = {
+    "p", "div", "li", "blockquote", "pre", "br", "tr",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+}
+_HTML_HEADING_TAGS = {"h1", "h2", "h3"}
+_MARKDOWN_HEADING_RE = re.compile(r"^(#{1,2})\s+(.+?)\s*#*\s*$")
+
+
+class ParsedBook(NamedTuple):
+    """Book metadata plus a lazy iterator of ``(title, content)`` chapters.
+
+    ``chapters`` has a ``close()`` method that releases the open file;
+    call it if the iterator is not exhausted.
+    """
+
+    title: str
+    description: str
+    chapters: Iterator[tuple[str, str]]
+
+
+def _local(tag: str) -> str:
+    """Strip the XML namespace from an element tag."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(elem: ET.Element) -> str:
+    return " ".join("".join(elem.itertext()).split())
+
+
+# FB2
+
+
+def _parse_fb2(stream: IO[bytes]) -> ParsedBook:
+    events = ET.iterparse(stream, events=("start", "end"))
+    title = ""
+    description = ""
+    for event, elem in events:
+        tag = _local(elem.tag)
+        if event == "end" and tag == "book-title" and not title:
+            title = _text(elem)
+        elif event == "end" and tag == "annotation" and not description:
+            description = "\n\n".join(
+                _text(p) for p in elem if _local(p.tag) == "p" and _text(p)
+            )
+        elif event == "start" and tag == "body":
+            return ParsedBook(title, description, _iter_fb2_sections(events, elem))
+    return ParsedBook(title, description, iter(()))
+
+
+def _iter_fb2_sections(events: Iterator, body: ET.Element) -> Iterator[tuple[str, str]]:
+    """Yield the text of every section in document order, freeing it afterwards.
+
+    A section's text before its first nested section (the introduction
+    of a part) is yielded when that nested section starts, so it comes
+    before the chapters that follow it.
+    """
+    skip = body.get("name") in {"notes", "comments"}
+    # Open sections, outermost first: [element, title].
+    sections: List[List[Any]] = []
+    for event, elem in events:
+        tag = _local(elem.tag)
+        if tag == "body":
+            if event == "start":
+                skip = elem.get("name") in {"notes", "comments"}
+            continue
+        if tag == "title" and event == "end":
+            if sections and not sections[-1][1]:
+                sections[-1][1] = _text(elem)
+            continue
+        if tag != "section":
+            continue
+        if event == "start":
+            if sections:
+                chapter = _fb2_chapter(sections, skip)
+                if chapter:
+                    yield chapter
+            sections.append([elem, ""])
+            continue
+        chapter = _fb2_chapter(sections, skip)
+        sections.pop()
+        elem.clear()
+        if chapter:
+            yield chapter
+
+
+def _fb2_chapter(sections: List[List[Any]], skip: bool) -> Optional[tuple[str, str]]:
+    """Take the text read so far out of the innermost open section."""
+    section, own_title = sections[-1]
+    paragraphs = []
+    for child in list(section):
+        if _local(child.tag) in _FB2_TEXT_TAGS:
+            text = "\n".join(
+                _text(line) for line in child.iter() if _local(line.tag) in {"p", "v"}
+            ) or _text(child)
+            if text:
+                paragraphs.append(text)
+            section.remove(child)
+    if skip or not paragraphs:
+        return None
+    # Untitled sections (e.g. a prologue inside a part) inherit the
+    # title of the nearest titled ancestor.
+    title = own_title or next((t for _, t in reversed(sections) if t), "Без названия")
+    return title, "\n\n".join(paragraphs)
+
+
+# EPUB
+
+
+class _XHTMLText(HTMLParser):
+    """Collect paragraphs and the first heading of an XHTML document."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = []
+        self.heading = ""
+        self._current: List[str] = []
+        self._in_heading = False
+        self._skip = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._current).split())
+        self._current = []
+        if not text:
+            return
+        if self._in_heading and not self.heading:
+            self.heading = text
+        else:
+            self.paragraphs.append(text)
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in {"script", "style", "head"}:
+            self._skip += 1
+        elif tag in _HTML_BLOCK_TAGS:
+            self._flush()
+            self._in_heading = tag in _HTML_HEADING_TAGS
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in {"script", "style", "head"}:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _HTML_BLOCK_TAGS:
+            self._flush()
+            self._in_heading = False
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self._current.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def _parse_epub(path: str) -> ParsedBook:
+    with zipfile.ZipFile(path) as zf:
+        container = ET.fromstring(zf.read("META-INF/container.xml"))
+        rootfile = next(e for e in container.iter() if _local(e.tag) == "rootfile")
+        opf_path = rootfile.get("full-path", "")
+        opf = ET.fromstring(zf.read(opf_path))
+    metadata = {}
+    manifest = {}
+    spine: List[str] = []
+    for elem in opf.iter():
+        tag = _local(elem.tag)
+        if tag in {"title", "description"} and tag not in metadata:
+            metadata[tag] = _text(elem)
+        elif tag == "item":
+            manifest[elem.get("id")] = elem.get("href", "")
+        elif tag == "itemref":
+            spine.append(elem.get("idref"))
+    base = posixpath.dirname(opf_path)
+    hrefs = [posixpath.normpath(posixpath.join(base, manifest[i])) for i in spine if i in manifest]
+    description = metadata.get("description", "")
+    if "<" in description:
+        parser = _XHTMLText()
+        parser.feed(description)
+        parser.close()
+        description = "\n\n".join(parser.paragraphs)
+    title = metadata.get("title") or os.path.splitext(os.path.basename(path))[0]
+    return ParsedBook(title, description, _iter_epub_chapters(path, hrefs))
+
+
+def _iter_epub_chapters(path: str, hrefs: List[str]) -> Iterator[tuple[str, str]]:
+    with zipfile.ZipFile(path) as zf:
+        number = 0
+        for href in hrefs:
+            parser = _XHTMLText()
+            parser.feed(zf.read(href).decode("utf-8", errors="replace"))
+            parser.close()
+            if not parser.paragraphs:
+                continue
+            number += 1
+            yield parser.heading or f"Глава {number}", "\n\n".join(parser.paragraphs)
+
+
+# Markdown / plain text
+
+
+def _split_markdown(lines: List[str], default_title: str) -> ParsedBook:
+    """Split a single Markdown file into chapters on its headings.
+
+    A file with exactly one ``#`` heading and some ``##`` headings uses
+    the former as the book title and splits chapters on the latter;
+    otherwise chapters are split on ``#``.
+    """
+    headings = [m for m in map(_MARKDOWN_HEADING_RE.match, lines) if m]
+    top = [m.group(2) for m in headings if len(m.group(1)) == 1]
+    split_level = 2 if len(top) == 1 and len(headings) > 1 else 1
+    title = top[0] if split_level == 2 else default_title
+
+    def chapters() -> Iterator[tuple[str, str]]:
+        chapter_title: Optional[str] = None
+        body: List[str] = []
+        for line in lines:
+            match = _MARKDOWN_HEADING_RE.match(line)
+            level = len(match.group(1)) if match else 0
+            if level and level < split_level:
+                continue
+            if level == split_level:
+                if chapter_title is not None or "".join(body).strip():
+                    yield chapter_title or default_title, "".join(body).strip()
+                chapter_title, body = match.group(2), []
+            else:
+                body.append(line)
+        if chapter_title is not None or "".join(body).strip():
+            yield chapter_title or default_title, "".join(body).strip()
+
+    return ParsedBook(title, "", chapters())
+
+
+def _markdown_chapter(name: str, text: str) -> tuple[str, str]:
+    """One chapter per file: the leading heading, if any, is its title."""
+    stripped = text.lstrip("\ufeff").strip()
+    first, _, rest = stripped.partition("\n")
+    match = _MARKDOWN_HEADING_RE.match(first)
+    if match:
+        return match.group(2), rest.strip()
+    return os.path.splitext(os.path.basename(name))[0], stripped
+
+
+def _natural_key(name: str) -> list:
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def _parse_markdown_folder(path: str) -> ParsedBook:
+    names = sorted(
+        (n for n in os.listdir(path) if n.lower().endswith(MARKDOWN_EXTENSIONS)),
+        key=_natural_key,
+    )
+
+    def chapters() -> Iterator[tuple[str, str]]:
+        for name in names:
+            with open(os.path.join(path, name), encoding="utf-8") as f:
+                yield _markdown_chapter(name, f.read())
+
+    return ParsedBook(os.path.basename(os.path.normpath(path)), "", chapters())
+
+
+def _parse_zip(path: str) -> ParsedBook:
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist() if not n.endswith("/")]
+    fb2 = [n for n in names if n.lower().endswith(".fb2")]
+    if fb2:
+        with ExitStack() as stack:
+            zf = stack.enter_context(zipfile.ZipFile(path))
+            book = _parse_fb2(stack.enter_context(zf.open(fb2[0])))
+            return book._replace(chapters=_Closing(book.chapters, stack.pop_all()))
+    texts = sorted((n for n in names if n.lower().endswith(MARKDOWN_EXTENSIONS)), key=_natural_key)
+    if not texts:
+        raise ValueError("В архиве нет файлов FB2 или Markdown.")
+
+    def chapters() -> Iterator[tuple[str, str]]:
+        with zipfile.ZipFile(path) as zf:
+            for name in texts:
+                yield _markdown_chapter(name, zf.read(name).decode("utf-8"))
+
+    return ParsedBook(os.path.splitext(os.path.basename(path))[0], "", chapters())
+
+
+class _Closing:
+    """Chapters iterator that closes ``resource`` once exhausted, failed or closed."""
+
+    def __init__(self, chapters: Iterator[tuple[str, str]], resource: ExitStack) -> None:
+        self._chapters = chapters
+        self._resource = resource
+
+    def __iter__(self) -> "_Closing":
+        return self
+
+    def __next__(self) -> tuple[str, str]:
+        try:
+            return next(self._chapters)
+        except BaseException:  # StopIteration included
+            self.close()
+            raise
+
+    def close(self) -> None:
+        self._resource.close()
+
+
+def parse_book(path: str) -> ParsedBook:
+    """Detect the format of ``path`` and return its metadata and chapters.
+
+    Raises ``ValueError`` for unsupported formats.
+    """
+    if os.path.isdir(path):
+        return _parse_markdown_folder(path)
+    name = path.lower()
+    default_title = os.path.splitext(os.path.basename(path))[0]
+    if name.endswith(".fb2"):
+        with ExitStack() as stack:
+            book = _parse_fb2(stack.enter_context(open(path, "rb")))
+            book = book._replace(chapters=_Closing(book.chapters, stack.pop_all()))
+    elif name.endswith(".epub"):
+        book = _parse_epub(path)
+    elif name.endswith(".zip"):
+        book = _parse_zip(path)
+    elif name.endswith(MARKDOWN_EXTENSIONS):
+        with open(path, encoding="utf-8") as f:
+            book = _split_markdown(f.readlines(), default_title)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {os.path.basename(path)}")
+    return book._replace(title=book.title or default_title)
+
+
+def import_book(
+    path: str,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+    cover_url: Optional[str] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> tuple[int, int]:
+    """Import a whole book file and return ``(book_id, chapter_count)``.
+
+    The book and all of its chapters are written in one transaction, so
+    a parse error part‑way through leaves the database unchanged.
+    ``title`` and ``description`` override the values found in the file.
+    ``progress`` is called with the number of chapters stored so far.
+    """
+    book = parse_book(path)
+    with closing(book.chapters), database.transaction():
+        book_id = database.add_book(
+            title or book.title,
+            book.description if description is None else description,
+            cover_url,
+        )
+        chapter_ids = database.add_chapters(book_id, book.chapters, progress=progress)
+        if not chapter_ids:
+            raise ValueError("В файле не найдено ни одной главы.")
+    return book_id, len(chapter_ids)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Импорт книги в базу данных бота.")
+    parser.add_argument("path", help="FB2, EPUB, Markdown‑файл, zip‑архив или папка с главами")
+    parser.add_argument("--title", help="название книги (по умолчанию берётся из файла)")
+    parser.add_argument("--description", help="описание книги")
+    parser.add_argument("--cover-url", help="URL обложки")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+
+    def report(done: int) -> None:
+        print(f"\rИмпортировано глав: {done}", end="", file=sys.stderr, flush=True)
+
+    try:
+        book_id, count = import_book(
+            args.path, args.title, args.description, args.cover_url, progress=report
+        )
+    except (OSError, ValueError, ET.ParseError, zipfile.BadZipFile, KeyError) as exc:
+        print(f"\nОшибка импорта: {exc}", file=sys.stderr)
+        return 1
+    print(f"\nКнига добавлена с id {book_id}, глав: {count}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
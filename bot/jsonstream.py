@@ -0,0 +1,159 @@
+"""
+Incremental parsing of large JSON objects that wrap one big array.
+
+API responses such as Tribute's subscriber list look like
+``{"result": [{...}, {...}, ...], "next": ...}``.  Decoding them with
+``response.json()`` needs the whole body in memory at once.
+:class:`ArrayStreamParser` is fed the body chunk by chunk instead and
+hands out the elements of the array under one top‑level key as soon as
+each element is complete.  Memory use is bounded by the largest single
+element, not by the size of the response.  Other top‑level keys (for
+example pagination cursors) are collected in :attr:`ArrayStreamParser.extra`.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Parser states
+_START, _KEY, _COLON, _VALUE, _AFTER_VALUE, _ITEM_OR_END, _ITEM, _AFTER_ITEM, _DONE = range(9)
+
+
+class ArrayStreamParser:
+    """Push parser for ``{"<key>": [items...], ...}`` documents.
+
+    Call :meth:`feed` with each chunk of bytes and iterate over the items
+    it returns, then call :meth:`close`.  Malformed input raises
+    ``ValueError``.
+    """
+
+    def __init__(self, key: str, max_item_size: int = 1 << 20) -> None:
+        self.key = key
+        self.extra: Dict[str, Any] = {}
+        self._max_item_size = max_item_size
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = _START
+        self._current_key = ""
+        self._closed = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Consume a chunk of the document and return the completed items."""
+        self._buf = self._buf[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        items: List[Any] = []
+        self._parse(items)
+        if len(self._buf) - self._pos > self._max_item_size:
+            raise ValueError("JSON value exceeds the maximum item size")
+        return items
+
+    def close(self) -> List[Any]:
+        """Signal the end of the document and return any remaining items."""
+        self._buf = self._buf[self._pos:] + self._text.decode(b"", final=True)
+        self._pos = 0
+        self._closed = True
+        items: List[Any] = []
+        self._parse(items)
+        self._skip_whitespace()
+        if self._state != _DONE or self._pos != len(self._buf):
+            raise ValueError("Incomplete or malformed JSON document")
+        return items
+
+    def _skip_whitespace(self) -> bool:
+        """Advance past whitespace; return False if the buffer is exhausted."""
+        self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+        return self._pos < len(self._buf)
+
+    def _expect(self, chars: str) -> str:
+        char = self._buf[self._pos]
+        if char not in chars:
+            raise ValueError(f"Unexpected {char!r} at offset {self._pos} in JSON stream")
+        self._pos += 1
+        return char
+
+    def _decode_value(self) -> tuple[bool, Any]:
+        """Decode one complete JSON value at the current position.
+
+        Returns ``(False, None)`` if more input is needed.  A number that
+        ends exactly at the end of the buffer might continue in the next
+        chunk, so it is only accepted once the stream is closed.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise ValueError(f"Malformed JSON value at offset {self._pos}") from None
+            return False, None
+        if end == len(self._buf) and not self._closed and not isinstance(value, (dict, list, str)):
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _parse(self, items: List[Any]) -> None:
+        while self._state != _DONE and self._skip_whitespace():
+            state = self._state
+            if state == _START:
+                self._expect("{")
+                self._state = _KEY
+            elif state == _KEY:
+                if self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = _DONE
+                    continue
+                if self._buf[self._pos] != '"':
+                    self._expect('"')
+                ok, key = self._decode_value()
+                if not ok:
+                    return
+                self._current_key = key
+                self._state = _COLON
+            elif state == _COLON:
+                self._expect(":")
+                self._state = _VALUE
+            elif state == _VALUE:
+                if self._current_key == self.key and self._buf[self._pos] == "[":
+                    self._pos += 1
+                    self._state = _ITEM_OR_END
+                    continue
+                ok, value = self._decode_value()
+                if not ok:
+                    return
+                self.extra[self._current_key] = value
+                self._state = _AFTER_VALUE
+            elif state == _AFTER_VALUE:
+                self._state = _KEY if self._expect(",}") == "," else _DONE
+            elif state == _ITEM_OR_END:
+                if self._buf[self._pos] == "]":
+                    self._pos += 1
+                    self._state = _AFTER_VALUE
+                else:
+                    self._state = _ITEM
+            elif state == _ITEM:
+                ok, item = self._decode_value()
+                if not ok:
+                    return
+                items.append(item)
+                self._state = _AFTER_ITEM
+            elif state == _AFTER_ITEM:
+                self._state = _ITEM if self._expect(",]") == "," else _AFTER_VALUE
+
+
+def iter_array(chunks: Iterable[bytes], key: str, extra: Dict[str, Any] | None = None) -> Iterator[Any]:
+    """Yield the items of the array under ``key`` from a stream of byte chunks.
+
+    If ``extra`` is given it is updated with the other top‑level keys once
+    the whole document has been read.
+    """
+    parser = ArrayStreamParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+    if extra is not None:
+        extra.update(parser.extra)
@@ -1,35 +1,52 @@
 """
 Entry point for running the book bot and web server.
 
-This script initialises the database, starts the Flask web server in a
-background thread and launches the Telegram bot using python‑telegram‑bot.
+``python -m bot.main [all|bot|web]`` initialises the database and then
+runs the Telegram bot, the web server, or both (the default, see
+``config.RUN_MODE``).  The web server runs under gunicorn (see
+``web.py``); in ``all`` mode it is started in a child process so that
+it does not share the bot's interpreter and is stopped together with
+the bot.  Running ``bot`` and ``web`` as two services lets each be
+scaled and restarted on its own; they share the SQLite database.
+
+The bot receives updates through a webhook when ``config.WEBHOOK_URL``
+is set (see ``webhook.py``) and by long polling otherwise, or if
+Telegram refuses the webhook.
 """
 
 from __future__ import annotations
 
-import threading
+import argparse
+import multiprocessing
+import tempfile
+from typing import List, Optional
 
 from telegram.ext import Application
 
-from . import config, database, server, handlers
+from . import async_database, config, database, handlers, metrics, persistence, tribute, updateprocessor, web, webhook
 
+MODES = ("all", "bot", "web")
 
-def main() -> None:
-    # Initialise the database
-    database.init_db()
-
-    # Create and start the Flask web server in a separate thread
-    flask_app = server.create_app()
 
-    def run_flask() -> None:
-        # Bind to all interfaces on port 8000; adjust as needed
-        flask_app.run(host="0.0.0.0", port=8000)
+def run_bot() -> None:
+    """Run the Telegram bot until it is stopped."""
+    if config.METRICS_DIR:
+        metrics.share(config.METRICS_DIR, "bot")
 
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
+    # Keep the local mirror of Tribute subscribers up to date
+    stop_sync = tribute.start_background_sync() if config.TRIBUTE_API_KEY else None
 
-    # Build the Telegram bot application
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    # Build the Telegram bot application; updates from different chats
+    # are handled concurrently, those from one chat in order
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(updateprocessor.ChatOrderedUpdateProcessor(config.UPDATE_CONCURRENCY))
+    )
+    if config.PERSISTENCE_ENABLED:
+        # Keep conversations and user_data across restarts
+        builder = builder.persistence(persistence.SQLitePersistence())
+    application = builder.build()
 
     # Expose the server URL to handlers via bot_data (if needed)
     application.bot_data["server_url"] = config.SERVER_URL
@@ -37,9 +54,49 @@ def main() -> None:
     # Register command and conversation handlers
     handlers.register_handlers(application)
 
-    # Start polling
-    application.run_polling()
+    # Receive updates through the webhook, or poll for them
+    try:
+        if not (config.WEBHOOK_URL and webhook.run_webhook(application)):
+            application.run_polling()
+    finally:
+        if stop_sync is not None:
+            stop_sync()
+        async_database.shutdown()
+        tribute.client.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the book bot and/or its web server.")
+    parser.add_argument("mode", nargs="?", choices=MODES, default=config.RUN_MODE)
+    args = parser.parse_args(argv)
+
+    # Initialise the database
+    database.init_db()
+
+    if args.mode != "bot":
+        # The web server's /metrics reports the bot and every worker;
+        # they publish their metrics here (see metrics.py).
+        config.METRICS_DIR = config.METRICS_DIR or tempfile.mkdtemp(prefix="book-bot-metrics-")
+        metrics.clear_shared(config.METRICS_DIR)
+
+    if args.mode == "web":
+        web.serve()
+        return
+
+    web_process = None
+    if args.mode == "all":
+        # Fork the web server before any threads are started here and
+        # without open database connections.
+        database.close_connections()
+        web_process = multiprocessing.Process(target=web.serve, name="web")
+        web_process.start()
+    try:
+        run_bot()
+    finally:
+        if web_process is not None:
+            web_process.terminate()  # SIGTERM: gunicorn shuts down gracefully
+            web_process.join(config.WEB_GRACEFUL_TIMEOUT + 5)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,417 @@
+"""
+Latency histograms and counters exposed in the Prometheus text format.
+
+The metrics below are recorded in process and rendered by the web
+server at ``/metrics``:
+
+* ``http_request_duration_seconds`` for every Flask endpoint
+  (see :func:`init_app`);
+* ``db_call_duration_seconds`` for every public function of
+  ``database.py`` (see :func:`instrument_module`);
+* ``bot_handler_duration_seconds`` for every Telegram handler callback
+  (see :func:`timed_callback`);
+* ``upstream_request_duration_seconds`` for every HTTP attempt made by
+  ``httpclient``;
+* ``cache_requests_total`` for the verifier, catalog snapshot and
+  compressed body caches, so hit ratios can be computed.
+
+Recording is a ``perf_counter`` pair, a bisect and a dict update under
+an uncontended lock: a few microseconds per call.
+
+The bot and the gunicorn workers are separate processes.  After
+:func:`share` each of them writes a snapshot of its metrics to
+``config.METRICS_DIR`` every ``config.METRICS_FLUSH_INTERVAL`` seconds,
+and ``/metrics`` adds up the snapshots of all processes.  Gauges are
+reported per process with a ``pid`` label instead of being added up.
+Snapshots of processes that have exited are deleted when read, so a
+restarted worker's totals start over like any restarted process's.
+"""
+
+from __future__ import annotations
+
+import atexit
+import bisect
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, g, request
+
+from . import config, session
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets: from a cached
+# SQLite read to a slow upstream call.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+# name -> metric, in registration order.
+REGISTRY: Dict[str, "_Metric"] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        collect: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Called at collection time instead of recording values.
+        self._collect = collect
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+        REGISTRY[name] = self
+
+    def reset(self) -> None:
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def values(self) -> Dict[Labels, Any]:
+        if self._collect is not None:
+            return {tuple(str(v) for v in labels): value for labels, value in self._collect().items()}
+        with self._lock:
+            return {
+                labels: list(value) if isinstance(value, list) else value
+                for labels, value in self._values.items()
+            }
+
+
+class Counter(_Metric):
+    """Monotonic counter; ``name`` should end in ``_total``."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Current value, usually read from its owner by ``collect``."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Per label set: one count per bucket plus +Inf (not cumulative),
+        # then the sum of observed values.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Flask request handling time.", ("endpoint", "method", "status")
+)
+DB_LATENCY = Histogram("db_call_duration_seconds", "Time spent in database.py functions.", ("function",))
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Telegram handler callback time.", ("handler", "outcome")
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Outbound HTTP attempts, until the response headers arrive.",
+    ("upstream", "outcome"),
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+
+
+def _timed(histogram: Histogram, func: Callable, *labels: str) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, *labels)
+
+    return wrapper
+
+
+def instrument_module(namespace: Dict[str, Any], histogram: Histogram, exclude: Iterable[str] = ()) -> None:
+    """Time every public function defined in a module, labelled by name.
+
+    Call it at the end of the module with ``globals()``; the functions
+    are replaced in place, so callers that look them up as module
+    attributes (``database.get_book_detail``) are timed too.  Generator
+    and coroutine functions are left alone.
+    """
+    if not config.METRICS_ENABLED:
+        return
+    module = namespace["__name__"]
+    skip = set(exclude)
+    for name, func in list(namespace.items()):
+        if (
+            name.startswith("_")
+            or name in skip
+            or not inspect.isfunction(func)
+            or func.__module__ != module
+            or inspect.isgeneratorfunction(func)
+            or inspect.iscoroutinefunction(func)
+            or hasattr(func, "__wrapped__")
+        ):
+            continue
+        namespace[name] = _timed(histogram, func, name)
+
+
+def timed_callback(callback: Callable) -> Callable:
+    """Wrap a Telegram handler callback to record its run time and outcome."""
+    if not config.METRICS_ENABLED or hasattr(callback, "__wrapped__"):
+        return callback
+    name = getattr(callback, "__name__", type(callback).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await callback(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name, outcome)
+
+    return wrapper
+
+
+# --- Collection and sharing between processes ------------------------------
+
+_shared_dir: Optional[str] = None
+_role = ""
+_flusher: Optional[threading.Thread] = None
+
+
+def snapshot() -> Dict[str, Any]:
+    """This process's metrics as a JSON‑serialisable dict."""
+    return {
+        name: {
+            "kind": metric.kind,
+            "help": metric.help,
+            "labelnames": list(metric.labelnames),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "values": [[list(labels), value] for labels, value in metric.values().items()],
+        }
+        for name, metric in REGISTRY.items()
+    }
+
+
+def _merge(total: Dict[str, Any], other: Dict[str, Any], pid: Optional[int]) -> None:
+    for name, data in other.items():
+        merged = total.setdefault(name, {**data, "values": {}})
+        if data["kind"] == "gauge":
+            merged["labelnames"] = data["labelnames"] + ["pid"]
+        for labels, value in data["values"]:
+            if data["kind"] == "gauge":
+                merged["values"][tuple(labels) + (str(pid),)] = value
+                continue
+            key = tuple(labels)
+            current = merged["values"].get(key)
+            if current is None:
+                merged["values"][key] = value
+            elif isinstance(value, list):
+                merged["values"][key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged["values"][key] = current + value
+
+
+def collect() -> Dict[str, Any]:
+    """Metrics of all sharing processes (or just this one), added up."""
+    total: Dict[str, Any] = {}
+    _merge(total, snapshot(), os.getpid())
+    if _shared_dir is not None:
+        own = _snapshot_path()
+        for path in glob.glob(os.path.join(_shared_dir, "*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            if not _alive(data["pid"]):
+                # Left by a worker that has exited (e.g. after a reload);
+                # its replacement reports under its own pid.
+                _remove(path)
+                continue
+            _merge(total, data["metrics"], data["pid"])
+    return total
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: List[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render(metrics: Optional[Dict[str, Any]] = None) -> str:
+    """Prometheus text exposition (format 0.0.4) of ``collect()``."""
+    metrics = collect() if metrics is None else metrics
+    lines = []
+    for name, data in metrics.items():
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        names = data["labelnames"]
+        for labels, value in sorted(data["values"].items()):
+            if data["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*data["buckets"], float("inf")], value[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_path() -> str:
+    return os.path.join(_shared_dir, f"{_role}-{os.getpid()}.json")
+
+
+def flush() -> None:
+    """Write this process's snapshot for the others to read."""
+    if _shared_dir is None:
+        return
+    path = _snapshot_path()
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"pid": os.getpid(), "metrics": snapshot()}, fh)
+        os.replace(tmp, path)
+    except OSError:
+        logger.exception("Failed to write metrics to %s", path)
+
+
+def _flush_forever() -> None:
+    while True:
+        time.sleep(config.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def share(directory: str, role: str) -> None:
+    """Publish this process's metrics in ``directory`` and read the others'.
+
+    Call it in each process after it has been forked.
+    """
+    global _shared_dir, _role, _flusher
+    os.makedirs(directory, exist_ok=True)
+    _shared_dir, _role = directory, role
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True)
+        _flusher.start()
+        atexit.register(flush)
+
+
+def clear_shared(directory: str) -> None:
+    """Remove snapshots left in ``directory`` by earlier runs."""
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        _remove(path)
+
+
+def _after_fork() -> None:
+    # A forked child starts from zero (the parent keeps reporting its own
+    # values) and needs its own flusher.
+    global _shared_dir, _flusher
+    _shared_dir, _flusher = None, None
+    for metric in REGISTRY.values():
+        metric.reset()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+# --- Flask ----------------------------------------------------------------
+
+
+def init_app(app: Flask) -> None:
+    """Time every request and serve ``/metrics`` to the operator (see ``session.operator``)."""
+    if not config.METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.metrics_started = time.perf_counter()
+
+    def record(status: int) -> None:
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, request.method, str(status))
+
+    @app.after_request
+    def _record(response: Response) -> Response:
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_error(exc: Optional[BaseException]) -> None:
+        # Only reached with the timer still set if the request failed
+        # before a response was made.
+        record(500)
+
+    @app.route("/metrics")
+    @session.operator
+    def metrics() -> Response:
+        return app.response_class(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
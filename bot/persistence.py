@@ -0,0 +1,170 @@
+"""
+SQLite persistence for the bot's conversations and per‑user state.
+
+Without persistence the admin ``ConversationHandler`` flows and
+``context.user_data`` live only in memory, and a restart in the middle
+of adding a chapter or importing a book loses them.
+:class:`SQLitePersistence` keeps them in the ``bot_persistence`` table
+of the main database as JSON, one row per user, chat, conversation key
+and for ``bot_data``.
+
+State stays in memory.  python-telegram-bot hands over what changed
+every ``update_interval`` seconds and at shutdown; the changes are
+collected and written in a single transaction instead of one write per
+update.  ``user_data`` and ``chat_data`` are loaded lazily, on the first
+update from a user or chat after a start, so start‑up time does not grow
+with the number of users.  Only conversations in progress and
+``bot_data`` are loaded up front.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from . import async_database, config
+
+logger = logging.getLogger(__name__)
+
+# update_persistence() hands over the changes of one interval as a
+# single asyncio.gather; wait this long so they all go in one batch.
+_COALESCE_DELAY = 0.05
+
+_BOT_KEY = ""
+
+
+class SQLitePersistence(BasePersistence[Dict[str, Any], Dict[str, Any], Dict[str, Any]]):
+    """``BasePersistence`` storing state in the database in batches.
+
+    Values must be JSON serialisable (tuples come back as lists); an
+    entry that is not is logged and skipped.  Arbitrary callback data
+    is not stored.
+    """
+
+    def __init__(self, update_interval: float = config.PERSISTENCE_INTERVAL) -> None:
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        # Ids whose stored data has been merged into memory.
+        self._loaded: Dict[str, Set[int]] = {"user": set(), "chat": set()}
+        self._loading: Dict[tuple[str, int], asyncio.Future] = {}
+        # (kind, key) -> JSON, or None to delete; written by _write.
+        self._dirty: Dict[tuple[str, str], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    # Loading --------------------------------------------------------------
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}  # loaded per user in refresh_user_data
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}  # loaded per chat in refresh_chat_data
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        rows = await async_database.get_bot_persistence("bot", _BOT_KEY)
+        return json.loads(rows[_BOT_KEY]) if rows else {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        rows = await async_database.get_bot_persistence(f"conversation:{name}")
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows.items()}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        await self._load("user", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        await self._load("chat", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass  # only this process writes bot_data
+
+    async def _load(self, kind: str, key: int, data: Dict[str, Any]) -> None:
+        """Merge the stored data of ``key`` into ``data`` the first time it is seen."""
+        if key in self._loaded[kind]:
+            return
+        pending = self._loading.get((kind, key))
+        if pending is not None:
+            # Another update of the same user (in another chat) is loading it.
+            await asyncio.shield(pending)
+            return
+        pending = self._loading[(kind, key)] = asyncio.get_running_loop().create_future()
+        try:
+            rows = await async_database.get_bot_persistence(kind, str(key))
+            for name, value in json.loads(rows[str(key)]).items() if rows else ():
+                data.setdefault(name, value)
+            self._loaded[kind].add(key)
+        finally:
+            del self._loading[(kind, key)]
+            pending.set_result(None)
+
+    # Saving ---------------------------------------------------------------
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._update("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        self._update("chat", chat_id, data)
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        self._set("bot", _BOT_KEY, data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._set(f"conversation:{name}", json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._set("user", str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._set("chat", str(chat_id), None)
+
+    async def flush(self) -> None:
+        """Write all pending changes; called by the ``Application`` at shutdown."""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write()
+
+    def _update(self, kind: str, key: int, data: Dict[str, Any]) -> None:
+        if not data and key not in self._loaded[kind]:
+            # Never loaded (e.g. marked by a job): empty says nothing.
+            return
+        self._set(kind, str(key), data or None)
+
+    def _set(self, kind: str, key: str, value: Any) -> None:
+        try:
+            self._dirty[(kind, key)] = None if value is None else json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            logger.warning("Not persisting %s %s: not JSON serialisable", kind, key, exc_info=True)
+            return
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(_COALESCE_DELAY)
+        self._flush_task = None
+        try:
+            await self._write()
+        except Exception:
+            logger.exception("Could not save the bot state, will retry with the next changes")
+
+    async def _write(self) -> None:
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            changes, self._dirty = self._dirty, {}
+            try:
+                await async_database.save_bot_persistence(
+                    (kind, key, value) for (kind, key), value in changes.items()
+                )
+            except BaseException:
+                # Keep the batch for the next attempt unless newer values arrived.
+                for entry, value in changes.items():
+                    self._dirty.setdefault(entry, value)
+                raise
@@ -0,0 +1,193 @@
+"""
+Token‑bucket rate limiting for the HTTP API and the bot's commands.
+
+Each key (a client IP, a Telegram user id) owns a bucket of ``burst``
+tokens that refills at ``rate`` tokens per second; a request takes one
+token or is refused with the number of seconds until one is available.
+
+:class:`MemoryLimiter` keeps the buckets in a bounded LRU dict and costs
+a few microseconds per check.  Every gunicorn worker has its own, so
+the effective limit is multiplied by the number of workers;
+``RATE_LIMIT_BACKEND=sqlite`` selects :class:`SQLiteLimiter`, which
+keeps the buckets in a small separate SQLite file shared by all
+processes (tens of microseconds per check).
+
+:func:`init_app` applies the limits in ``RULES`` to the API endpoints
+and answers refused requests with ``429 Too Many Requests`` and
+``Retry-After``.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, NamedTuple, Optional, Union
+
+from flask import Flask, Response, jsonify, request
+
+from . import config, metrics
+
+REJECTED = metrics.Counter("rate_limited_total", "Requests refused by the rate limiter.", ("rule",))
+
+
+class Limit(NamedTuple):
+    rate: float
+    burst: float
+
+
+class MemoryLimiter:
+    """Token buckets in process memory, at most ``max_keys`` of them.
+
+    The least recently used bucket is dropped when the table is full; a
+    dropped bucket comes back full, which errs on the side of letting
+    requests through.
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self._max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (tokens, updated at)
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens; return 0.0, or the seconds to wait if refused."""
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = limit.burst
+                if len(self._buckets) >= self._max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+                self._buckets.move_to_end(key)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+        return (cost - tokens) / limit.rate
+
+
+class SQLiteLimiter:
+    """Token buckets in a SQLite file shared by all processes.
+
+    Each check is a single ``INSERT … ON CONFLICT DO UPDATE … RETURNING``
+    in its own transaction.  The file is separate from the main
+    database, so checks never wait for catalog writes; durability is
+    not needed and ``synchronous`` is off.  Buckets idle for longer than
+    ``idle_ttl`` seconds are purged now and then.
+    """
+
+    def __init__(self, path: str, idle_ttl: float = 3600.0, clock: Callable[[], float] = time.time) -> None:
+        self._path = path
+        self._idle_ttl = idle_ttl
+        self._clock = clock
+        self._local = threading.local()
+        self._checks = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def acquire(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens; return 0.0, or the seconds to wait if refused."""
+        now = self._clock()
+        conn = self._connection()
+        refill = "min(:burst, tokens + max(0, :now - updated) * :rate)"
+        row = conn.execute(
+            "INSERT INTO buckets (key, tokens, updated) VALUES (:key, :burst - :cost, :now) "
+            f"ON CONFLICT (key) DO UPDATE SET tokens = {refill} - :cost, updated = :now "
+            f"WHERE {refill} >= :cost "
+            "RETURNING tokens",
+            {"key": key, "burst": limit.burst, "rate": limit.rate, "cost": cost, "now": now},
+        ).fetchone()
+        self._checks += 1
+        if self._checks % 10_000 == 0:
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self._idle_ttl,))
+        if row is not None:
+            return 0.0
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        tokens = min(limit.burst, row[0] + max(0.0, now - row[1]) * limit.rate)
+        return max(0.0, (cost - tokens) / limit.rate)
+
+
+Limiter = Union[MemoryLimiter, SQLiteLimiter]
+
+
+def create_limiter(backend: Optional[str] = None) -> Limiter:
+    """The limiter selected by ``config.RATE_LIMIT_BACKEND``."""
+    backend = backend or config.RATE_LIMIT_BACKEND
+    if backend == "sqlite":
+        return SQLiteLimiter(config.RATE_LIMIT_DB)
+    if backend == "memory":
+        return MemoryLimiter(config.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown rate limit backend: {backend!r}")
+
+
+# Limits per rule: every API request counts against the client's "api"
+# bucket; /api/verify additionally against stricter per‑IP and per‑user
+# "verify" buckets, so cycling through user ids does not help, and
+# /api/session against the per‑IP one.
+RULES = {
+    "api": Limit(config.RATE_LIMIT_API_RATE, config.RATE_LIMIT_API_BURST),
+    "verify": Limit(config.RATE_LIMIT_VERIFY_RATE, config.RATE_LIMIT_VERIFY_BURST),
+    "command": Limit(config.RATE_LIMIT_COMMAND_RATE, config.RATE_LIMIT_COMMAND_BURST),
+}
+
+
+def check(limiter: Limiter, buckets: List[tuple[str, str]]) -> float:
+    """Take a token from each ``(rule, key)`` bucket in turn.
+
+    Returns 0.0 if all of them had one, otherwise the wait reported by
+    the first bucket that refused; the remaining buckets are left alone.
+    """
+    for rule, key in buckets:
+        wait = limiter.acquire(f"{rule}:{key}", RULES[rule])
+        if wait > 0:
+            REJECTED.inc(rule)
+            return wait
+    return 0.0
+
+
+def too_many_requests(wait: float) -> Response:
+    retry_after = max(1, math.ceil(wait))
+    response = jsonify({"error": "rate_limited", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def init_app(app: Flask, limiter: Optional[Limiter] = None) -> None:
+    """Rate limit the ``/api/`` endpoints of ``app``."""
+    if not config.RATE_LIMIT_ENABLED:
+        return
+    limiter = limiter or create_limiter()
+    app.extensions["ratelimit"] = limiter
+
+    @app.before_request
+    def _rate_limit() -> Optional[Response]:
+        if request.method == "OPTIONS" or not request.path.startswith("/api/"):
+            return None
+        client = request.remote_addr or "unknown"
+        buckets = [("api", client)]
+        if request.endpoint == "api_verify":
+            buckets += [("verify", client), ("verify", f"uid:{request.view_args['telegram_user_id']}")]
+        elif request.endpoint == "api_session":
+            buckets.append(("verify", client))
+        wait = check(limiter, buckets)
+        return too_many_requests(wait) if wait > 0 else None
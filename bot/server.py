@@ -9,19 +9,27 @@ logic used by the bot.
 from __future__ import annotations
 
 import os
-import datetime as _dt
-from flask import Flask, jsonify, send_from_directory, abort
+from typing import Callable
+
+from flask import Flask, Response, jsonify, abort, request, url_for
 from flask_cors import CORS
-import requests
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from . import config, database
+from . import assets, catalog, compression, config, database, metrics, ratelimit, session, tribute, verifier
 
 
 def create_app() -> Flask:
     """Create and configure the Flask application."""
     # Locate the built webapp directory (../webapp/dist relative to this file)
     static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "webapp", "dist")
-    app = Flask(__name__, static_folder=static_dir, static_url_path="/")
+    # No built-in static route: serve_vue below handles every file so it can
+    # pick precompressed variants and fall back to index.html for SPA routes.
+    app = Flask(__name__, static_folder=None)
+    app.static_folder = static_dir
+    if config.WEB_PROXY_COUNT:
+        # Take the client IP (used for rate limiting) from X-Forwarded-For.
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.WEB_PROXY_COUNT, x_proto=config.WEB_PROXY_COUNT)
+    assets.load_manifest(static_dir)
     
     # Enable CORS for Telegram Mini App
     CORS(app, origins=[
@@ -32,65 +40,206 @@ def create_app() -> Flask:
         "https://*.t.me"
     ])
 
+    def conditional(etag: str, build: Callable[[], Response]) -> Response:
+        # Answer If-None-Match with 304 before building the body; the
+        # validators are cheap revision lookups that never read content.
+        matched = next(
+            (tag for tag in compression.etag_variants(etag) if request.if_none_match.contains(tag)),
+            None,
+        )
+        if matched is not None:
+            response = app.response_class(status=304)
+            # Keep the validator of the representation the client holds.
+            etag = matched
+        else:
+            response = build()
+            if response.cache_control.no_store:
+                return response
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = config.API_CACHE_CONTROL
+        return response
+
+    # Metrics first: their after_request hook then runs last and the
+    # recorded time includes compression.
+    metrics.init_app(app)
+    ratelimit.init_app(app)
+    compression.init_app(app)
+
     @app.route("/api/books")
     def api_books() -> any:
+        # Optional keyset pagination: ?after=<last seen id>&limit=N.
+        # Chapter lists are only included with ?chapters=1.
+        after = request.args.get("after", 0, type=int)
+        limit = request.args.get("limit", type=int)
+        if limit is not None:
+            limit = max(1, min(limit, config.CATALOG_PAGE_MAX))
+        include_chapters = request.args.get("chapters") in {"1", "true", "yes"}
+
+        # Served from the in-memory snapshot; the body is pre-encoded JSON.
         try:
-            books = database.get_books_summary()
-            return jsonify(books)
+            snapshot = catalog.current()
         except Exception:
             return jsonify([])
 
+        def build() -> Response:
+            body, ids = snapshot.books_json(include_chapters, after=after, limit=limit)
+            response = app.response_class(body, mimetype="application/json")
+            if limit is not None and len(ids) == limit:
+                params = {"after": ids[-1], "limit": limit}
+                if include_chapters:
+                    params["chapters"] = 1
+                response.headers["Link"] = f'<{url_for("api_books", **params)}>; rel="next"'
+            return response
+
+        # Each page and chapters/no-chapters variant is its own representation.
+        variant = f"a{after}-l{limit or 0}-c{int(include_chapters)}"
+        return conditional(f"catalog-{snapshot.version}-{variant}", build)
+
     @app.route("/api/book/<int:book_id>")
+    @session.required
     def api_book(book_id: int) -> any:
-        book = database.get_book_detail(book_id)
+        snapshot = catalog.current()
+        book = snapshot.book(book_id)
         if book is None:
             abort(404)
-        return jsonify(book)
+        return conditional(
+            f"book-{book_id}-{book.revision}",
+            lambda: app.response_class(snapshot.book_json(book_id), mimetype="application/json"),
+        )
 
     @app.route("/api/book/<int:book_id>/chapter/<int:chapter_id>")
+    @session.required
     def api_chapter(book_id: int, chapter_id: int) -> any:
-        chapter = database.get_chapter_detail(book_id, chapter_id)
-        if chapter is None:
+        # ?page=N returns a single page; "pages" tells the reader how many
+        # there are so it can prefetch the next one.
+        page = request.args.get("page", type=int)
+        # The response carries prev/next chapter IDs, so they are part
+        # of the validator.
+        stamp = database.get_chapter_stamp(book_id, chapter_id)
+        if stamp is None:
+            abort(404)
+
+        def build() -> Response:
+            if page is not None:
+                chapter = database.get_chapter_page(book_id, chapter_id, page)
+            else:
+                chapter = database.get_chapter_detail(book_id, chapter_id)
+            if chapter is None:
+                abort(404)
+            return jsonify(chapter)
+
+        etag = "chapter-{}-{}-{}-{}".format(chapter_id, *stamp)
+        return conditional(etag if page is None else f"{etag}-p{page}", build)
+
+    @app.route("/api/book/<int:book_id>/chapters")
+    @session.required
+    def api_chapters(book_id: int) -> any:
+        # Several chapters in one round trip: ?ids=1,2,3 or ?from=<id>&count=N
+        # (reading order, at most CHAPTER_BATCH_MAX).  Any change to a
+        # book's chapters changes the book's revision, which is therefore
+        # a validator for every batch.
+        book = catalog.current().book(book_id)
+        if book is None:
             abort(404)
-        return jsonify(chapter)
+        limit = max(1, config.CHAPTER_BATCH_MAX)
+        if "ids" in request.args:
+            try:
+                ids = [int(part) for part in request.args["ids"].split(",") if part.strip()]
+            except ValueError:
+                abort(400)
+            if not ids or len(ids) > limit:
+                abort(400)
+            key = "ids-" + ".".join(map(str, ids))
+            fetch = lambda: database.get_chapters(book_id, ids=ids)
+        elif "from" in request.args:
+            start = request.args.get("from", type=int)
+            if start is None:
+                abort(400)
+            count = max(1, min(request.args.get("count", limit, type=int), limit))
+            key = f"from-{start}-{count}"
+            fetch = lambda: database.get_chapters(book_id, start=start, count=count)
+        else:
+            abort(400)
+
+        def build() -> Response:
+            return jsonify({"bookId": book_id, "chapters": fetch()})
+
+        return conditional(f"chapters-{book_id}-{book.revision}-{key}", build)
+
+    @app.route("/api/search")
+    @session.required
+    def api_search() -> any:
+        query = request.args.get("q", "").strip()
+        limit = max(1, min(request.args.get("limit", 20, type=int), config.CATALOG_PAGE_MAX))
+        offset = max(0, request.args.get("offset", 0, type=int))
+        result = database.search(query, limit=limit, offset=offset)
+        result["query"] = query
+        if offset + len(result["results"]) < result["total"]:
+            result["next_offset"] = offset + len(result["results"])
+        else:
+            result["next_offset"] = None
+        return jsonify(result)
 
     @app.route("/api/verify/<int:telegram_user_id>")
     def api_verify(telegram_user_id: int) -> any:
-        # Check local allowed users first
-        if database.is_allowed_user(telegram_user_id):
-            return jsonify({"subscribed": True})
-        # Fallback to Tribute API
         try:
-            response = requests.get(
-                config.TRIBUTE_API_URL,
-                headers={"Api-Key": config.TRIBUTE_API_KEY},
-                timeout=10,
-            )
-            response.raise_for_status()
-            data = response.json()
-            now = _dt.datetime.utcnow().replace(tzinfo=_dt.timezone.utc)
-            for entry in data.get("result", []):
-                if entry.get("telegramUserId") == telegram_user_id:
-                    if entry.get("status") == "active":
-                        expire_str = entry.get("expireAt")
-                        try:
-                            expire_dt = _dt.datetime.fromisoformat(
-                                expire_str.replace("Z", "+00:00")
-                            )
-                            if expire_dt > now:
-                                return jsonify({"subscribed": True})
-                        except Exception:
-                            pass
-            return jsonify({"subscribed": False})
+            subscribed = verifier.is_subscribed(telegram_user_id)
+        except Exception:
+            subscribed = False
+        return jsonify({"subscribed": subscribed})
+
+    @app.route("/api/session", methods=["POST"])
+    def api_session() -> any:
+        # Exchange Telegram initData for a session token; the only place
+        # the web app's subscription is checked.
+        init_data = (request.get_json(silent=True) or {}).get("initData")
+        if not isinstance(init_data, str):
+            abort(400)
+        try:
+            user = session.validate_init_data(init_data)["user"]
+        except ValueError:
+            abort(401)
+        user_id = int(user["id"])
+        try:
+            expiry = verifier.subscription_expiry(user_id)
         except Exception:
-            return jsonify({"subscribed": False})
+            expiry = None
+        if expiry is None:
+            response = jsonify({"subscribed": False})
+            response.status_code = 403
+            return response
+        token, expires_at = session.issue_token(user_id, expiry)
+        return jsonify({
+            "subscribed": True,
+            "token": token,
+            "expires_at": expires_at,
+            "subscription_expires_at": session.expiry_for_json(expiry),
+            "user_id": user_id,
+        })
+
+    @app.route("/api/tribute/status")
+    @session.operator
+    def api_tribute_status() -> any:
+        return jsonify(tribute.sync_status())
+
+    @app.route("/webhooks/tribute", methods=["POST"])
+    def tribute_webhook() -> any:
+        body = request.get_data()
+        if not tribute.verify_signature(body, request.headers.get("trbt-signature")):
+            abort(401)
+        try:
+            outcome = tribute.handle_webhook(body)
+        except ValueError:
+            abort(400)
+        if outcome["result"] == "applied":
+            verifier.invalidate(outcome["telegram_user_id"])
+        return jsonify(outcome)
 
     @app.route("/", defaults={"path": ""})
     @app.route("/<path:path>")
     def serve_vue(path: str) -> any:
-        # Serve static assets for the Vue SPA; fall back to index.html
-        if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-            return send_from_directory(app.static_folder, path)
-        return send_from_directory(app.static_folder, "index.html")
+        # Serve static assets for the Vue SPA from the startup manifest;
+        # unknown paths fall back to index.html without touching disk.
+        return assets.load_manifest(app.static_folder).send(path)
 
     return app
\ No newline at end of file
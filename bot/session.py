@@ -0,0 +1,164 @@
+"""
+Signed session tokens for the web app, issued from Telegram ``initData``.
+
+The Mini App posts the ``initData`` string Telegram hands it to
+``/api/session``.  :func:`validate_init_data` checks its HMAC (keyed by
+the bot token, as described in the Telegram WebApp documentation) and
+age, the user's subscription is looked up once through ``verifier``,
+and :func:`issue_token` returns a token that carries the user id and
+its own expiry: ``config.SESSION_TTL`` from now, but never past the end
+of the subscription.
+
+Content endpoints decorated with :func:`required` then only check the
+token's HMAC with :func:`hmac.compare_digest` and its expiry — no
+database or Tribute lookup per request.  Tokens are
+``<base64url payload>.<base64url HMAC‑SHA256>`` and can be checked by
+every worker and process that shares the secret.
+"""
+
+from __future__ import annotations
+
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import math
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qsl
+
+from flask import Response, abort, g, jsonify, request
+
+from . import config
+
+
+def _secret() -> bytes:
+    if config.SESSION_SECRET:
+        return config.SESSION_SECRET.encode()
+    if not config.TELEGRAM_BOT_TOKEN:
+        # Anything derived from an empty token would be public.
+        raise ValueError("Neither SESSION_SECRET nor TELEGRAM_BOT_TOKEN is set")
+    # Derived from the bot token so all processes agree without extra setup.
+    return hmac.new(b"book-bot-session", config.TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def validate_init_data(init_data: str, now: Optional[float] = None) -> Dict[str, Any]:
+    """Return the fields of a genuine ``initData`` string, ``user`` decoded.
+
+    Raises ValueError if the hash does not match the bot token or the
+    data is older than ``config.INIT_DATA_MAX_AGE`` seconds.
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=False))
+    received = fields.pop("hash", "")
+    if not received or not config.TELEGRAM_BOT_TOKEN:
+        raise ValueError("initData is not signed")
+    check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret = hmac.new(b"WebAppData", config.TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    # Compared as bytes: compare_digest rejects non-ASCII str with TypeError.
+    if not hmac.compare_digest(expected.encode(), received.encode()):
+        raise ValueError("initData hash mismatch")
+    try:
+        auth_date = int(fields["auth_date"])
+        user = json.loads(fields["user"])
+        int(user["id"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError("initData lacks auth_date or user") from exc
+    now = time.time() if now is None else now
+    if now - auth_date > config.INIT_DATA_MAX_AGE:
+        raise ValueError("initData is too old")
+    fields["user"] = user
+    return fields
+
+
+def issue_token(user_id: int, subscription_expiry: float, now: Optional[float] = None) -> tuple[str, int]:
+    """Return ``(token, expires_at)`` for a user with access until ``subscription_expiry``."""
+    now = time.time() if now is None else now
+    expires_at = int(min(now + config.SESSION_TTL, subscription_expiry))
+    payload = _b64encode(json.dumps({"uid": user_id, "exp": expires_at}, separators=(",", ":")).encode())
+    signature = _b64encode(hmac.new(_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+    return f"{payload}.{signature}", expires_at
+
+
+def verify_token(token: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Return the payload of a genuine, unexpired token, otherwise None."""
+    payload, _, signature = token.partition(".")
+    if not payload or not signature:
+        return None
+    try:
+        secret = _secret()
+    except ValueError:
+        return None
+    expected = _b64encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(expected.encode(), signature.encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) <= (time.time() if now is None else now):
+        return None
+    return claims
+
+
+def _bearer_token() -> str:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
+
+
+def _unauthorized() -> Response:
+    response = jsonify({"error": "unauthorized"})
+    response.status_code = 401
+    response.headers["WWW-Authenticate"] = 'Bearer realm="book-bot"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def required(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator: answer 401 unless the request carries a valid session token.
+
+    The token's user id is available to the view as ``g.session_uid``.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not config.SESSION_REQUIRED:
+            return view(*args, **kwargs)
+        claims = verify_token(_bearer_token())
+        if claims is None:
+            return _unauthorized()
+        g.session_uid = claims.get("uid")
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def operator(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator for operator endpoints: the bearer must be ``config.OPERATOR_TOKEN``.
+
+    Without a configured token the endpoint does not exist (404).
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not config.OPERATOR_TOKEN:
+            abort(404)
+        if not hmac.compare_digest(_bearer_token().encode(), config.OPERATOR_TOKEN.encode()):
+            return _unauthorized()
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def expiry_for_json(expiry: float) -> Optional[int]:
+    """Subscription expiry for a JSON body; None stands for "never"."""
+    return None if math.isinf(expiry) else int(expiry)
@@ -0,0 +1,389 @@
+"""
+Tribute subscription checks backed by a local mirror.
+
+The Tribute API only offers the full subscriber list, so instead of
+downloading it for every check a background job mirrors it into the
+``tribute_subscribers`` table every ``config.TRIBUTE_SYNC_INTERVAL``
+seconds, and subscription webhooks (``/webhooks/tribute``) update it in
+between.  A subscription check is then a single indexed lookup.  When
+the mirror is stale (Tribute unreachable for a while, or no sync has
+happened yet) checks fall back to a live request, and if that fails
+too the last mirrored state is used.
+"""
+
+from __future__ import annotations
+
+import datetime as _dt
+import hashlib
+import hmac
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import closing
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import httpx
+import requests
+
+from . import async_database, config, database, httpclient, jsonstream, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TributeError(Exception):
+    """Tribute answered, but not with the complete list of subscribers."""
+
+
+def parse_expire_at(value: Any) -> Optional[int]:
+    """Convert Tribute's ISO‑8601 ``expireAt`` into Unix seconds (None if invalid)."""
+    if not isinstance(value, str):
+        return None
+    try:
+        expire_dt = _dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if expire_dt.tzinfo is None:
+        expire_dt = expire_dt.replace(tzinfo=_dt.timezone.utc)
+    return int(expire_dt.timestamp())
+
+
+def is_active(status: Optional[str], expire_at: Optional[int], now: Optional[float] = None) -> bool:
+    """Return True for an ``active`` entry whose expiry lies in the future."""
+    if now is None:
+        now = time.time()
+    return status == "active" and expire_at is not None and expire_at > now
+
+
+def _entries(items: Iterable[Any]) -> Iterator[tuple[int, str, Optional[int]]]:
+    for entry in items:
+        if not isinstance(entry, dict):
+            continue
+        user_id = entry.get("telegramUserId")
+        if isinstance(user_id, int):
+            yield user_id, str(entry.get("status") or ""), parse_expire_at(entry.get("expireAt"))
+
+
+def _next_page_url(url: str, extra: Dict[str, Any]) -> Optional[str]:
+    """Return the URL of the next page of a paginated response, if any.
+
+    Both a ``next`` link (absolute or relative URL) and an opaque cursor
+    (``nextCursor``, or a ``next`` value that is not a URL) are understood.
+    """
+    link = extra.get("next")
+    if isinstance(link, str) and link.startswith(("http://", "https://", "/")):
+        return urljoin(url, link)
+    cursor = extra.get("nextCursor") or link
+    if cursor in (None, "", False) or isinstance(cursor, (dict, list)):
+        return None
+    parts = urlsplit(config.TRIBUTE_API_URL)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "cursor"]
+    query.append(("cursor", str(cursor)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+_CLIENT_OPTIONS = dict(
+    pool_size=config.TRIBUTE_POOL_SIZE,
+    connect_timeout=config.TRIBUTE_CONNECT_TIMEOUT,
+    read_timeout=config.TRIBUTE_READ_TIMEOUT,
+    retries=config.TRIBUTE_RETRIES,
+    backoff=config.TRIBUTE_RETRY_BACKOFF,
+    name="tribute",
+)
+
+# One breaker for both clients: Tribute is either healthy or it is not.
+breaker = httpclient.CircuitBreaker(config.TRIBUTE_BREAKER_THRESHOLD, config.TRIBUTE_BREAKER_RESET)
+client = httpclient.HTTPClient(breaker, **_CLIENT_OPTIONS)
+async_client = httpclient.AsyncHTTPClient(breaker, **_CLIENT_OPTIONS)
+
+_CIRCUIT_STATES = {breaker.CLOSED: 0, breaker.HALF_OPEN: 1, breaker.OPEN: 2}
+metrics.Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    ("upstream",),
+    collect=lambda: {("tribute",): _CIRCUIT_STATES[breaker.state]},
+)
+metrics.Gauge(
+    "upstream_circuit_opened",
+    "How often the circuit breaker has opened in this process.",
+    ("upstream",),
+    collect=lambda: {("tribute",): breaker.opened_total},
+)
+
+
+def iter_subscribers() -> Iterator[Dict[str, Any]]:
+    """Stream the raw subscriber entries from Tribute.
+
+    The response body is parsed incrementally (see ``jsonstream.py``), so
+    memory use does not grow with the number of subscribers, and
+    following pages are requested as the previous one is exhausted.
+    Closing the generator early closes the connection, which is how a
+    point lookup stops downloading once it has found the user.
+
+    Raises :class:`TributeError` once the listing has been cut short, at
+    ``TRIBUTE_MAX_PAGES`` pages or on a page that repeats, so a sync
+    never mistakes a partial list for the complete one.
+    """
+    url: Optional[str] = config.TRIBUTE_API_URL
+    seen = {url}
+    for _ in range(config.TRIBUTE_MAX_PAGES):
+        extra: Dict[str, Any] = {}
+        with client.get(url, headers={"Api-Key": config.TRIBUTE_API_KEY}, stream=True) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(config.TRIBUTE_CHUNK_SIZE)
+            try:
+                yield from jsonstream.iter_array(chunks, "result", extra)
+            except (requests.RequestException, ValueError):
+                breaker.record_failure()
+                raise
+        url = _next_page_url(url, extra)
+        if url is None:
+            return
+        if url in seen:
+            raise TributeError(f"Tribute pagination truncated: page {url} repeated")
+        seen.add(url)
+    raise TributeError(f"Tribute pagination truncated after {config.TRIBUTE_MAX_PAGES} pages")
+
+
+async def aiter_subscribers() -> AsyncIterator[Dict[str, Any]]:
+    """Asynchronous :func:`iter_subscribers` on the shared ``httpx`` client."""
+    url: Optional[str] = config.TRIBUTE_API_URL
+    seen = {url}
+    for _ in range(config.TRIBUTE_MAX_PAGES):
+        parser = jsonstream.ArrayStreamParser("result")
+        response = await async_client.get(url, headers={"Api-Key": config.TRIBUTE_API_KEY})
+        try:
+            response.raise_for_status()
+            try:
+                async for chunk in response.aiter_bytes(config.TRIBUTE_CHUNK_SIZE):
+                    for entry in parser.feed(chunk):
+                        yield entry
+                for entry in parser.close():
+                    yield entry
+            except (httpx.HTTPError, ValueError):
+                breaker.record_failure()
+                raise
+        finally:
+            await response.aclose()
+        url = _next_page_url(url, parser.extra)
+        if url is None:
+            return
+        if url in seen:
+            raise TributeError(f"Tribute pagination truncated: page {url} repeated")
+        seen.add(url)
+    raise TributeError(f"Tribute pagination truncated after {config.TRIBUTE_MAX_PAGES} pages")
+
+
+def _active_expiry(entry: Any, telegram_user_id: int, now: float) -> Optional[int]:
+    """Return the expiry of ``entry`` if it is an active subscription of the user."""
+    # Cheap id comparison first; most entries are someone else.
+    if not isinstance(entry, dict) or entry.get("telegramUserId") != telegram_user_id:
+        return None
+    expire_at = parse_expire_at(entry.get("expireAt"))
+    return expire_at if is_active(entry.get("status"), expire_at, now) else None
+
+
+def _log_lookup_failure(exc: Exception) -> None:
+    if isinstance(exc, httpclient.CircuitOpenError):
+        logger.debug("Tribute lookup skipped: %s", exc)
+    else:
+        logger.warning("Tribute lookup failed", exc_info=exc)
+
+
+def lookup_upstream(telegram_user_id: int) -> Optional[int]:
+    """Ask Tribute directly for a user's subscription.
+
+    Returns the expiry (Unix seconds) of the first active subscription
+    found for the user, ``0`` if the user has none, or None when Tribute
+    cannot be reached, answers with an error or the circuit breaker is
+    open.  The download stops as soon as an active subscription is found.
+    """
+    now = time.time()
+    try:
+        with closing(iter_subscribers()) as entries:
+            for entry in entries:
+                expire_at = _active_expiry(entry, telegram_user_id, now)
+                if expire_at is not None:
+                    return expire_at
+    except Exception as exc:
+        _log_lookup_failure(exc)
+        return None
+    return 0
+
+
+async def lookup_upstream_async(telegram_user_id: int) -> Optional[int]:
+    """Asynchronous :func:`lookup_upstream` that does not occupy a worker thread."""
+    now = time.time()
+    entries = aiter_subscribers()
+    try:
+        async for entry in entries:
+            expire_at = _active_expiry(entry, telegram_user_id, now)
+            if expire_at is not None:
+                return expire_at
+    except Exception as exc:
+        _log_lookup_failure(exc)
+        return None
+    finally:
+        await entries.aclose()
+    return 0
+
+
+# Webhook event name -> mirrored status.  Cancelled subscriptions lose
+# access right away, like cancelled entries in the subscriber list.
+SUBSCRIPTION_EVENTS = {
+    "new_subscription": "active",
+    "renewed_subscription": "active",
+    "cancelled_subscription": "cancelled",
+}
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check the ``trbt-signature`` header: hex HMAC‑SHA256 of the body keyed with the API key."""
+    if not signature or not config.TRIBUTE_API_KEY:
+        return False
+    expected = hmac.new(config.TRIBUTE_API_KEY.encode(), body, hashlib.sha256).hexdigest()
+    # Bytes, since compare_digest raises TypeError on non-ASCII str.
+    return hmac.compare_digest(expected.encode(), signature.strip().lower().encode())
+
+
+def handle_webhook(body: bytes) -> Dict[str, Any]:
+    """Apply a verified Tribute webhook to the local mirror.
+
+    Returns a dictionary with ``result`` (``applied``, ``duplicate`` or
+    ``ignored`` for events that do not concern subscriptions) and the
+    affected ``telegram_user_id``.  Raises ``ValueError`` for a body that
+    is not a well‑formed subscription event.
+    """
+    event = json.loads(body)
+    if not isinstance(event, dict):
+        raise ValueError("Webhook body is not a JSON object")
+    name = event.get("name")
+    status = SUBSCRIPTION_EVENTS.get(name)
+    if status is None:
+        return {"result": "ignored", "telegram_user_id": None}
+    payload = event.get("payload")
+    user_id = payload.get("telegram_user_id") if isinstance(payload, dict) else None
+    if not isinstance(user_id, int):
+        raise ValueError("Webhook payload has no telegram_user_id")
+    event_at = parse_expire_at(event.get("created_at")) or int(time.time())
+    applied = database.apply_tribute_event(
+        hashlib.sha256(body).hexdigest(),
+        name,
+        user_id,
+        status,
+        parse_expire_at(payload.get("expires_at")),
+        event_at,
+    )
+    return {"result": "applied" if applied else "duplicate", "telegram_user_id": user_id}
+
+
+def sync() -> Dict[str, Any]:
+    """Mirror the Tribute subscriber list into the database once.
+
+    Failures are logged and recorded but leave the mirrored data as it
+    was.  Returns the resulting :func:`sync_status`.
+    """
+    started = int(time.time())
+    try:
+        with closing(iter_subscribers()) as entries:
+            count, changed = database.sync_tribute_subscribers(_entries(entries), started)
+    except Exception as exc:
+        logger.warning("Tribute sync failed: %s", exc)
+        database.set_state({
+            "tribute_last_attempt_at": str(started),
+            "tribute_last_error": str(exc) or exc.__class__.__name__,
+        })
+        return sync_status()
+    database.set_state({
+        "tribute_last_attempt_at": str(started),
+        "tribute_last_sync_at": str(started),
+        "tribute_count": str(count),
+        "tribute_last_error": None,
+    })
+    logger.info("Tribute sync: %d subscribers, %d rows changed", count, changed)
+    return sync_status()
+
+
+def sync_status() -> Dict[str, Any]:
+    """Return the last sync's time and size, staleness and circuit breaker state."""
+    last_sync = database.get_state("tribute_last_sync_at")
+    last_attempt = database.get_state("tribute_last_attempt_at")
+    last_sync_at = int(last_sync) if last_sync else None
+    return {
+        "last_sync_at": last_sync_at,
+        "last_attempt_at": int(last_attempt) if last_attempt else None,
+        "count": int(database.get_state("tribute_count", "0")),
+        "last_error": database.get_state("tribute_last_error"),
+        "stale": last_sync_at is None or time.time() - last_sync_at > config.TRIBUTE_STALE_AFTER,
+        "circuit": breaker.snapshot(),
+    }
+
+
+def _mirror_is_fresh() -> bool:
+    last_sync = database.get_state("tribute_last_sync_at")
+    return bool(last_sync) and time.time() - int(last_sync) <= config.TRIBUTE_STALE_AFTER
+
+
+def _local_expiry(telegram_user_id: int) -> tuple[Optional[float], bool]:
+    """Answer a subscription check from local data if possible.
+
+    Returns ``(expiry, decided)``; when ``decided`` is False the mirror
+    is stale and Tribute has to be asked.
+    """
+    if database.is_allowed_user(telegram_user_id):
+        return math.inf, True
+    entry = database.get_tribute_subscription(telegram_user_id)
+    if entry is not None and is_active(entry["status"], entry["expire_at"]):
+        return entry["expire_at"], True
+    return None, _mirror_is_fresh()
+
+
+def subscription_expiry(telegram_user_id: int) -> Optional[float]:
+    """Return when the user's access ends (Unix seconds) or None without access.
+
+    Users in the manual ``allowed_users`` list never expire (``math.inf``).
+    Otherwise the mirrored Tribute entry decides; Tribute itself is only
+    asked when the mirror is stale and the user is not found there.  If
+    Tribute is unreachable (or the circuit breaker is open) the mirror's
+    answer stands.  Callers normally go through the cache in
+    ``verifier.py``.
+    """
+    expiry, decided = _local_expiry(telegram_user_id)
+    if decided:
+        return expiry
+    return lookup_upstream(telegram_user_id) or None
+
+
+async def subscription_expiry_async(telegram_user_id: int) -> Optional[float]:
+    """Asynchronous :func:`subscription_expiry` for the bot's event loop.
+
+    The local lookups run on the database thread pool and the Tribute
+    fallback uses the ``httpx`` client, so no thread waits on the network.
+    """
+    expiry, decided = await async_database.run(_local_expiry, telegram_user_id)
+    if decided:
+        return expiry
+    return await lookup_upstream_async(telegram_user_id) or None
+
+
+def start_background_sync(interval: Optional[int] = None) -> Callable[[], None]:
+    """Start the periodic sync in a daemon thread and return a stop function.
+
+    The first sync runs immediately.
+    """
+    if interval is None:
+        interval = config.TRIBUTE_SYNC_INTERVAL
+    stopped = threading.Event()
+
+    def loop() -> None:
+        while not stopped.is_set():
+            try:
+                sync()
+            except Exception:
+                logger.exception("Unexpected error in Tribute sync")
+            stopped.wait(interval)
+
+    threading.Thread(target=loop, name="tribute-sync", daemon=True).start()
+    return stopped.set
@@ -0,0 +1,87 @@
+"""
+Concurrent processing of Telegram updates, in order within each chat.
+
+By default ``Application`` handles one update at a time, so a slow
+``/start`` (waiting on Tribute) holds up every other user.
+:class:`ChatOrderedUpdateProcessor` lets updates from different chats
+run concurrently, at most ``max_concurrent_updates`` at a time, while
+updates from the same chat still run one after another in the order
+they arrived.  The ``ConversationHandler`` flows in ``handlers.py``,
+which key their state by chat and user, therefore never see two
+updates of one conversation at once.
+
+An update whose chat is busy is handed over to the update running for
+that chat, which runs it next, and its own call returns at once.  A
+chat with a backlog of updates therefore occupies at most one of the
+``max_concurrent_updates`` slots and cannot starve the others.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+from typing import Any, Awaitable, Deque, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """The chat an update belongs to, or its user when it has no chat.
+
+    A private chat's id equals the user's id, so a user's updates with
+    and without a chat (inline queries) are ordered together.  Updates
+    with neither are not ordered.
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Run up to ``max_concurrent_updates`` updates at once, one per chat."""
+
+    def __init__(self, max_concurrent_updates: int) -> None:
+        super().__init__(max_concurrent_updates)
+        # key -> updates of the chat waiting for the one now running
+        self._chats: Dict[Hashable, Deque[Awaitable[Any]]] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = ordering_key(update)
+        if key is None:
+            await coroutine
+            return
+        backlog = self._chats.get(key)
+        if backlog is not None:
+            # Run by the chat's current update, after those queued before it.
+            backlog.append(coroutine)
+            return
+        backlog = self._chats[key] = collections.deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception:
+                    # Must not cost the chat's queued updates.
+                    logger.exception("Processing an update failed")
+                if not backlog:
+                    break
+                coroutine = backlog.popleft()
+        finally:
+            del self._chats[key]
+            for pending in backlog:
+                if asyncio.iscoroutine(pending):
+                    pending.close()  # cancelled: never awaited
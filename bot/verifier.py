@@ -0,0 +1,227 @@
+"""
+Cached subscription verification shared by the bot and the web server.
+
+Every ``/start`` and every ``/api/verify`` call goes through
+:func:`subscription_expiry` (or :func:`is_subscribed`).  Results are kept
+in a bounded LRU cache: positive results until the subscription expires
+(capped by ``config.VERIFY_POSITIVE_MAX_TTL``), negative results for the
+short ``config.VERIFY_NEGATIVE_TTL``.  Concurrent checks for the same
+user are coalesced so that only one of them performs the underlying
+lookup (see ``tribute.subscription_expiry``) while the others wait for
+its result.
+
+The bot and each web worker have their own cache.  :func:`invalidate`
+only clears the calling process's, so every process also polls the
+database's subscription version (at most every
+``config.VERIFY_REVISION_INTERVAL`` seconds) and starts over when a
+change made anywhere, such as a cancellation webhook handled by another
+worker, has moved it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from . import config, database, metrics, tribute
+
+
+class _Flight:
+    """A lookup in progress that other callers can wait for."""
+
+    def __init__(self, generation: int) -> None:
+        self.generation = generation
+        self.done = threading.Event()
+        self.result: Optional[float] = None
+        self.error: Optional[BaseException] = None
+
+
+class Verifier:
+    """LRU cache with expiry plus single‑flight around a lookup function.
+
+    ``lookup`` returns the expiry time (Unix seconds) of a user's access,
+    or None when the user has no access; ``async_lookup``, if given, is
+    its coroutine counterpart used by :meth:`subscription_expiry_async`.
+    ``revision``, if given, returns a number that changes with the data
+    behind ``lookup``; it is called at most every ``revision_interval``
+    seconds and the cache is cleared when the number has changed.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[int], Optional[float]],
+        max_size: int,
+        positive_max_ttl: float,
+        negative_ttl: float,
+        clock: Callable[[], float] = time.time,
+        async_lookup: Optional[Callable[[int], Awaitable[Optional[float]]]] = None,
+        revision: Optional[Callable[[], int]] = None,
+        revision_interval: float = 1.0,
+    ) -> None:
+        self._lookup = lookup
+        self._async_lookup = async_lookup
+        self._max_size = max_size
+        self._positive_max_ttl = positive_max_ttl
+        self._negative_ttl = negative_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # user id -> (valid until, expiry or None)
+        self._cache: "OrderedDict[int, tuple[float, Optional[float]]]" = OrderedDict()
+        self._flights: Dict[int, _Flight] = {}
+        # Bumped by invalidate() so lookups started before it are not cached.
+        self._generation = 0
+        self._revision = revision
+        self._revision_interval = revision_interval
+        self._revision_seen: Optional[int] = None
+        self._revision_checked = -math.inf
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _revision_due(self) -> bool:
+        return self._revision is not None and self._clock() - self._revision_checked >= self._revision_interval
+
+    def _check_revision(self) -> None:
+        """Clear the cache if the data behind it changed since the last check."""
+        with self._lock:
+            if not self._revision_due():
+                return  # another thread has just checked
+            self._revision_checked = self._clock()
+        revision = self._revision()
+        with self._lock:
+            if self._revision_seen is not None and revision != self._revision_seen:
+                self._generation += 1
+                self._cache.clear()
+            self._revision_seen = revision
+
+    def _begin(self, user_id: int) -> tuple[bool, Optional[float], Optional[_Flight], bool]:
+        """Look in the cache; on a miss join or start the user's flight.
+
+        Returns ``(hit, cached_value, flight, leader)``.
+        """
+        now = self._clock()
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                metrics.CACHE_REQUESTS.inc("verifier", "hit")
+                return True, cached[1], None, False
+            flight = self._flights.get(user_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[user_id] = _Flight(self._generation)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        metrics.CACHE_REQUESTS.inc("verifier", "miss" if leader else "coalesced")
+        return False, None, flight, leader
+
+    def _finish(self, user_id: int, flight: _Flight) -> None:
+        if flight.error is None:
+            self._store(user_id, flight.result, flight.generation)
+        with self._lock:
+            del self._flights[user_id]
+        flight.done.set()
+
+    def subscription_expiry(self, user_id: int) -> Optional[float]:
+        """Return the user's access expiry or None, using the cache when possible."""
+        if self._revision_due():
+            self._check_revision()
+        hit, value, flight, leader = self._begin(user_id)
+        if hit:
+            return value
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._lookup(user_id)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._finish(user_id, flight)
+        return flight.result
+
+    async def subscription_expiry_async(self, user_id: int) -> Optional[float]:
+        """Coroutine version of :meth:`subscription_expiry`.
+
+        Uses ``async_lookup`` when the verifier has one, otherwise runs
+        ``lookup`` in the default executor.  Cache and in‑flight lookups
+        are shared with the blocking method.
+        """
+        loop = asyncio.get_running_loop()
+        if self._revision_due():
+            await loop.run_in_executor(None, self._check_revision)
+        hit, value, flight, leader = self._begin(user_id)
+        if hit:
+            return value
+        if not leader:
+            if not flight.done.is_set():
+                await loop.run_in_executor(None, flight.done.wait)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            if self._async_lookup is not None:
+                flight.result = await self._async_lookup(user_id)
+            else:
+                flight.result = await loop.run_in_executor(None, self._lookup, user_id)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._finish(user_id, flight)
+        return flight.result
+
+    def is_subscribed(self, user_id: int) -> bool:
+        return self.subscription_expiry(user_id) is not None
+
+    async def is_subscribed_async(self, user_id: int) -> bool:
+        return await self.subscription_expiry_async(user_id) is not None
+
+    def _store(self, user_id: int, expiry: Optional[float], generation: int) -> None:
+        now = self._clock()
+        if expiry is None:
+            valid_until = now + self._negative_ttl
+        else:
+            valid_until = min(expiry, now + self._positive_max_ttl)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._cache[user_id] = (valid_until, expiry)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Forget the cached result of one user, or of everyone."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+
+_verifier = Verifier(
+    lambda user_id: tribute.subscription_expiry(user_id),
+    max_size=config.VERIFY_CACHE_SIZE,
+    positive_max_ttl=config.VERIFY_POSITIVE_MAX_TTL,
+    negative_ttl=config.VERIFY_NEGATIVE_TTL,
+    async_lookup=lambda user_id: tribute.subscription_expiry_async(user_id),
+    revision=lambda: database.get_subscription_version(),
+    revision_interval=config.VERIFY_REVISION_INTERVAL,
+)
+
+subscription_expiry = _verifier.subscription_expiry
+is_subscribed = _verifier.is_subscribed
+subscription_expiry_async = _verifier.subscription_expiry_async
+is_subscribed_async = _verifier.is_subscribed_async
+invalidate = _verifier.invalidate
@@ -0,0 +1,66 @@
+"""
+Production serving of the Flask application.
+
+:func:`serve` runs the app under gunicorn: ``config.WEB_WORKERS``
+pre‑forked worker processes with ``config.WEB_THREADS`` threads each
+(the ``gthread`` worker, which also keeps client connections alive).
+Each worker opens its own SQLite connections after the fork, so reads
+run in parallel across processes, and gunicorn restarts crashed workers
+and shuts down gracefully on SIGTERM.  gunicorn is optional (it does not
+run on Windows); without it :func:`serve` falls back to Werkzeug's
+threaded development server.
+
+gunicorn can also be started directly: ``gunicorn bot.wsgi:app``.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Optional
+
+from . import config, metrics, server
+
+logger = logging.getLogger(__name__)
+
+
+def gunicorn_options() -> Dict[str, Any]:
+    """gunicorn settings derived from ``config``."""
+    return {
+        "bind": f"{config.WEB_HOST}:{config.WEB_PORT}",
+        "workers": config.WEB_WORKERS,
+        "threads": config.WEB_THREADS,
+        "worker_class": "gthread",
+        "keepalive": config.WEB_KEEPALIVE,
+        "timeout": config.WEB_TIMEOUT,
+        "graceful_timeout": config.WEB_GRACEFUL_TIMEOUT,
+    }
+
+
+def serve(options: Optional[Dict[str, Any]] = None) -> None:
+    """Run the web server in the foreground until it is stopped.
+
+    ``options`` override individual gunicorn settings.  The database
+    must already be initialised (``database.init_db()``).
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.warning("gunicorn is not installed, using the development server")
+        server.create_app().run(host=config.WEB_HOST, port=config.WEB_PORT, threaded=True)
+        return
+
+    settings = {**gunicorn_options(), **(options or {})}
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            # Called in each worker after the fork, so every process
+            # builds its own app, catalog snapshot and connections.
+            if config.METRICS_DIR:
+                metrics.share(config.METRICS_DIR, "web")
+            return server.create_app()
+
+    Application().run()
@@ -0,0 +1,208 @@
+"""
+Receiving Telegram updates through a webhook instead of long polling.
+
+:func:`run_webhook` registers ``config.WEBHOOK_URL`` with Telegram and
+serves it from the bot process with :class:`WebhookServer`: a small
+asyncio HTTP/1.1 server that checks the secret token Telegram sends in
+``X-Telegram-Bot-Api-Secret-Token`` and puts each update straight on
+the ``Application``'s update queue.  Updates are handled as soon as
+Telegram delivers them, with no polling interval and no long‑poll
+connection kept open.
+
+The bot and the gunicorn workers are separate processes and only the
+bot process owns the ``Application``, so the webhook is served there
+and nginx forwards the webhook path to it (see ``deploy.md``).
+python-telegram-bot's own webhook server is not used because it needs
+tornado.  If Telegram refuses the webhook, :func:`run_webhook` returns
+False and the caller falls back to polling, which removes the webhook.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import signal
+from contextlib import suppress
+from http import HTTPStatus
+from typing import Optional, Set
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = metrics.Counter("webhook_requests_total", "Webhook requests by outcome.", ("result",))
+
+# Updates are small; anything larger is not from Telegram.
+MAX_BODY = 1 << 20
+
+
+def secret_token() -> str:
+    """``config.WEBHOOK_SECRET``, or a value derived from the bot token."""
+    if config.WEBHOOK_SECRET:
+        return config.WEBHOOK_SECRET
+    # Telegram allows only A-Z, a-z, 0-9, _ and - here; a hex digest fits.
+    return hmac.new(b"book-bot-webhook", config.TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).hexdigest()
+
+
+class WebhookServer:
+    """HTTP/1.1 server accepting Telegram's webhook POSTs on ``path``.
+
+    Connections are kept alive, as Telegram reuses them.  Only requests
+    with a ``Content-Length`` body are supported, which is what Telegram
+    and nginx send.
+    """
+
+    def __init__(self, application: Application, path: str, secret: str) -> None:
+        self._application = application
+        self._path = path
+        self._secret = secret.encode()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        # Idle keep-alive connections would otherwise stay open.
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while await self._serve_one(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_one(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; return whether the connection stays open."""
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._respond(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            length = -1 if method == "POST" or "transfer-encoding" in headers else 0
+        if not 0 <= length <= MAX_BODY:
+            status = HTTPStatus.LENGTH_REQUIRED if length < 0 else HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            REQUESTS.inc("rejected")
+            await self._respond(writer, status, keep_alive=False)
+            return False
+        body = await reader.readexactly(length)
+        status = await self._dispatch(method, target, headers, body)
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        await self._respond(writer, status, keep_alive)
+        return keep_alive
+
+    async def _dispatch(self, method: str, target: str, headers: dict, body: bytes) -> HTTPStatus:
+        if target.partition("?")[0] != self._path:
+            REQUESTS.inc("rejected")
+            return HTTPStatus.NOT_FOUND
+        if method != "POST":
+            REQUESTS.inc("rejected")
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        received = headers.get("x-telegram-bot-api-secret-token", "").encode("latin-1")
+        if not hmac.compare_digest(received, self._secret):
+            REQUESTS.inc("forbidden")
+            return HTTPStatus.FORBIDDEN
+        try:
+            update = Update.de_json(json.loads(body), self._application.bot)
+        except (ValueError, TypeError, KeyError):
+            REQUESTS.inc("invalid")
+            return HTTPStatus.BAD_REQUEST
+        await self._application.update_queue.put(update)
+        REQUESTS.inc("accepted")
+        return HTTPStatus.OK
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, keep_alive: bool) -> None:
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii")
+        )
+        await writer.drain()
+
+
+async def serve(application: Application, stop: Optional[asyncio.Event] = None) -> bool:
+    """Serve the webhook until ``stop`` is set (by default on SIGINT/SIGTERM).
+
+    Returns False, without handling any updates, if Telegram refused to
+    set the webhook.
+    """
+    server = WebhookServer(application, urlsplit(config.WEBHOOK_URL).path or "/", secret_token())
+    await server.start(config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    await application.initialize()
+    try:
+        try:
+            await application.bot.set_webhook(
+                config.WEBHOOK_URL,
+                secret_token=secret_token(),
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            )
+        except TelegramError:
+            logger.exception("Telegram refused the webhook %s", config.WEBHOOK_URL)
+            return False
+        logger.info("Receiving updates at %s", config.WEBHOOK_URL)
+
+        if stop is None:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                with suppress(NotImplementedError):  # Windows
+                    loop.add_signal_handler(signum, stop.set)
+        await application.start()
+        try:
+            await stop.wait()
+        finally:
+            # Refuse new updates first; Telegram redelivers them later.
+            await server.stop()
+            await application.stop()
+        return True
+    finally:
+        await server.stop()
+        await application.shutdown()
+
+
+def run_webhook(application: Application) -> bool:
+    """Run the bot on the webhook until it is stopped; see :func:`serve`.
+
+    On False the event loop is left in place for ``run_polling``.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    served = loop.run_until_complete(serve(application))
+    if served:
+        loop.close()
+    return served
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for running the web server under an external server::
+
+    gunicorn --worker-class gthread --workers 4 --threads 4 bot.wsgi:app
+
+The database schema is brought up to date on import.  Set
+``METRICS_DIR`` so that ``/metrics`` covers all workers.
+"""
+
+from . import config, database, metrics, server
+
+database.init_db()
+if config.METRICS_DIR:
+    metrics.share(config.METRICS_DIR, "web")
+app = server.create_app()
@@ -26,12 +26,16 @@ npm install
 
 echo "🔨 Building Vue webapp..."
 npm run build
+cd ..
+
+echo "🗜️  Precompressing static files (.gz, and .br if brotli is installed)..."
+python3 -m bot.assets webapp/dist
 
 echo "✅ Build completed successfully!"
 echo "📁 Built files are in: webapp/dist/"
 echo ""
 echo "🚀 To run the bot:"
-echo "   cd .. && python -m bot.main"
+echo "   python -m bot.main"
 echo ""
 echo "🌐 To serve the webapp in development:"
 echo "   cd webapp && npm run dev"
\ No newline at end of file
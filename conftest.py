@@ -0,0 +1,30 @@
+"""
+Общие фикстуры тестов: временная база данных и тестовый клиент веб‑сервера.
+"""
+
+import math
+
+import pytest
+
+from bot import async_database, config, database, server, session, verifier
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    """Пустая база во временном каталоге; кэш подписок сброшен."""
+    monkeypatch.setattr(config, "DB_FILE", str(tmp_path / "test.db"))
+    database.init_db()
+    verifier.invalidate()
+    yield database
+    async_database.shutdown()
+    database.close_connections()
+
+
+@pytest.fixture()
+def client(db, monkeypatch):
+    """Клиент Flask с токеном сессии пользователя 1 во всех запросах."""
+    monkeypatch.setattr(config, "SESSION_SECRET", "test-secret")
+    app = server.create_app()
+    with app.test_client() as client:
+        client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {session.issue_token(1, math.inf)[0]}"
+        yield client
@@ -15,6 +15,7 @@ CREATE TABLE IF NOT EXISTS chapters (
     book_id INTEGER NOT NULL,
     title TEXT NOT NULL,
     content TEXT NOT NULL,
+    position INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE
 );
@@ -27,16 +28,16 @@ CREATE TABLE IF NOT EXISTS allowed_users (
 );
 
 -- Создание индексов для оптимизации
-CREATE INDEX IF NOT EXISTS idx_chapters_book_id ON chapters(book_id);
+CREATE INDEX IF NOT EXISTS idx_chapters_book_position ON chapters(book_id, position, id, title);
 CREATE INDEX IF NOT EXISTS idx_allowed_users_telegram_id ON allowed_users(telegram_user_id);
 
 -- Вставка тестовых данных (опционально)
 INSERT OR IGNORE INTO books (id, title, description) VALUES 
 (1, 'Пример книги', 'Это пример книги для демонстрации работы приложения');
 
-INSERT OR IGNORE INTO chapters (book_id, title, content) VALUES 
-(1, 'Глава 1', 'Содержимое первой главы...'),
-(1, 'Глава 2', 'Содержимое второй главы...');
+INSERT OR IGNORE INTO chapters (book_id, title, content, position) VALUES 
+(1, 'Глава 1', 'Содержимое первой главы...', 1),
+(1, 'Глава 2', 'Содержимое второй главы...', 2);
 
 INSERT OR IGNORE INTO allowed_users (telegram_user_id) VALUES 
 (793857218);
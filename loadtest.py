@@ -0,0 +1,167 @@
+"""
+Load test: Werkzeug development server vs the gunicorn production setup.
+
+Seeds a temporary database, starts the web server in each mode as a
+separate process and hammers a mix of catalog, book and chapter URLs
+from several client processes over keep‑alive connections.  Reports
+requests per second and latency percentiles for each mode.
+
+* ``dev`` — ``create_app().run()`` as ``bot/main.py`` used to do it;
+* ``gunicorn`` — ``python -m bot.main web`` (``WEB_WORKERS`` ×
+  ``WEB_THREADS``).
+
+Usage::
+
+    python loadtest.py [--duration 10] [--clients 8] [--workers 4] [--threads 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(env: Dict[str, str], books: int = 50, chapters: int = 20) -> tuple[List[str], str]:
+    """Fill ``env["DB_FILE"]`` with a synthetic catalog.
+
+    Returns the URLs to request and a session token for them, signed
+    with the ``SESSION_SECRET`` in ``env``.
+    """
+    code = (
+        "import json, math, sys\n"
+        "from bot import database, session\n"
+        "database.init_db()\n"
+        "urls = []\n"
+        f"for b in range({books}):\n"
+        "    book_id = database.add_book(f'Книга {b}', 'Описание книги ' * 10, None)\n"
+        "    urls.append(f'/api/book/{book_id}')\n"
+        f"    ids = database.add_chapters(book_id, [(f'Глава {{c}}', 'Текст главы. ' * 300) for c in range({chapters})])\n"
+        "    urls += [f'/api/book/{book_id}/chapter/{c}' for c in ids]\n"
+        "json.dump({'urls': urls, 'token': session.issue_token(1, math.inf)[0]}, sys.stdout)\n"
+    )
+    out = json.loads(subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, check=True, capture_output=True).stdout)
+    return ["/api/books"] * 10 + out["urls"], out["token"]
+
+
+def start_server(mode: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    if mode == "dev":
+        cmd = [
+            sys.executable,
+            "-c",
+            f"from bot import server; server.create_app().run(host='127.0.0.1', port={port})",
+        ]
+    else:
+        cmd = [sys.executable, "-m", "bot.main", "web"]
+    process = subprocess.Popen(
+        cmd, env=dict(env, WEB_HOST="127.0.0.1", WEB_PORT=str(port)), cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/books", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def client(base: str, urls: List[str], token: str, duration: float, seed_value: int, queue) -> None:
+    rng = random.Random(seed_value)
+    headers = {"Accept-Encoding": "gzip", "Authorization": f"Bearer {token}"}
+    session = requests.Session()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.get(base + rng.choice(urls), headers=headers, timeout=10)
+            if response.status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+            session = requests.Session()
+        latencies.append(time.perf_counter() - started)
+    queue.put((latencies, errors))
+
+
+def run_load(base: str, urls: List[str], token: str, duration: float, clients: int) -> Dict[str, float]:
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client, args=(base, urls, token, duration, n, queue))
+        for n in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    latencies: List[float] = []
+    errors = 0
+    for _ in processes:
+        got, failed = queue.get()
+        latencies += got
+        errors += failed
+    for process in processes:
+        process.join()
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return {
+        "rps": len(latencies) / duration,
+        "p50": pick(0.50),
+        "p99": pick(0.99),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--modes", default="dev,gunicorn")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "load.db")
+        # All clients share one IP; measure the server, not the limiter.
+        env = dict(
+            os.environ, DB_FILE=db_file, WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads),
+            RATE_LIMIT_ENABLED="0", SESSION_SECRET=os.urandom(16).hex(),
+        )
+        urls, token = seed(env)
+        print(f"{len(urls)} URLs, {args.clients} client processes, {args.duration:.0f} s per mode, "
+              f"gunicorn {args.workers} workers x {args.threads} threads, {os.cpu_count()} CPUs\n")
+        print(f"{'mode':<10} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for mode in args.modes.split(","):
+            port = free_port()
+            server = start_server(mode, port, env)
+            try:
+                result = run_load(f"http://127.0.0.1:{port}", urls, token, args.duration, args.clients)
+            finally:
+                server.terminate()
+                server.wait(30)
+            print(f"{mode:<10} {result['rps']:>9.0f} {result['p50']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
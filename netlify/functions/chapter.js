@@ -1,9 +1,10 @@
 const { getChapterDetail } = require('./database');
+const { requireSession } = require('./session');
 
 exports.handler = async (event, context) => {
   const headers = {
     'Access-Control-Allow-Origin': '*',
-    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
     'Access-Control-Allow-Methods': 'GET, OPTIONS',
   };
 
@@ -24,6 +25,11 @@ exports.handler = async (event, context) => {
       };
     }
 
+    const denied = requireSession(event, headers);
+    if (denied) {
+      return denied;
+    }
+
     // Извлекаем book_id и chapter_id из пути
     // Путь: /api/book/{book_id}/chapter/{chapter_id}
     const pathParts = event.path.split('/');
@@ -0,0 +1,203 @@
+const crypto = require('crypto');
+const { isAllowedUser } = require('./database');
+
+// Те же настройки и тот же формат токена, что и в bot/session.py,
+// поэтому токен, выданный сервером на VPS, принимается и здесь.
+const SESSION_TTL = parseInt(process.env.SESSION_TTL || '3600');
+const INIT_DATA_MAX_AGE = parseInt(process.env.INIT_DATA_MAX_AGE || '86400');
+const SESSION_REQUIRED = !['0', 'false', 'no'].includes((process.env.SESSION_REQUIRED || '1').toLowerCase());
+
+const headers = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+  'Access-Control-Allow-Methods': 'POST, OPTIONS',
+};
+
+function hmac(key, data) {
+  return crypto.createHmac('sha256', key).update(data).digest();
+}
+
+// Сравнение без утечки времени; строки разной длины не совпадают.
+function safeEqual(a, b) {
+  const left = Buffer.from(a, 'utf8');
+  const right = Buffer.from(b, 'utf8');
+  return left.length === right.length && crypto.timingSafeEqual(left, right);
+}
+
+function sessionSecret() {
+  if (process.env.SESSION_SECRET) {
+    return Buffer.from(process.env.SESSION_SECRET, 'utf8');
+  }
+  if (!process.env.TELEGRAM_BOT_TOKEN) {
+    throw new Error('Neither SESSION_SECRET nor TELEGRAM_BOT_TOKEN is set');
+  }
+  return hmac('book-bot-session', process.env.TELEGRAM_BOT_TOKEN);
+}
+
+// Проверка подписи initData по токену бота; возвращает пользователя или null
+function validateInitData(initData) {
+  const fields = new URLSearchParams(initData);
+  const received = fields.get('hash');
+  const botToken = process.env.TELEGRAM_BOT_TOKEN;
+  if (!received || !botToken) {
+    return null;
+  }
+  fields.delete('hash');
+  const checkString = [...fields.entries()]
+    .sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0))
+    .map(([key, value]) => `${key}=${value}`)
+    .join('\n');
+  const expected = hmac(hmac('WebAppData', botToken), checkString).toString('hex');
+  if (!safeEqual(expected, received)) {
+    return null;
+  }
+  try {
+    const authDate = parseInt(fields.get('auth_date'));
+    const user = JSON.parse(fields.get('user'));
+    if (isNaN(authDate) || isNaN(parseInt(user.id)) || Date.now() / 1000 - authDate > INIT_DATA_MAX_AGE) {
+      return null;
+    }
+    return user;
+  } catch (e) {
+    return null;
+  }
+}
+
+function issueToken(userId, subscriptionExpiry) {
+  const expiresAt = Math.floor(Math.min(Date.now() / 1000 + SESSION_TTL, subscriptionExpiry));
+  const payload = Buffer.from(JSON.stringify({ uid: userId, exp: expiresAt })).toString('base64url');
+  const signature = hmac(sessionSecret(), payload).toString('base64url');
+  return { token: `${payload}.${signature}`, expiresAt };
+}
+
+// Данные подлинного и не истёкшего токена, иначе null
+function verifyToken(token) {
+  const [payload, signature] = token.split('.');
+  if (!payload || !signature) {
+    return null;
+  }
+  try {
+    if (!safeEqual(hmac(sessionSecret(), payload).toString('base64url'), signature)) {
+      return null;
+    }
+    const claims = JSON.parse(Buffer.from(payload, 'base64url').toString('utf8'));
+    return claims.exp > Date.now() / 1000 ? claims : null;
+  } catch (e) {
+    return null;
+  }
+}
+
+// Ответ 401 для функций с контентом, если нет действующего Bearer-токена
+function requireSession(event, responseHeaders) {
+  if (!SESSION_REQUIRED) {
+    return null;
+  }
+  const [scheme, token] = (event.headers.authorization || '').split(' ');
+  if (scheme && scheme.toLowerCase() === 'bearer' && token && verifyToken(token.trim())) {
+    return null;
+  }
+  return {
+    statusCode: 401,
+    headers: {
+      ...responseHeaders,
+      'Content-Type': 'application/json',
+      'Cache-Control': 'no-store',
+      'WWW-Authenticate': 'Bearer realm="book-bot"',
+    },
+    body: JSON.stringify({ error: 'unauthorized' }),
+  };
+}
+
+// Срок подписки в секундах Unix (Infinity — без срока) или null
+async function subscriptionExpiry(telegramUserId) {
+  if (await isAllowedUser(telegramUserId)) {
+    return Infinity;
+  }
+  const response = await fetch(process.env.TRIBUTE_API_URL, {
+    headers: {
+      'Api-Key': process.env.TRIBUTE_API_KEY,
+    },
+  });
+  if (!response.ok) {
+    throw new Error('Tribute API request failed');
+  }
+  const data = await response.json();
+  const now = Date.now() / 1000;
+  let expiry = null;
+  for (const entry of data.result || []) {
+    if (entry.telegramUserId === telegramUserId && entry.status === 'active') {
+      const expireAt = new Date(entry.expireAt).getTime() / 1000;
+      if (expireAt > now && (expiry === null || expireAt > expiry)) {
+        expiry = expireAt;
+      }
+    }
+  }
+  return expiry;
+}
+
+exports.handler = async (event, context) => {
+  if (event.httpMethod === 'OPTIONS') {
+    return {
+      statusCode: 200,
+      headers,
+      body: '',
+    };
+  }
+
+  const json = (statusCode, body) => ({
+    statusCode,
+    headers: {
+      ...headers,
+      'Content-Type': 'application/json',
+      'Cache-Control': 'no-store',
+    },
+    body: JSON.stringify(body),
+  });
+
+  try {
+    if (event.httpMethod !== 'POST') {
+      return json(405, { error: 'Method not allowed' });
+    }
+
+    // Обмен initData из Telegram на токен сессии
+    let initData;
+    try {
+      initData = JSON.parse(event.body || '{}').initData;
+    } catch (e) {
+      initData = undefined;
+    }
+    if (typeof initData !== 'string') {
+      return json(400, { error: 'initData is required' });
+    }
+    const user = validateInitData(initData);
+    if (!user) {
+      return json(401, { error: 'unauthorized' });
+    }
+
+    const userId = parseInt(user.id);
+    let expiry = null;
+    try {
+      expiry = await subscriptionExpiry(userId);
+    } catch (error) {
+      console.error('Subscription check failed:', error);
+    }
+    if (expiry === null) {
+      return json(403, { subscribed: false });
+    }
+
+    const { token, expiresAt } = issueToken(userId, expiry);
+    return json(200, {
+      subscribed: true,
+      token,
+      expires_at: expiresAt,
+      subscription_expires_at: expiry === Infinity ? null : Math.floor(expiry),
+      user_id: userId,
+    });
+  } catch (error) {
+    console.error('Error issuing session:', error);
+    return json(500, { error: 'Internal server error' });
+  }
+};
+
+exports.requireSession = requireSession;
+exports.verifyToken = verifyToken;
@@ -0,0 +1,61 @@
+"""
+Тесты снимка каталога в памяти (bot/catalog.py).
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+from bot import catalog, config
+
+
+def test_snapshot_matches_database(db):
+    """Готовый JSON снимка совпадает с ответами запросов к базе."""
+    first = db.add_book("Первая", "Описание", "http://x/cover.jpg")
+    second = db.add_book("Вторая", "", None)
+    db.add_chapters(first, [("Глава 1", "а"), ("Глава 2", "б")])
+
+    snapshot = catalog.current()
+    body, ids = snapshot.books_json()
+    assert json.loads(body) == db.get_books_summary() and ids == [first, second]
+    body, _ = snapshot.books_json(include_chapters=True)
+    assert json.loads(body) == db.get_books_summary(include_chapters=True)
+    body, ids = snapshot.books_json(after=first, limit=1)
+    assert json.loads(body) == db.get_books_summary(after=first, limit=1) and ids == [second]
+    assert json.loads(snapshot.book_json(first)) == db.get_book_detail(first)
+    assert snapshot.book_json(999) is None
+
+
+def test_snapshot_swapped_on_commit(db):
+    """После записи снимок заменяется сразу, без запроса к нему."""
+    book_id = db.add_book("Книга", "", None)
+    before = catalog.current()
+    assert before.book(book_id).chapter_count == 0
+    assert catalog.current() is before  # без изменений — тот же объект
+
+    db.add_chapter(book_id, "Глава", "текст")
+    after = catalog._snapshot
+    assert after is not before and after.version == db.get_catalog_version()
+    assert after.book(book_id).chapter_count == 1
+    assert before.book(book_id).chapter_count == 0  # старый снимок не меняется
+
+
+def test_rolled_back_write_does_not_rebuild(db):
+    catalog.current()
+    before = catalog._snapshot
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_book("Книга", "", None)
+            raise RuntimeError
+    assert catalog._snapshot is before and catalog.current() is before
+
+
+def test_change_from_other_process_is_noticed(db):
+    """Изменение из другого процесса видно по версии каталога."""
+    catalog.current()
+    conn = sqlite3.connect(config.DB_FILE)
+    with conn:
+        conn.execute("INSERT INTO books (title, description) VALUES ('Чужая', '')")
+    conn.close()
+    assert [book.title for book in catalog.current().books] == ["Чужая"]
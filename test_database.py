@@ -0,0 +1,254 @@
+"""
+Тесты слоя базы данных (bot/database.py).
+
+Каждый тест работает с отдельным файлом SQLite во временном каталоге.
+"""
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from bot import config, database
+
+
+def test_wal_mode_enabled(db):
+    """База переводится в режим WAL при инициализации."""
+    with db._manager.read() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode.lower() == "wal"
+
+
+def test_connections_are_reused(db):
+    """Повторные чтения используют одно и то же соединение из пула."""
+    with db._manager.read() as first:
+        pass
+    with db._manager.read() as second:
+        pass
+    assert first is second
+
+
+def test_readers_are_read_only(db):
+    """Соединения для чтения не могут изменять данные."""
+    with db._manager.read() as conn:
+        with pytest.raises(Exception):
+            conn.execute("INSERT INTO allowed_users (telegram_user_id) VALUES (1)")
+
+
+def test_failed_write_is_rolled_back(db):
+    """Ошибка внутри транзакции записи откатывает изменения."""
+    with pytest.raises(RuntimeError):
+        with db._manager.write() as conn:
+            conn.execute("INSERT INTO allowed_users (telegram_user_id) VALUES (42)")
+            raise RuntimeError("boom")
+    assert not db.is_allowed_user(42)
+
+
+def test_books_and_chapters_roundtrip(db):
+    """Книги и главы сохраняются и читаются обратно."""
+    book_id = db.add_book("Книга", "Описание", None)
+    chapter_id = db.add_chapter(book_id, "Глава 1", "Текст главы")
+    book = db.get_book_detail(book_id)
+    assert book["title"] == "Книга"
+    assert book["chapters"] == [{"id": chapter_id, "title": "Глава 1"}]
+    chapter = db.get_chapter_detail(book_id, chapter_id)
+    assert chapter["content"] == "Текст главы"
+    assert db.get_chapter_detail(book_id, chapter_id + 1) is None
+
+
+def test_concurrent_writers_from_threads(db):
+    """Записи из разных потоков сериализуются и не теряются."""
+    book_id = db.add_book("Книга", "", None)
+
+    def worker(n: int) -> None:
+        for i in range(20):
+            db.add_chapter(book_id, f"Глава {n}-{i}", "текст")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(db.get_book_detail(book_id)["chapters"]) == 80
+
+
+def test_books_summary_counts_and_pagination(db):
+    """Каталог возвращает число глав и поддерживает keyset‑пагинацию."""
+    ids = [db.add_book(f"Книга {i}", "", None) for i in range(5)]
+    for n, book_id in enumerate(ids):
+        for i in range(n):
+            db.add_chapter(book_id, f"Глава {i}", "текст")
+
+    books = db.get_books_summary()
+    assert [b["chapter_count"] for b in books] == [0, 1, 2, 3, 4]
+    assert "chapters" not in books[0]
+
+    page = db.get_books_summary(include_chapters=True, after=ids[1], limit=2)
+    assert [b["id"] for b in page] == ids[2:4]
+    assert [len(b["chapters"]) for b in page] == [2, 3]
+    assert db.get_books_summary(after=ids[-1], limit=2) == []
+
+
+def test_search_ranks_and_highlights(db):
+    """Поиск находит книги и главы, выделяет совпадения и ранжирует по BM25."""
+    book_id = db.add_book("Война и мир", "Роман‑эпопея", None)
+    first = db.add_chapter(book_id, "Глава 1", "Князь Андрей смотрел на небо.")
+    second = db.add_chapter(book_id, "Небо", "Высокое небо над Аустерлицем.")
+
+    found = db.search("небо")
+    assert found["total"] == 2
+    assert found["results"][0]["chapterId"] == second
+    assert {r["chapterId"] for r in found["results"]} == {first, second}
+    assert "<mark>небо</mark>" in found["results"][1]["snippet"]
+
+    assert db.search("войн")["results"][0]["chapterId"] is None
+    assert db.search('"AND (')["total"] == 0
+    assert len(db.search("небо", limit=1, offset=1)["results"]) == 1
+
+
+def test_legacy_database_is_migrated(tmp_path, monkeypatch):
+    """База старого формата (без schema_version) доводится до актуальной схемы."""
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                            description TEXT, cover_url TEXT);
+        CREATE TABLE chapters (id INTEGER PRIMARY KEY AUTOINCREMENT, book_id INTEGER NOT NULL,
+                               title TEXT NOT NULL, content TEXT);
+        CREATE TABLE allowed_users (telegram_user_id INTEGER PRIMARY KEY);
+        INSERT INTO books (title, description) VALUES ('Книга', 'Описание');
+        INSERT INTO chapters (book_id, title, content) VALUES (1, 'Первая', 'Редкое слово');
+        INSERT INTO chapters (book_id, title, content) VALUES (1, 'Вторая', 'Текст');
+        """
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(config, "DB_FILE", str(path))
+    try:
+        database.init_db()
+        assert database.get_schema_version() == len(database._MIGRATIONS)
+        assert database.search("редкое")["total"] == 1
+        assert database.get_chapter_detail(1, 1)["content"] == "Редкое слово"
+        with database._manager.read() as conn:
+            positions = conn.execute("SELECT position FROM chapters ORDER BY id").fetchall()
+        assert [p[0] for p in positions] == [1, 2]
+        # Повторный запуск ничего не ломает.
+        database.init_db()
+        assert database.search("редкое")["total"] == 1
+    finally:
+        database.close_connections()
+
+
+def test_chapter_positions(db):
+    """Новые главы получают следующую позицию внутри своей книги."""
+    first = db.add_book("Первая", "", None)
+    second = db.add_book("Вторая", "", None)
+    db.add_chapter(first, "А", "")
+    db.add_chapter(second, "Б", "")
+    db.add_chapter(first, "В", "")
+    with db._manager.read() as conn:
+        rows = conn.execute("SELECT book_id, position FROM chapters ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [(first, 1), (second, 1), (first, 2)]
+
+
+def test_hot_queries_use_indexes(db):
+    """Ни один запрос горячего пути не сканирует таблицу целиком."""
+    book_id = db.add_book("Книга", "Описание", None)
+    chapter_id = db.add_chapter(book_id, "Глава", "Текст")
+    db.add_allowed_user(1)
+
+    statements = []
+    with db._manager.read() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        db.get_books_summary(include_chapters=True, after=0, limit=10)
+        db.get_book_detail(book_id)
+        db.get_chapter_detail(book_id, chapter_id)
+        db.get_chapter_page(book_id, chapter_id, 1)
+        db.is_allowed_user(1)
+    finally:
+        with db._manager.read() as conn:
+            conn.set_trace_callback(None)
+
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+    assert len(selects) >= 6
+    with db._manager.read() as conn:
+        for sql in selects:
+            plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            for detail in plan:
+                assert not (detail.startswith("SCAN") and "VIRTUAL TABLE" not in detail), (sql, plan)
+                assert "TEMP B-TREE" not in detail, (sql, plan)
+
+
+def test_chapters_stored_compressed(db):
+    """Текст главы хранится сжатым, а длины сохраняются отдельно."""
+    text = "Длинный абзац текста. " * 500
+    book_id = db.add_book("Книга", "", None)
+    chapter_id = db.add_chapter(book_id, "Глава", text)
+    with db._manager.read() as conn:
+        row = conn.execute(
+            "SELECT content, content_encoding, length(content_z) AS size, "
+            "content_bytes, content_chars FROM chapters WHERE id = ?",
+            (chapter_id,),
+        ).fetchone()
+    assert row["content"] == "" and row["content_encoding"] == "zlib"
+    assert row["size"] * 5 < row["content_bytes"]
+    assert row["content_chars"] == len(text)
+    assert db.get_chapter_detail(book_id, chapter_id)["content"] == text
+
+
+def test_plain_chapters_are_migrated(db, monkeypatch):
+    """Главы, сохранённые без сжатия, сжимаются при инициализации."""
+    monkeypatch.setattr(config, "CHAPTER_COMPRESSION", "none")
+    book_id = db.add_book("Книга", "", None)
+    chapter_id = db.add_chapter(book_id, "Глава", "старый текст")
+    with db._manager.read() as conn:
+        assert conn.execute("SELECT content FROM chapters").fetchone()[0] == "старый текст"
+
+    monkeypatch.setattr(config, "CHAPTER_COMPRESSION", "zlib")
+    db.init_db()
+    with db._manager.read() as conn:
+        encoding = conn.execute("SELECT content_encoding FROM chapters").fetchone()[0]
+    assert encoding == "zlib"
+    assert db.get_chapter_detail(book_id, chapter_id)["content"] == "старый текст"
+    assert db.search("старый")["total"] == 1
+
+
+@pytest.mark.parametrize("codec", ["zlib", "none"])
+def test_chapter_pages(db, monkeypatch, codec):
+    """Длинная глава делится на страницы по абзацам и читается постранично."""
+    monkeypatch.setattr(config, "CHAPTER_COMPRESSION", codec)
+    monkeypatch.setattr(config, "CHAPTER_PAGE_CHARS", 100)
+    paragraphs = [f"Абзац {i}: " + "слово " * 10 for i in range(20)]
+    text = "\n\n".join(paragraphs)
+    book_id = db.add_book("Книга", "", None)
+    chapter_id = db.add_chapter(book_id, "Глава", text)
+
+    detail = db.get_chapter_detail(book_id, chapter_id)
+    pages = [db.get_chapter_page(book_id, chapter_id, n) for n in range(1, detail["pages"] + 1)]
+    assert detail["pages"] > 1
+    assert "".join(p["content"] for p in pages) == text
+    assert all(len(p["content"]) <= 100 for p in pages)
+    assert pages[1]["content"].startswith("Абзац")
+    assert db.get_chapter_page(book_id, chapter_id, detail["pages"] + 1) is None
+
+
+def test_database_from_sql_script_is_migrated(tmp_path, monkeypatch):
+    """База, созданная скриптом create_tables.sql, проходит миграции."""
+    path = tmp_path / "script.db"
+    script = os.path.join(os.path.dirname(__file__), "create_tables.sql")
+    conn = sqlite3.connect(path)
+    with open(script, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.close()
+    monkeypatch.setattr(config, "DB_FILE", str(path))
+    try:
+        database.init_db()
+        book = database.get_book_detail(1)
+        assert [c["title"] for c in book["chapters"]] == ["Глава 1", "Глава 2"]
+        assert database.get_chapter_detail(1, 2)["content"] == "Содержимое второй главы..."
+        assert database.is_allowed_user(793857218)
+    finally:
+        database.close_connections()
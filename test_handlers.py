@@ -0,0 +1,87 @@
+"""
+Тесты обработчиков бота (bot/handlers.py) на поддельных объектах Update.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from bot import database, handlers, tribute
+
+
+def make_update(user_id: int, text: str = "") -> SimpleNamespace:
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id, first_name="Тест"),
+        message=SimpleNamespace(text=text, reply_text=AsyncMock()),
+    )
+
+
+def test_start_for_unsubscribed_user(db, monkeypatch):
+    """Пользователь без подписки не получает кнопку каталога."""
+    monkeypatch.setattr(tribute, "lookup_upstream_async", AsyncMock(return_value=0))
+    update = make_update(5)
+    asyncio.run(handlers.start(update, SimpleNamespace(user_data={})))
+    assert "reply_markup" not in update.message.reply_text.call_args.kwargs
+
+
+def test_slow_write_does_not_delay_other_users(db, monkeypatch):
+    """Медленная запись главы не задерживает /start другого пользователя."""
+    book_id = db.add_book("Книга", "", None)
+    db.add_allowed_user(2)
+    original_add_chapter = database.add_chapter
+
+    def slow_add_chapter(*args):
+        time.sleep(0.5)  # имитация долгого fsync
+        return original_add_chapter(*args)
+
+    monkeypatch.setattr(database, "add_chapter", slow_add_chapter)
+
+    async def scenario() -> float:
+        admin = make_update(1, "Текст главы")
+        admin_context = SimpleNamespace(
+            user_data={"chapter_book_id": book_id, "chapter_title": "Глава"}
+        )
+        writer = asyncio.create_task(handlers.chapter_content(admin, admin_context))
+        await asyncio.sleep(0.05)  # запись уже идёт
+
+        reader = make_update(2)
+        started = time.perf_counter()
+        await handlers.start(reader, SimpleNamespace(user_data={}))
+        latency = time.perf_counter() - started
+
+        await writer
+        assert "reply_markup" in reader.message.reply_text.call_args.kwargs
+        assert "добавлена" in admin.message.reply_text.call_args.args[0]
+        return latency
+
+    latency = asyncio.run(scenario())
+    assert latency < 0.2, f"/start ждал {latency:.3f} с"
+
+
+def test_start_rate_limited(db, monkeypatch):
+    """Частые /start одного пользователя получают вежливый отказ без проверки подписки."""
+    from bot import ratelimit
+
+    monkeypatch.setattr(handlers, "_command_limiter", ratelimit.MemoryLimiter())
+    monkeypatch.setitem(ratelimit.RULES, "command", ratelimit.Limit(rate=0.001, burst=2))
+    lookup = AsyncMock(return_value=0)
+    monkeypatch.setattr(tribute, "lookup_upstream_async", lookup)
+    updates = [make_update(42) for _ in range(3)]
+    for update in updates:
+        asyncio.run(handlers.start(update, SimpleNamespace(user_data={})))
+    assert "Слишком много запросов" in updates[2].message.reply_text.call_args.args[0]
+    assert "Слишком много запросов" not in updates[1].message.reply_text.call_args.args[0]
+
+
+def test_add_chapter_lists_books(db):
+    """Кнопка добавления главы предлагает выбрать одну из существующих книг."""
+    first = db.add_book("Первая", "", None)
+    second = db.add_book("Вторая", "", None)
+    query = SimpleNamespace(answer=AsyncMock(), edit_message_text=AsyncMock())
+    update = SimpleNamespace(callback_query=query)
+    state = asyncio.run(handlers.add_chapter_entry(update, SimpleNamespace(user_data={})))
+    assert state == handlers.CHOOSE_BOOK
+    keyboard = query.edit_message_text.call_args.kwargs["reply_markup"].inline_keyboard
+    buttons = {row[0].text: row[0].callback_data for row in keyboard}
+    assert buttons == {"Первая": f"choose_book_{first}", "Вторая": f"choose_book_{second}"}
@@ -0,0 +1,120 @@
+"""
+Тесты HTTP‑клиента с пулом соединений и автоматом отключения (bot/httpclient.py).
+"""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bot import httpclient
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_and_recovers():
+    """После серии ошибок вызовы отклоняются, затем пропускается пробный."""
+    clock = Clock()
+    breaker = httpclient.CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()  # пробный вызов
+    assert not breaker.allow()  # только один
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.snapshot()["opened_total"] == 2
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+@pytest.fixture()
+def stub():
+    """Сервер с keep‑alive: первые ``failures`` ответов — 503."""
+    state = {"failures": 0, "requests": 0, "connections": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            state["requests"] += 1
+            state["connections"].add(self.client_address)
+            if state["failures"] > 0:
+                state["failures"] -= 1
+                status, body = 503, b"busy"
+            else:
+                status, body = 200, b'{"result": []}'
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(cls, **kwargs):
+    breaker = httpclient.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    return cls(breaker, retries=2, backoff=0.001, **kwargs)
+
+
+def test_connections_are_reused(stub):
+    """Повторные запросы идут по одному соединению."""
+    client = make_client(httpclient.HTTPClient)
+    for _ in range(5):
+        assert client.get(stub["url"]).status_code == 200
+    assert stub["requests"] == 5 and len(stub["connections"]) == 1
+    client.close()
+
+
+def test_retry_then_fail_fast(stub):
+    """Ошибки 5xx повторяются; после порога автомат отключает вызовы."""
+    client = make_client(httpclient.HTTPClient)
+    stub["failures"] = 2
+    assert client.get(stub["url"]).status_code == 200
+    assert stub["requests"] == 3
+
+    stub["failures"] = 100
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.get(stub["url"])
+    before = stub["requests"]
+    with pytest.raises(httpclient.CircuitOpenError):
+        client.get(stub["url"])
+    assert stub["requests"] == before
+    assert client.breaker.snapshot()["state"] == "open"
+
+
+def test_async_client_retries(stub):
+    client = make_client(httpclient.AsyncHTTPClient)
+    stub["failures"] = 1
+
+    async def scenario():
+        response = await client.get(stub["url"])
+        body = await response.aread()
+        await response.aclose()
+        await client.aclose()
+        return response.status_code, body
+
+    assert asyncio.run(scenario()) == (200, b'{"result": []}')
+    assert stub["requests"] == 2
@@ -0,0 +1,151 @@
+"""
+Тесты импорта книг (bot/importer.py).
+"""
+
+import gc
+import time
+import warnings
+import zipfile
+
+import pytest
+
+from bot import importer
+
+
+FB2 = """<?xml version="1.0" encoding="utf-8"?>
+<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0">
+  <description>
+    <title-info>
+      <book-title>Тестовая книга</book-title>
+      <annotation><p>Краткое описание.</p></annotation>
+    </title-info>
+  </description>
+  <body>
+    <title><p>Тестовая книга</p></title>
+    <section>
+      <title><p>Часть первая</p></title>
+      <section><title><p>Глава 1</p></title><p>Первый абзац.</p><p>Второй абзац.</p></section>
+      <section><p>Безымянная глава.</p></section>
+    </section>
+    <section><title><p>Глава 2</p></title><p>Текст второй главы.</p></section>
+  </body>
+  <body name="notes"><section><title><p>1</p></title><p>Сноска.</p></section></body>
+</FictionBook>
+"""
+
+
+def test_fb2_import(db, tmp_path):
+    """FB2 разбирается на главы, сноски пропускаются."""
+    path = tmp_path / "book.fb2"
+    path.write_text(FB2, encoding="utf-8")
+    book_id, count = importer.import_book(str(path))
+    book = db.get_book_detail(book_id)
+    assert book["title"] == "Тестовая книга"
+    assert book["description"] == "Краткое описание."
+    assert [c["title"] for c in book["chapters"]] == ["Глава 1", "Часть первая", "Глава 2"]
+    assert count == 3
+    first = db.get_chapter_detail(book_id, book["chapters"][0]["id"])
+    assert first["content"] == "Первый абзац.\n\nВторой абзац."
+
+
+def test_fb2_part_introduction_precedes_chapters(db, tmp_path):
+    """Вступление части идёт перед её главами, а не после них."""
+    path = tmp_path / "nested.fb2"
+    path.write_text(FB2.replace(
+        "<title><p>Часть первая</p></title>",
+        "<title><p>Часть первая</p></title><p>Вступление.</p>",
+    ), encoding="utf-8")
+    book_id, count = importer.import_book(str(path))
+    book = db.get_book_detail(book_id)
+    assert [c["title"] for c in book["chapters"]] == ["Часть первая", "Глава 1", "Часть первая", "Глава 2"]
+    assert count == 4
+    intro = db.get_chapter_detail(book_id, book["chapters"][0]["id"])
+    assert intro["content"] == "Вступление."
+
+
+def test_epub_import(db, tmp_path):
+    """EPUB читается в порядке spine, заголовок главы берётся из h1."""
+    path = tmp_path / "book.epub"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("mimetype", "application/epub+zip")
+        zf.writestr(
+            "META-INF/container.xml",
+            '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf"/></rootfiles></container>',
+        )
+        zf.writestr(
+            "OEBPS/content.opf",
+            '<package xmlns="http://www.idpf.org/2007/opf" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            "<metadata><dc:title>Электронная книга</dc:title></metadata>"
+            '<manifest><item id="a" href="a.xhtml"/><item id="b" href="text/b.xhtml"/></manifest>'
+            '<spine><itemref idref="b"/><itemref idref="a"/></spine></package>',
+        )
+        zf.writestr("OEBPS/a.xhtml", "<html><body><h1>Вторая</h1><p>Текст&nbsp;А</p></body></html>")
+        zf.writestr("OEBPS/text/b.xhtml", "<html><head><title>x</title></head><body><p>Без заголовка</p></body></html>")
+    book_id, count = importer.import_book(str(path))
+    book = db.get_book_detail(book_id)
+    assert book["title"] == "Электронная книга"
+    assert [c["title"] for c in book["chapters"]] == ["Глава 1", "Вторая"]
+
+
+def test_markdown_file_and_folder(db, tmp_path):
+    """Markdown‑файл делится по заголовкам, папка — по файлам."""
+    md = tmp_path / "single.md"
+    md.write_text("# Книга\n\nвступление\n\n## Один\nтекст 1\n\n## Два\nтекст 2\n", encoding="utf-8")
+    book_id, _ = importer.import_book(str(md))
+    book = db.get_book_detail(book_id)
+    assert book["title"] == "Книга"
+    assert [c["title"] for c in book["chapters"]] == ["single", "Один", "Два"]
+
+    folder = tmp_path / "Моя книга"
+    folder.mkdir()
+    (folder / "10.md").write_text("# Десятая\nтекст", encoding="utf-8")
+    (folder / "2.md").write_text("без заголовка", encoding="utf-8")
+    book_id, _ = importer.import_book(str(folder))
+    book = db.get_book_detail(book_id)
+    assert book["title"] == "Моя книга"
+    assert [c["title"] for c in book["chapters"]] == ["2", "Десятая"]
+
+
+def test_failed_import_leaves_no_book(db, tmp_path):
+    """Ошибка разбора посреди файла откатывает всю книгу."""
+    path = tmp_path / "broken.fb2"
+    path.write_text(FB2.replace("</FictionBook>", "<section>"), encoding="utf-8")
+    with pytest.raises(Exception):
+        importer.import_book(str(path))
+    assert db.get_books_summary() == []
+
+
+def test_failed_import_closes_file(db, tmp_path):
+    """Файл и архив закрываются, даже если разбор упал."""
+    broken_header = tmp_path / "header.fb2"
+    broken_header.write_text("<FictionBook><description>", encoding="utf-8")
+    broken_body = tmp_path / "body.fb2"
+    broken_body.write_text(FB2.replace("</FictionBook>", "<section>"), encoding="utf-8")
+    archive = tmp_path / "book.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("book.fb2", "<FictionBook><description>")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        for path in (broken_header, broken_body, archive):
+            with pytest.raises(Exception):
+                importer.import_book(str(path))
+        gc.collect()
+    assert [w for w in caught if issubclass(w.category, ResourceWarning)] == []
+
+
+def test_large_import_is_fast(db, tmp_path):
+    """300 глав импортируются одной транзакцией за считанные секунды."""
+    sections = "".join(
+        f"<section><title><p>Глава {i}</p></title>" + "<p>Абзац текста главы.</p>" * 200 + "</section>"
+        for i in range(300)
+    )
+    path = tmp_path / "big.fb2"
+    path.write_text(FB2.replace('<body name="notes">', f"<body>{sections}</body><body name=\"notes\">"), encoding="utf-8")
+    reported = []
+    started = time.perf_counter()
+    book_id, count = importer.import_book(str(path), title="Большая", progress=reported.append)
+    assert time.perf_counter() - started < 10
+    assert count == 303
+    assert reported[-1] == 303
+    assert db.get_book_detail(book_id)["title"] == "Большая"
@@ -0,0 +1,45 @@
+"""
+Тесты потокового разбора JSON (bot/jsonstream.py).
+"""
+
+import json
+
+import pytest
+
+from bot import jsonstream
+
+DOCUMENT = {
+    "total": 3,
+    "result": [
+        {"telegramUserId": 1, "status": "active", "name": "Ёж \"колючий\""},
+        {"telegramUserId": 22, "price": 1.5e3, "tags": [True, None, False]},
+        12345,
+    ],
+    "nextCursor": "abc",
+    "meta": {"result": [0]},
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 10_000])
+def test_items_across_chunk_boundaries(chunk_size):
+    """Элементы и числа, разрезанные между кусками, собираются правильно."""
+    raw = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode()
+    chunks = [raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)]
+    extra = {}
+    assert list(jsonstream.iter_array(chunks, "result", extra)) == DOCUMENT["result"]
+    assert extra == {"total": 3, "nextCursor": "abc", "meta": {"result": [0]}}
+
+
+def test_items_are_returned_as_soon_as_complete():
+    """Элемент отдаётся сразу, не дожидаясь конца документа."""
+    parser = jsonstream.ArrayStreamParser("result")
+    assert parser.feed(b'{"result": [{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}, 3') == [{"b": 2}]
+    assert parser.feed(b"4]}") == [34]
+    assert parser.close() == []
+
+
+@pytest.mark.parametrize("raw", [b'{"result": [1, 2', b'{"result": [1 2]}', b'[1, 2]', b'{"result": [1]} x'])
+def test_malformed_input(raw):
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_array([raw], "result"))
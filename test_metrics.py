@@ -0,0 +1,123 @@
+"""
+Тесты метрик в формате Prometheus (bot/metrics.py).
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from bot import config, database, metrics
+
+
+def _value(text, line_start):
+    lines = [line for line in text.splitlines() if line.startswith(line_start)]
+    assert len(lines) == 1, lines
+    return float(lines[0].rsplit(" ", 1)[1])
+
+
+def test_histogram_and_counter_rendering():
+    """Гистограмма выводится накопительными корзинами, суммой и количеством."""
+    histogram = metrics.Histogram("test_latency_seconds", "Test.", ("name",), buckets=(0.1, 1.0))
+    counter = metrics.Counter("test_events_total", "Test.", ("kind",))
+    try:
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, 'a"b')
+        counter.inc("x")
+        counter.inc("x", amount=2)
+        text = metrics.render()
+    finally:
+        del metrics.REGISTRY["test_latency_seconds"], metrics.REGISTRY["test_events_total"]
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert _value(text, 'test_latency_seconds_bucket{name="a\\"b",le="0.1"}') == 1
+    assert _value(text, 'test_latency_seconds_bucket{name="a\\"b",le="1.0"}') == 2
+    assert _value(text, 'test_latency_seconds_bucket{name="a\\"b",le="+Inf"}') == 3
+    assert _value(text, 'test_latency_seconds_count{name="a\\"b"}') == 3
+    assert _value(text, 'test_latency_seconds_sum{name="a\\"b"}') == pytest.approx(5.55)
+    assert _value(text, 'test_events_total{kind="x"}') == 3
+
+
+def test_endpoint_reports_routes_queries_and_caches(client, monkeypatch):
+    """/metrics содержит время маршрутов, запросов к базе и попадания в кэш."""
+    book_id = database.add_book("Книга", "", None)
+    for _ in range(3):
+        client.get("/api/books")
+    client.get(f"/api/book/{book_id}/chapter/999")
+
+    monkeypatch.setattr(config, "OPERATOR_TOKEN", "ops")
+    response = client.get("/metrics", headers={"Authorization": "Bearer ops"})
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert _value(text, 'http_request_duration_seconds_count{endpoint="api_books",method="GET",status="200"}') >= 3
+    assert _value(text, 'http_request_duration_seconds_count{endpoint="api_chapter",method="GET",status="404"}') >= 1
+    assert _value(text, 'db_call_duration_seconds_count{function="add_book"}') >= 1
+    assert _value(text, 'db_call_duration_seconds_count{function="get_catalog_version"}') >= 3
+    assert _value(text, 'cache_requests_total{cache="catalog_snapshot",result="hit"}') >= 2
+    assert 'upstream_circuit_state{upstream="tribute",pid="' in text
+
+
+def test_operator_endpoints_need_token(client, monkeypatch):
+    """Служебные эндпоинты скрыты без OPERATOR_TOKEN и требуют его в заголовке."""
+    for path in ("/metrics", "/api/tribute/status"):
+        assert client.get(path).status_code == 404
+    monkeypatch.setattr(config, "OPERATOR_TOKEN", "ops")
+    for path in ("/metrics", "/api/tribute/status"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers={"Authorization": "Bearer other"}).status_code == 401
+        assert client.get(path, headers={"Authorization": "Bearer ops"}).status_code == 200
+
+
+def test_shared_snapshots_are_added_up(client, tmp_path, monkeypatch):
+    """Метрики других процессов из общего каталога суммируются, датчики — по pid."""
+    monkeypatch.setattr(metrics, "_shared_dir", str(tmp_path))
+    monkeypatch.setattr(metrics, "_role", "test")
+    client.get("/api/books")
+    own = metrics.collect()
+    key = ("api_books", "GET", "200")
+    own_count = sum(own["http_request_duration_seconds"]["values"][key][:-1])
+
+    other = metrics.snapshot()
+    other["http_request_duration_seconds"]["values"] = [[list(key), [0] * 14 + [5, 0, 2.5]]]
+    with open(tmp_path / "web-1.json", "w") as fh:
+        json.dump({"pid": 1, "metrics": other}, fh)
+    metrics.flush()
+    assert os.path.exists(tmp_path / f"test-{os.getpid()}.json")
+
+    merged = metrics.collect()
+    assert sum(merged["http_request_duration_seconds"]["values"][key][:-1]) == own_count + 5
+    states = merged["upstream_circuit_state"]["values"]
+    assert ("tribute", "1") in states and ("tribute", str(os.getpid())) in states
+
+
+def test_snapshots_of_exited_processes_are_removed(client, tmp_path, monkeypatch):
+    """Снимок завершившегося процесса удаляется и не попадает в сумму."""
+    monkeypatch.setattr(metrics, "_shared_dir", str(tmp_path))
+    monkeypatch.setattr(metrics, "_role", "test")
+    pid = os.fork()
+    if not pid:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    key = ("exited_worker", "GET", "200")
+    other = metrics.snapshot()
+    other["http_request_duration_seconds"]["values"] = [[list(key), [0] * 14 + [5, 0, 2.5]]]
+    stale = tmp_path / f"web-{pid}.json"
+    with open(stale, "w") as fh:
+        json.dump({"pid": pid, "metrics": other}, fh)
+
+    merged = metrics.collect()
+    assert key not in merged["http_request_duration_seconds"]["values"]
+    assert ("tribute", str(pid)) not in merged["upstream_circuit_state"]["values"]
+    assert not stale.exists()
+
+
+def test_timed_callback_records_outcome():
+    """Обёртка обработчика бота учитывает время и ошибки."""
+    async def failing(update, context):
+        raise RuntimeError("boom")
+
+    wrapped = metrics.timed_callback(failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(wrapped(None, None))
+    values = metrics.HANDLER_LATENCY.values()
+    assert sum(values[("failing", "error")][:-1]) >= 1
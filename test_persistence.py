@@ -0,0 +1,139 @@
+"""
+Тесты хранения состояния бота в SQLite (bot/persistence.py).
+"""
+
+import asyncio
+import json
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram.request import BaseRequest
+
+from bot import database, persistence
+
+
+class OfflineRequest(BaseRequest):
+    """Bot API без сети: нужен только getMe."""
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        result = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "test_bot"}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def make_update(bot, update_id, text, user_id=7):
+    message = {
+        "message_id": update_id,
+        "date": 0,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Админ"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+def build_application(store, seen):
+    async def begin(update, context):
+        context.user_data["title"] = "Война и мир"
+        return 1
+
+    async def finish(update, context):
+        seen.append((context.user_data.get("title"), update.message.text))
+        return ConversationHandler.END
+
+    application = (
+        Application.builder().token("1:TEST").request(OfflineRequest())
+        .get_updates_request(OfflineRequest()).persistence(store).build()
+    )
+    application.add_handler(ConversationHandler(
+        entry_points=[CommandHandler("addbook", begin)],
+        states={1: [MessageHandler(filters.TEXT & ~filters.COMMAND, finish)]},
+        fallbacks=[],
+        name="add_book",
+        persistent=True,
+    ))
+    return application
+
+
+def test_conversation_survives_restart(db):
+    """Диалог и user_data, начатые до перезапуска, продолжаются после него."""
+    seen = []
+
+    async def scenario():
+        first = build_application(persistence.SQLitePersistence(), seen)
+        async with first:
+            await first.process_update(make_update(first.bot, 1, "/addbook"))
+            await first.update_persistence()
+        # shutdown сбрасывает всё на диск
+
+        store = persistence.SQLitePersistence()
+        second = build_application(store, seen)
+        async with second:
+            # Данные пользователей не загружаются при старте.
+            assert dict(second.user_data) == {}
+            await second.process_update(make_update(second.bot, 2, "Описание"))
+            await second.update_persistence()
+
+    asyncio.run(scenario())
+    assert seen == [("Война и мир", "Описание")]
+    # Диалог завершён — его состояние удалено, user_data осталась.
+    assert database.get_bot_persistence("conversation:add_book") == {}
+    assert json.loads(database.get_bot_persistence("user", "7")["7"]) == {"title": "Война и мир"}
+
+
+def test_changes_are_written_in_one_batch(db, monkeypatch):
+    """Изменения за интервал пишутся одной транзакцией, пустые данные удаляются."""
+    batches = []
+    original = database.save_bot_persistence
+
+    def counting(changes):
+        batches.append(list(changes))
+        original(changes)
+
+    monkeypatch.setattr(database, "save_bot_persistence", counting)
+
+    async def scenario():
+        store = persistence.SQLitePersistence()
+        for user_id in range(500):
+            await store.refresh_user_data(user_id, {})
+        await asyncio.gather(*(store.update_user_data(user_id, {"n": user_id}) for user_id in range(500)))
+        await store.update_conversation("add_book", (1, 1), 2)
+        await asyncio.sleep(0.2)
+        await store.update_user_data(3, {})
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in batches] == [501, 1]
+    stored = database.get_bot_persistence("user")
+    assert len(stored) == 499 and "3" not in stored
+
+
+def test_user_data_loaded_lazily(db):
+    """user_data подгружается при первом обращении, без чтения всех пользователей."""
+    database.save_bot_persistence([("user", str(n), json.dumps({"n": n})) for n in range(2000)])
+
+    async def scenario():
+        store = persistence.SQLitePersistence()
+        assert await store.get_user_data() == {}
+        data = {}
+        await asyncio.gather(store.refresh_user_data(1234, data), store.refresh_user_data(1234, data))
+        data["extra"] = True
+        await store.refresh_user_data(1234, data)
+        # Пустые данные незагруженного пользователя не стирают сохранённые.
+        await store.update_user_data(99, {})
+        await store.flush()
+        return data
+
+    assert asyncio.run(scenario()) == {"n": 1234, "extra": True}
+    assert "99" in database.get_bot_persistence("user", "99")
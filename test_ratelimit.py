@@ -0,0 +1,88 @@
+"""
+Тесты ограничения частоты запросов (bot/ratelimit.py).
+"""
+
+import pytest
+
+from bot import ratelimit
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    clock = FakeClock()
+    if request.param == "memory":
+        return ratelimit.MemoryLimiter(clock=clock), clock
+    return ratelimit.SQLiteLimiter(str(tmp_path / "limits.db"), clock=clock), clock
+
+
+def test_bucket_allows_burst_then_refills(limiter):
+    """Ведро пропускает burst запросов, затем пополняется со скоростью rate."""
+    limiter, clock = limiter
+    limit = ratelimit.Limit(rate=2.0, burst=3)
+    assert [limiter.acquire("k", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("k", limit) == pytest.approx(0.5)
+    assert limiter.acquire("other", limit) == 0.0
+    clock.now += 0.5
+    assert limiter.acquire("k", limit) == 0.0
+    assert limiter.acquire("k", limit) > 0
+    clock.now += 100
+    assert [limiter.acquire("k", limit) for _ in range(4)][-1] > 0  # не больше burst
+
+
+def test_sqlite_buckets_shared_between_instances(tmp_path):
+    """Вёдра в SQLite общие для всех процессов (экземпляров)."""
+    clock = FakeClock()
+    limit = ratelimit.Limit(rate=1.0, burst=2)
+    first = ratelimit.SQLiteLimiter(str(tmp_path / "limits.db"), clock=clock)
+    second = ratelimit.SQLiteLimiter(str(tmp_path / "limits.db"), clock=clock)
+    assert first.acquire("ip", limit) == 0.0
+    assert second.acquire("ip", limit) == 0.0
+    assert first.acquire("ip", limit) == pytest.approx(1.0)
+
+
+def test_memory_limiter_is_bounded():
+    """Таблица вёдер ограничена, вытесняются давно не использованные."""
+    limiter = ratelimit.MemoryLimiter(max_keys=2)
+    limit = ratelimit.Limit(rate=0.001, burst=1)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key, limit)
+    assert len(limiter._buckets) == 2 and "a" not in limiter._buckets
+
+
+@pytest.fixture()
+def client(client, monkeypatch):
+    monkeypatch.setitem(ratelimit.RULES, "api", ratelimit.Limit(rate=0.001, burst=5))
+    monkeypatch.setitem(ratelimit.RULES, "verify", ratelimit.Limit(rate=0.001, burst=2))
+    return client
+
+
+def test_verify_limited_per_ip_and_per_user(client):
+    """Перебор id с одного IP и запросы одного id с разных IP получают 429."""
+    ip = {"REMOTE_ADDR": "10.0.0.1"}
+    assert [client.get(f"/api/verify/{uid}", environ_base=ip).status_code for uid in (1, 2, 3)] == [200, 200, 429]
+    refused = client.get("/api/verify/4", environ_base=ip)
+    assert refused.headers["Retry-After"] == str(int(refused.get_json()["retry_after"]))
+    assert int(refused.headers["Retry-After"]) >= 1
+
+    statuses = [
+        client.get("/api/verify/77", environ_base={"REMOTE_ADDR": f"10.0.1.{n}"}).status_code for n in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+
+
+def test_api_limited_per_ip(client):
+    """Запросы к API ограничены по IP, статика и вебхуки — нет."""
+    ip = {"REMOTE_ADDR": "10.0.0.2"}
+    statuses = [client.get("/api/books", environ_base=ip).status_code for _ in range(6)]
+    assert statuses == [200] * 5 + [429]
+    assert client.get("/api/books", environ_base={"REMOTE_ADDR": "10.0.0.3"}).status_code == 200
+    assert client.get("/", environ_base=ip).status_code != 429
+    assert client.post("/webhooks/tribute", data=b"{}", environ_base=ip).status_code != 429
@@ -0,0 +1,337 @@
+"""
+Тесты HTTP API (bot/server.py) через тестовый клиент Flask.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import pytest
+
+from bot import config, database, tribute, verifier
+
+
+def test_books_pagination_link(client):
+    """Постраничный каталог отдаёт ссылку на следующую страницу."""
+    ids = [database.add_book(f"Книга {i}", "", None) for i in range(3)]
+
+    response = client.get("/api/books?limit=2")
+    assert [b["id"] for b in response.get_json()] == ids[:2]
+    assert f"after={ids[1]}" in response.headers["Link"]
+
+    response = client.get(f"/api/books?after={ids[1]}&limit=2")
+    assert [b["id"] for b in response.get_json()] == ids[2:]
+    assert "Link" not in response.headers
+
+
+def test_search_endpoint_pagination(client):
+    """Поиск отдаёт результаты постранично со смещением следующей страницы."""
+    book_id = database.add_book("Книга", "", None)
+    for i in range(3):
+        database.add_chapter(book_id, f"Глава {i}", "дракон")
+
+    data = client.get("/api/search?q=дракон&limit=2").get_json()
+    assert data["total"] == 3 and len(data["results"]) == 2
+    assert data["next_offset"] == 2
+    data = client.get("/api/search?q=дракон&limit=2&offset=2").get_json()
+    assert len(data["results"]) == 1 and data["next_offset"] is None
+
+
+def test_chapter_page_endpoint(client, monkeypatch):
+    """Глава отдаётся постранично с общим числом страниц."""
+    monkeypatch.setattr(config, "CHAPTER_PAGE_CHARS", 50)
+    book_id = database.add_book("Книга", "", None)
+    chapter_id = database.add_chapter(book_id, "Глава", "строка текста\n" * 20)
+
+    data = client.get(f"/api/book/{book_id}/chapter/{chapter_id}?page=2").get_json()
+    assert data["page"] == 2 and data["pages"] > 2
+    assert data["content"].startswith("строка")
+    assert client.get(f"/api/book/{book_id}/chapter/{chapter_id}?page=99").status_code == 404
+
+
+class FakeTribute:
+    """Поддельный отправитель вебхуков Tribute: подписывает тело ключом API."""
+
+    def __init__(self, client, key="test-key"):
+        self.client = client
+        self.key = key
+
+    def send(self, name, user_id, expires_in=3600, created_at=None, signature=None):
+        now = time.time()
+        body = json.dumps({
+            "name": name,
+            "created_at": self.iso(created_at if created_at is not None else now),
+            "payload": {"telegram_user_id": user_id, "expires_at": self.iso(now + expires_in)},
+        }).encode()
+        if signature is None:
+            signature = hmac.new(self.key.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            "/webhooks/tribute",
+            data=body,
+            headers={"trbt-signature": signature, "Content-Type": "application/json"},
+        ), body
+
+    @staticmethod
+    def iso(ts):
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+@pytest.fixture()
+def sender(client, monkeypatch):
+    monkeypatch.setattr(config, "TRIBUTE_API_KEY", "test-key")
+    verifier.invalidate()
+
+    def no_network(uid):
+        raise AssertionError("проверка не должна обращаться к Tribute")
+
+    monkeypatch.setattr(tribute, "lookup_upstream", no_network)
+    # Свежая синхронизация: промахи отвечаются из зеркала.
+    database.set_state({"tribute_last_sync_at": str(int(time.time()))})
+    return FakeTribute(client)
+
+
+def test_webhook_rejects_bad_signature(client, sender):
+    """Запрос без верной подписи отклоняется и ничего не меняет."""
+    response, _ = sender.send("new_subscription", 42, signature="0" * 64)
+    assert response.status_code == 401
+    response, _ = sender.send("new_subscription", 42, signature="é" * 64)
+    assert response.status_code == 401
+    assert database.get_tribute_subscription(42) is None
+
+
+def test_webhook_subscription_lifecycle(client, sender):
+    """Оформление, повтор доставки и отмена подписки через вебхук."""
+    assert not client.get("/api/verify/42").get_json()["subscribed"]
+
+    response, body = sender.send("new_subscription", 42)
+    assert response.get_json()["result"] == "applied"
+    # Ранее закэшированный отказ сброшен.
+    assert client.get("/api/verify/42").get_json()["subscribed"]
+
+    # Повторная доставка того же события безопасна.
+    replay = client.post(
+        "/webhooks/tribute",
+        data=body,
+        headers={"trbt-signature": hmac.new(b"test-key", body, hashlib.sha256).hexdigest()},
+    )
+    assert replay.get_json()["result"] == "duplicate"
+
+    response, _ = sender.send("cancelled_subscription", 42, created_at=time.time() + 1)
+    assert response.get_json()["result"] == "applied"
+    assert not client.get("/api/verify/42").get_json()["subscribed"]
+
+    # Запоздавшее старое событие не отменяет более новое.
+    sender.send("renewed_subscription", 42, created_at=time.time() - 600)
+    assert database.get_tribute_subscription(42)["status"] == "cancelled"
+
+
+def test_webhook_in_other_worker_clears_cache(client, sender, monkeypatch):
+    """Отмена, принятая другим воркером, сбрасывает кэш через версию подписок в базе."""
+    sender.send("new_subscription", 42)
+    assert client.get("/api/verify/42").get_json()["subscribed"]
+    # Другой воркер: локальный кэш этого процесса он не трогает.
+    monkeypatch.setattr(verifier, "invalidate", lambda user_id=None: None)
+    sender.send("cancelled_subscription", 42, created_at=time.time() + 1)
+    assert client.get("/api/verify/42").get_json()["subscribed"]  # до следующей проверки версии
+    monkeypatch.setattr(verifier._verifier, "_revision_interval", 0)
+    assert not client.get("/api/verify/42").get_json()["subscribed"]
+
+
+def test_webhook_ignores_other_events(client, sender):
+    response, _ = sender.send("new_donation", 42)
+    assert response.status_code == 200 and response.get_json()["result"] == "ignored"
+    bad = b'{"name": "new_subscription", "payload": {}}'
+    response = client.post(
+        "/webhooks/tribute",
+        data=bad,
+        headers={"trbt-signature": hmac.new(b"test-key", bad, hashlib.sha256).hexdigest()},
+    )
+    assert response.status_code == 400
+
+
+def test_conditional_get(client, monkeypatch):
+    """Повторный запрос с If-None-Match получает 304 без чтения текста главы."""
+    book_id = database.add_book("Книга", "", None)
+    chapter_id = database.add_chapter(book_id, "Глава", "текст")
+    urls = ["/api/books", f"/api/book/{book_id}", f"/api/book/{book_id}/chapter/{chapter_id}"]
+    etags = {}
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200 and response.headers["Cache-Control"] == "no-cache"
+        etags[url] = response.headers["ETag"]
+        assert not etags[url].startswith("W/")
+
+    def fail(*args):
+        raise AssertionError("содержимое не должно читаться")
+
+    with monkeypatch.context() as patched:
+        for name in ("get_chapter_detail", "get_book_detail", "get_books_summary"):
+            patched.setattr(database, name, fail)
+        for url in urls:
+            response = client.get(url, headers={"If-None-Match": etags[url]})
+            assert response.status_code == 304 and response.data == b""
+            assert response.headers["ETag"] == etags[url]
+
+    # Глава другой книги меняет версию каталога, но не эту книгу и главу.
+    database.add_chapter(database.add_book("Другая", "", None), "Глава", "текст")
+    changed = [client.get(url, headers={"If-None-Match": etags[url]}).status_code for url in urls]
+    assert changed == [200, 304, 304]
+
+    # Новая глава этой книги меняет книгу и ссылку nextChapterId старой главы.
+    second = database.add_chapter(book_id, "Глава 2", "ещё текст")
+    changed = [client.get(url, headers={"If-None-Match": etags[url]}).status_code for url in urls]
+    assert changed == [200, 200, 200]
+    assert client.get(urls[2]).get_json()["nextChapterId"] == second
+
+
+def test_chapter_batch(client, monkeypatch):
+    """Несколько глав за один запрос с prev/next для упреждающей загрузки."""
+    book_id = database.add_book("Книга", "", None)
+    ids = database.add_chapters(book_id, [(f"Глава {n}", f"текст {n}") for n in range(5)])
+    monkeypatch.setattr(config, "CHAPTER_BATCH_MAX", 3)
+
+    single = client.get(f"/api/book/{book_id}/chapter/{ids[0]}").get_json()
+    assert single["prevChapterId"] is None and single["nextChapterId"] == ids[1]
+
+    url = f"/api/book/{book_id}/chapters?ids={ids[3]},{ids[1]},999"
+    response = client.get(url)
+    chapters = response.get_json()["chapters"]
+    assert [c["chapterId"] for c in chapters] == [ids[1], ids[3]]
+    assert chapters[0] == client.get(f"/api/book/{book_id}/chapter/{ids[1]}").get_json()
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    chapters = client.get(f"/api/book/{book_id}/chapters?from={ids[2]}&count=50").get_json()["chapters"]
+    assert [c["chapterId"] for c in chapters] == ids[2:5]
+    assert chapters[-1]["nextChapterId"] is None and chapters[0]["prevChapterId"] == ids[1]
+    assert client.get(f"/api/book/{book_id}/chapters?from={ids[4]}&count=2").get_json()["chapters"][0]["content"] == "текст 4"
+
+    for bad in ("", "?ids=a", f"?ids={','.join(map(str, ids))}", "?from=x"):
+        assert client.get(f"/api/book/{book_id}/chapters{bad}").status_code == 400
+    assert client.get("/api/book/999/chapters?ids=1").status_code == 404
+
+
+def test_json_compression(client):
+    """Большие ответы API сжимаются, повторный запрос получает 304 по сжатому ETag."""
+    import gzip
+
+    book_id = database.add_book("Книга", "", None)
+    chapter_id = database.add_chapter(book_id, "Глава", "Длинный русский текст. " * 500)
+    url = f"/api/book/{book_id}/chapter/{chapter_id}"
+
+    plain = client.get(url)
+    assert "Content-Encoding" not in plain.headers
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers.getlist("Vary")
+    assert gzip.decompress(response.data) == plain.data
+    assert len(response.data) < len(plain.data) / 10
+    assert response.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    again = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304 and again.headers["ETag"] == response.headers["ETag"]
+
+    small = client.get(f"/api/book/{book_id}", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+
+def test_compressed_catalog_variants(client):
+    """Варианты /api/books (страница, главы) не получают чужое сжатое тело или ETag."""
+    import gzip
+
+    for n in range(30):
+        database.add_book(f"Книга {n}", "Описание " * 20, None)
+    gz = {"Accept-Encoding": "gzip"}
+
+    full = client.get("/api/books", headers=gz)
+    page = client.get("/api/books?limit=20", headers=gz)
+    assert full.headers["Content-Encoding"] == page.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(full.data))) == 30
+    assert len(json.loads(gzip.decompress(page.data))) == 20
+    assert page.headers["ETag"] != full.headers["ETag"]
+
+    with_chapters = client.get("/api/books?chapters=1", headers=gz)
+    assert all("chapters" in book for book in json.loads(gzip.decompress(with_chapters.data)))
+    assert with_chapters.headers["ETag"] != full.headers["ETag"]
+
+    stale = client.get("/api/books?limit=20", headers={**gz, "If-None-Match": full.headers["ETag"]})
+    assert stale.status_code == 200
+
+
+def test_precompressed_static_files(client, tmp_path):
+    """Статика отдаётся готовыми .gz‑файлами, неизвестные пути — index.html."""
+    import gzip
+
+    from bot import assets
+
+    dist = tmp_path / "dist"
+    (dist / "assets").mkdir(parents=True)
+    (dist / "assets" / "app.js").write_text("console.log('привет');\n" * 200)
+    (dist / "index.html").write_text("<html>" + "<p>страница</p>" * 200 + "</html>")
+    (dist / "logo.png").write_bytes(b"\x89PNG" + bytes(2000))
+    written = assets.precompress(str(dist))
+    assert sorted(os.path.basename(p) for p in written if p.endswith(".gz")) == ["app.js.gz", "index.html.gz"]
+    client.application.static_folder = str(dist)
+
+    response = client.get("/assets/app.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip" and response.mimetype == "text/javascript"
+    assert gzip.decompress(response.data) == (dist / "assets" / "app.js").read_bytes()
+    assert "Content-Encoding" not in client.get("/assets/app.js").headers
+
+    route = client.get("/books/1", headers={"Accept-Encoding": "gzip"})
+    assert route.status_code == 200 and route.mimetype == "text/html"
+    assert gzip.decompress(route.data) == (dist / "index.html").read_bytes()
+    assert "Content-Encoding" not in client.get("/logo.png", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_static_manifest_caching(client, tmp_path, monkeypatch):
+    """Статика отдаётся из манифеста: хэшированные файлы кэшируются навсегда, index.html — по ETag."""
+    from bot import assets
+
+    dist = tmp_path / "dist"
+    (dist / "assets").mkdir(parents=True)
+    (dist / "assets" / "index-BqK3x9aZ.js").write_text("console.log(1);")
+    (dist / "assets" / "big-Cd8fE2gH.js").write_text("x" * 5000)
+    (dist / "index.html").write_text("<html>книги</html>")
+    monkeypatch.setattr(config, "STATIC_PRELOAD_MAX", 1000)
+    client.application.static_folder = str(dist)
+    client.get("/")
+
+    # Мелкие файлы держатся в памяти, крупные читаются с диска; хэш в имени — признак неизменности.
+    manifest = assets.load_manifest(str(dist))
+    small, big = manifest.lookup("assets/index-BqK3x9aZ.js"), manifest.lookup("assets/big-Cd8fE2gH.js")
+    assert small.data == b"console.log(1);" and small.immutable
+    assert big.data is None and big.immutable
+    assert manifest.lookup("books/1") is manifest.index and not manifest.index.immutable
+
+    # После сканирования запросы не обращаются к диску за мелкими файлами.
+    def no_disk(*args, **kwargs):
+        raise AssertionError("disk access")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "stat", no_disk)
+        patched.setattr(os.path, "exists", no_disk)
+        hashed = client.get("/assets/index-BqK3x9aZ.js")
+        assert hashed.data == b"console.log(1);"
+        assert "immutable" in hashed.headers["Cache-Control"] and "max-age=31536000" in hashed.headers["Cache-Control"]
+
+        index = client.get("/")
+        assert index.headers["Cache-Control"] == "no-cache" and index.headers["ETag"]
+        route = client.get("/books/1/chapter/2", headers={"If-None-Match": index.headers["ETag"]})
+        assert route.status_code == 304 and route.headers["ETag"] == index.headers["ETag"]
+
+    big = client.get("/assets/big-Cd8fE2gH.js")
+    assert big.data == b"x" * 5000 and "immutable" in big.headers["Cache-Control"]
+    big.close()
+
+
+def test_brotli_preferred(client):
+    """Если установлен brotli, он предпочтительнее gzip."""
+    brotli = pytest.importorskip("brotli")
+    book_id = database.add_book("Книга", "", None)
+    chapter_id = database.add_chapter(book_id, "Глава", "Длинный русский текст. " * 500)
+    url = f"/api/book/{book_id}/chapter/{chapter_id}"
+    response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.data) == client.get(url).data
@@ -0,0 +1,124 @@
+"""
+Тесты токенов сессии веб‑приложения (bot/session.py, /api/session).
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+from bot import config, database, session, verifier
+
+BOT_TOKEN = "123456:TEST"
+
+
+def _init_data(user_id, auth_date=None, token=BOT_TOKEN):
+    """initData, подписанная так же, как это делает Telegram."""
+    fields = {
+        "query_id": "AAH",
+        "user": json.dumps({"id": user_id, "first_name": "Тест"}),
+        "auth_date": str(int(time.time() if auth_date is None else auth_date)),
+    }
+    check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret = hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+@pytest.fixture(autouse=True)
+def bot_token(monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", BOT_TOKEN)
+    monkeypatch.setattr(config, "SESSION_SECRET", "")
+
+
+@pytest.fixture()
+def client(client):
+    """Клиент без токена сессии: его выдаёт /api/session."""
+    del client.environ_base["HTTP_AUTHORIZATION"]
+    return client
+
+
+def test_validate_init_data():
+    """Подлинная initData принимается, подделанная и устаревшая — нет."""
+    fields = session.validate_init_data(_init_data(42))
+    assert fields["user"]["id"] == 42
+
+    with pytest.raises(ValueError):
+        session.validate_init_data(_init_data(42, token="654321:OTHER"))
+    with pytest.raises(ValueError):
+        session.validate_init_data(_init_data(42).replace("42", "43"))
+    with pytest.raises(ValueError):
+        session.validate_init_data(_init_data(42, auth_date=time.time() - config.INIT_DATA_MAX_AGE - 10))
+    with pytest.raises(ValueError):
+        session.validate_init_data("user=%7B%7D&auth_date=1")
+    with pytest.raises(ValueError):
+        session.validate_init_data(_init_data(42).rsplit("hash=", 1)[0] + "hash=%D1%85%D1%8D%D1%88")
+
+
+def test_token_expiry_and_tampering(monkeypatch):
+    """Токен живёт не дольше SESSION_TTL и подписки, подделка отклоняется."""
+    now = 1_000_000
+    token, expires_at = session.issue_token(7, math.inf, now=now)
+    assert expires_at == now + config.SESSION_TTL
+    assert session.verify_token(token, now=now)["uid"] == 7
+    assert session.verify_token(token, now=expires_at) is None
+
+    _, short = session.issue_token(7, now + 60, now=now)
+    assert short == now + 60
+
+    payload, _, signature = token.partition(".")
+    forged = session._b64encode(json.dumps({"uid": 8, "exp": expires_at}).encode())
+    assert session.verify_token(f"{forged}.{signature}", now=now) is None
+    assert session.verify_token(payload, now=now) is None
+    assert session.verify_token(f"{payload}.подпись", now=now) is None
+    assert session.verify_token(f"токен.{signature}", now=now) is None
+
+    # Без секрета и токена бота токены не выдаются и не принимаются.
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", "")
+    assert session.verify_token(token, now=now) is None
+    with pytest.raises(ValueError):
+        session.issue_token(7, math.inf)
+
+
+def test_session_endpoint(client, monkeypatch):
+    """/api/session проверяет подписку один раз, дальше достаточно токена."""
+    lookups = []
+
+    def expiry(uid):
+        lookups.append(uid)
+        return math.inf if uid == 42 else None
+
+    monkeypatch.setattr(verifier, "subscription_expiry", expiry)
+    book_id = database.add_book("Книга", "", None)
+
+    assert client.post("/api/session", json={}).status_code == 400
+    assert client.post("/api/session", json={"initData": _init_data(42, token="1:X")}).status_code == 401
+    not_hex = _init_data(42).rsplit("hash=", 1)[0] + "hash=%C3%A9"
+    assert client.post("/api/session", json={"initData": not_hex}).status_code == 401
+    response = client.post("/api/session", json={"initData": _init_data(7)})
+    assert response.status_code == 403 and response.get_json() == {"subscribed": False}
+
+    response = client.post("/api/session", json={"initData": _init_data(42)})
+    body = response.get_json()
+    assert body["subscribed"] and body["user_id"] == 42 and body["subscription_expires_at"] is None
+    assert lookups == [7, 42]
+
+    denied = client.get(f"/api/book/{book_id}")
+    assert denied.status_code == 401 and "Bearer" in denied.headers["WWW-Authenticate"]
+    non_ascii = {"Authorization": "Bearer jeton.signé"}
+    assert client.get(f"/api/book/{book_id}", headers=non_ascii).status_code == 401
+    headers = {"Authorization": f"Bearer {body['token']}"}
+    for _ in range(3):
+        assert client.get(f"/api/book/{book_id}", headers=headers).status_code == 200
+    assert lookups == [7, 42]
+
+
+def test_session_not_required(client, monkeypatch):
+    """SESSION_REQUIRED=0 оставляет эндпоинты открытыми."""
+    monkeypatch.setattr(config, "SESSION_REQUIRED", False)
+    book_id = database.add_book("Книга", "", None)
+    assert client.get(f"/api/book/{book_id}").status_code == 200
@@ -0,0 +1,157 @@
+"""
+Тесты локального зеркала подписчиков Tribute (bot/tribute.py).
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from bot import config, database, tribute
+
+
+def is_subscribed(uid: int) -> bool:
+    return tribute.subscription_expiry(uid) is not None
+
+
+def iso(offset: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + offset))
+
+
+def serve(monkeypatch, entries):
+    monkeypatch.setattr(tribute, "iter_subscribers", lambda: (entry for entry in entries))
+
+
+def test_sync_and_lookup(db, monkeypatch):
+    """После синхронизации проверка подписки не обращается к Tribute."""
+    serve(monkeypatch, [
+        {"telegramUserId": 1, "status": "active", "expireAt": iso(3600)},
+        {"telegramUserId": 2, "status": "active", "expireAt": iso(-3600)},
+        {"telegramUserId": 3, "status": "cancelled", "expireAt": iso(3600)},
+        # Несколько подписок одного пользователя: побеждает активная.
+        {"telegramUserId": 4, "status": "cancelled", "expireAt": iso(-10)},
+        {"telegramUserId": 4, "status": "active", "expireAt": iso(3600)},
+    ])
+    status = tribute.sync()
+    assert status["count"] == 4 and not status["stale"] and status["last_error"] is None
+
+    def no_network(uid):
+        raise AssertionError("не должно быть запроса к Tribute")
+
+    monkeypatch.setattr(tribute, "lookup_upstream", no_network)
+    assert [is_subscribed(uid) for uid in (1, 2, 3, 4, 5)] == [True, False, False, True, False]
+
+
+def test_sync_is_incremental_and_removes_missing(db, monkeypatch):
+    """Неизменённые строки не переписываются, пропавшие — удаляются."""
+    entries = [{"telegramUserId": n, "status": "active", "expireAt": iso(3600)} for n in range(100)]
+    serve(monkeypatch, entries)
+    started = int(time.time())
+    count, changed = database.sync_tribute_subscribers(tribute._entries(entries), started)
+    assert (count, changed) == (100, 100)
+
+    entries[0]["status"] = "cancelled"
+    del entries[-1]
+    count, changed = database.sync_tribute_subscribers(tribute._entries(entries), started)
+    assert (count, changed) == (99, 2)
+    assert database.get_tribute_subscription(99) is None
+    assert database.get_tribute_subscription(0)["status"] == "cancelled"
+
+
+def test_failed_sync_keeps_mirror(db, monkeypatch):
+    """Недоступный Tribute не стирает уже загруженные данные."""
+    serve(monkeypatch, [{"telegramUserId": 1, "status": "active", "expireAt": iso(3600)}])
+    tribute.sync()
+
+    def unreachable():
+        raise requests.ConnectionError("нет сети")
+        yield
+
+    monkeypatch.setattr(tribute, "iter_subscribers", unreachable)
+    status = tribute.sync()
+    assert status["last_error"] == "нет сети" and status["count"] == 1
+    assert is_subscribed(1)
+
+
+def test_stale_mirror_falls_back_to_tribute(db, monkeypatch):
+    """Без свежей синхронизации промах проверяется запросом к Tribute."""
+    monkeypatch.setattr(tribute, "lookup_upstream", lambda uid: 2**40 if uid == 7 else 0)
+    assert tribute.sync_status()["stale"]
+    assert is_subscribed(7)
+    assert not is_subscribed(8)
+
+
+@pytest.fixture()
+def stub(monkeypatch):
+    """Локальный HTTP‑сервер, отдающий список подписчиков страницами по курсору."""
+    pages = {
+        None: {"result": [{"telegramUserId": n, "status": "active", "expireAt": iso(3600)}
+                          for n in range(0, 500)], "nextCursor": "p2"},
+        "p2": {"result": [{"telegramUserId": n, "status": "active", "expireAt": iso(3600)}
+                          for n in range(500, 1000)], "nextCursor": None},
+    }
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            cursor = parse_qs(urlsplit(self.path).query).get("cursor", [None])[0]
+            requested.append(cursor)
+            body = json.dumps(pages[cursor]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass  # клиент закрыл соединение досрочно
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "TRIBUTE_API_URL", f"http://127.0.0.1:{server.server_port}/subscribers")
+    monkeypatch.setattr(config, "TRIBUTE_CHUNK_SIZE", 1024)
+    yield requested
+    server.shutdown()
+    server.server_close()
+
+
+def test_streaming_sync_follows_cursor(db, stub):
+    """Синхронизация читает ответ потоком и проходит по всем страницам."""
+    status = tribute.sync()
+    assert status["count"] == 1000 and status["last_error"] is None
+    assert stub == [None, "p2"]
+    assert database.get_tribute_subscription(999)["status"] == "active"
+
+
+def test_truncated_pagination_keeps_mirror(db, stub, monkeypatch):
+    """Обрыв пагинации на лимите страниц не удаляет подписчиков с непрочитанных страниц."""
+    assert tribute.sync()["count"] == 1000
+    monkeypatch.setattr(config, "TRIBUTE_MAX_PAGES", 1)
+    status = tribute.sync()
+    assert "truncated" in status["last_error"] and status["count"] == 1000
+    assert stub == [None, "p2", None]
+    assert database.get_tribute_subscription(999)["status"] == "active"
+
+
+def test_point_lookup_stops_early(db, stub):
+    """Поиск одного пользователя не запрашивает следующие страницы."""
+    assert tribute.lookup_upstream(10) > time.time()
+    assert stub == [None]
+    assert tribute.lookup_upstream(10_000) == 0
+    assert stub == [None, None, "p2"]
+
+
+def test_async_lookup_streams_pages(db, stub):
+    """Асинхронный поиск тоже читает поток и переходит по курсору."""
+    import asyncio
+
+    assert asyncio.run(tribute.lookup_upstream_async(750)) > time.time()
+    assert stub == [None, "p2"]
+    assert tribute.sync_status()["circuit"]["state"] == "closed"
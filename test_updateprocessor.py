@@ -0,0 +1,91 @@
+"""
+Тесты параллельной обработки обновлений с порядком внутри чата
+(bot/updateprocessor.py).
+"""
+
+import asyncio
+import time
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from bot import updateprocessor
+
+
+def make_update(update_id, chat_id):
+    user = User(chat_id, "Тест", False)
+    message = Message(update_id, None, Chat(chat_id, "private"), from_user=user, text="x")
+    return Update(update_id, message=message)
+
+
+async def process(processor, updates, work):
+    """Прогоняет обновления через processor так же, как это делает Application."""
+    async with processor:
+        await asyncio.gather(*(processor.process_update(u, work(u)) for u in updates))
+
+
+def test_same_chat_is_serialized_in_order():
+    """Обновления одного чата идут по очереди и в порядке поступления."""
+    processor = updateprocessor.ChatOrderedUpdateProcessor(8)
+    log, active = [], {}
+
+    async def work(update):
+        chat = update.effective_chat.id
+        active[chat] = active.get(chat, 0) + 1
+        assert active[chat] == 1
+        await asyncio.sleep(0.001 * (update.update_id % 3))
+        log.append((chat, update.update_id))
+        active[chat] -= 1
+
+    updates = [make_update(n, n % 4) for n in range(40)]
+    asyncio.run(process(processor, updates, work))
+    for chat in range(4):
+        assert [i for c, i in log if c == chat] == list(range(chat, 40, 4))
+    assert processor._chats == {}
+
+
+def test_slow_chat_does_not_block_others():
+    """Медленные обновления одного чата не задерживают другие чаты и не занимают все слоты."""
+    processor = updateprocessor.ChatOrderedUpdateProcessor(2)
+    finished = {}
+    started = time.perf_counter()
+
+    async def work(update):
+        await asyncio.sleep(0.2 if update.effective_chat.id == 1 else 0)
+        finished[update.update_id] = time.perf_counter() - started
+
+    updates = [make_update(n, 1) for n in range(5)] + [make_update(100 + n, 2 + n) for n in range(20)]
+    asyncio.run(process(processor, updates, work))
+    assert max(finished[100 + n] for n in range(20)) < 0.15
+    assert finished[4] >= 1.0
+
+
+def test_concurrency_limit():
+    """Одновременно выполняется не больше max_concurrent_updates обновлений."""
+    processor = updateprocessor.ChatOrderedUpdateProcessor(3)
+    peak = 0
+
+    async def work(update):
+        nonlocal peak
+        peak = max(peak, processor.current_concurrent_updates)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(process(processor, [make_update(n, n) for n in range(20)], work))
+    assert peak == 3 and processor.max_concurrent_updates == 3
+    with pytest.raises(ValueError):
+        updateprocessor.ChatOrderedUpdateProcessor(0)
+
+
+def test_failed_update_keeps_chat_backlog():
+    """Ошибка в обновлении не теряет следующие обновления того же чата."""
+    processor = updateprocessor.ChatOrderedUpdateProcessor(2)
+    done = []
+
+    async def work(update):
+        await asyncio.sleep(0.01)
+        if update.update_id == 0:
+            raise RuntimeError("сбой")
+        done.append(update.update_id)
+
+    asyncio.run(process(processor, [make_update(n, 1) for n in range(4)], work))
+    assert done == [1, 2, 3] and processor._chats == {}
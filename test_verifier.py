@@ -0,0 +1,140 @@
+"""
+Тесты кэша проверки подписки (bot/verifier.py).
+"""
+
+import threading
+import time
+
+from bot.verifier import Verifier
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_verifier(lookup, clock, max_size=100):
+    return Verifier(lookup, max_size=max_size, positive_max_ttl=3600, negative_ttl=30, clock=clock)
+
+
+def test_positive_results_expire_with_subscription():
+    """Положительный ответ живёт до окончания подписки."""
+    clock = Clock()
+    calls = []
+    verifier = make_verifier(lambda uid: calls.append(uid) or clock.now + 100, clock)
+    assert verifier.is_subscribed(1) and verifier.is_subscribed(1)
+    assert calls == [1]
+    clock.now += 101
+    verifier.is_subscribed(1)
+    assert calls == [1, 1]
+
+
+def test_negative_results_have_short_ttl():
+    """Отрицательный ответ кэшируется ненадолго."""
+    clock = Clock()
+    calls = []
+    verifier = make_verifier(lambda uid: calls.append(uid), clock)
+    assert not verifier.is_subscribed(1)
+    clock.now += 29
+    assert not verifier.is_subscribed(1)
+    clock.now += 2
+    verifier.is_subscribed(1)
+    assert calls == [1, 1]
+
+
+def test_cache_is_bounded_lru():
+    """Кэш ограничен по размеру и вытесняет давно не использованные записи."""
+    clock = Clock()
+    calls = []
+    verifier = make_verifier(lambda uid: calls.append(uid) or clock.now + 100, clock, max_size=2)
+    for uid in (1, 2, 1, 3, 1, 2):
+        verifier.is_subscribed(uid)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_concurrent_checks_share_one_lookup():
+    """Одновременные проверки одного пользователя выполняют один запрос."""
+    calls = []
+    release = threading.Event()
+
+    def slow_lookup(uid):
+        calls.append(uid)
+        release.wait(5)
+        return time.time() + 100
+
+    verifier = Verifier(slow_lookup, max_size=10, positive_max_ttl=3600, negative_ttl=30)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(verifier.is_subscribed(7)))
+        for _ in range(20)
+    ]
+    for t in threads:
+        t.start()
+    while verifier.coalesced < 19:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [7]
+    assert results == [True] * 20
+
+
+def test_invalidate_during_lookup_is_not_cached():
+    """Результат запроса, начатого до сброса кэша, не сохраняется."""
+    calls = []
+
+    def lookup(uid):
+        calls.append(uid)
+        verifier.invalidate(uid)  # например, администратор добавил подписчика
+        return None
+
+    verifier = make_verifier(lookup, Clock())
+    verifier.is_subscribed(1)
+    verifier.is_subscribed(1)
+    assert calls == [1, 1]
+
+
+def test_async_lookups_are_coalesced_with_threads():
+    """Асинхронная проверка делит кэш и single‑flight с потоковой."""
+    import asyncio
+
+    clock = Clock()
+    calls = []
+
+    async def async_lookup(uid):
+        calls.append(uid)
+        await asyncio.sleep(0.05)
+        return clock.now + 100
+
+    verifier = Verifier(
+        lambda uid: calls.append(("sync", uid)), max_size=10, positive_max_ttl=3600,
+        negative_ttl=30, clock=clock, async_lookup=async_lookup,
+    )
+
+    async def scenario():
+        return await asyncio.gather(*(verifier.is_subscribed_async(1) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [True] * 5
+    assert calls == [1]
+    assert verifier.is_subscribed(1) and calls == [1]
+
+
+def test_revision_change_clears_cache():
+    """Изменение версии данных сбрасывает кэш не чаще revision_interval."""
+    clock = Clock()
+    calls, revision = [], [1]
+    verifier = Verifier(
+        lambda uid: calls.append(uid) or clock.now + 1000, max_size=10, positive_max_ttl=3600,
+        negative_ttl=30, clock=clock, revision=lambda: revision[0], revision_interval=5,
+    )
+    verifier.is_subscribed(1)
+    revision[0] = 2
+    verifier.is_subscribed(1)
+    assert calls == [1]
+    clock.now += 5
+    verifier.is_subscribed(1)
+    verifier.is_subscribed(1)
+    assert calls == [1, 1]
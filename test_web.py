@@ -0,0 +1,78 @@
+"""
+Тесты запуска веб‑сервера под gunicorn (bot/web.py, bot/main.py).
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from bot import config, database, web
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_gunicorn_options_from_config(monkeypatch):
+    """Настройки gunicorn берутся из config."""
+    monkeypatch.setattr(config, "WEB_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "WEB_PORT", 9000)
+    monkeypatch.setattr(config, "WEB_WORKERS", 3)
+    monkeypatch.setattr(config, "WEB_THREADS", 2)
+    options = web.gunicorn_options()
+    assert options["bind"] == "127.0.0.1:9000"
+    assert options["workers"] == 3 and options["threads"] == 2
+    assert options["worker_class"] == "gthread"
+
+
+def test_workers_see_writes_from_other_processes(tmp_path, monkeypatch):
+    """Несколько воркеров отдают каталог и видят записи другого процесса."""
+    pytest.importorskip("gunicorn")
+    db_file = str(tmp_path / "web.db")
+    monkeypatch.setattr(config, "DB_FILE", db_file)
+    database.init_db()
+    database.add_book("Первая", "", None)
+
+    port = _free_port()
+    # gunicorn waits out the graceful timeout for idle keep-alive
+    # connections on shutdown, so keep it short here.
+    env = dict(
+        os.environ, DB_FILE=db_file, WEB_HOST="127.0.0.1", WEB_PORT=str(port),
+        WEB_WORKERS="2", WEB_GRACEFUL_TIMEOUT="3",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bot.main", "web"], env=env, cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                response = requests.get(base + "/api/books", timeout=1)
+                break
+            except requests.RequestException:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        assert [book["title"] for book in response.json()] == ["Первая"]
+
+        database.add_book("Вторая", "", None)
+        with requests.Session() as session:
+            for _ in range(10):
+                titles = [book["title"] for book in session.get(base + "/api/books", timeout=5).json()]
+                assert titles == ["Первая", "Вторая"]
+    finally:
+        process.terminate()
+        process.wait(30)
+        database.close_connections()
+    assert process.returncode == 0
@@ -0,0 +1,142 @@
+"""
+Тесты приёма обновлений Telegram через вебхук (bot/webhook.py).
+
+Запросы к Bot API перехватывает FakeRequest, сеть не нужна.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+from bot import config, webhook
+
+SECRET = "test-secret"
+PATH = "/telegram/webhook"
+
+
+class FakeRequest(BaseRequest):
+    """Bot API без сети: getMe и setWebhook отвечают сразу."""
+
+    def __init__(self, refuse_webhook=False):
+        self.calls = []
+        self.refuse_webhook = refuse_webhook
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        name = url.rsplit("/", 1)[1]
+        self.calls.append((name, request_data.parameters if request_data else {}))
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "test_bot"}
+        elif name == "setWebhook" and self.refuse_webhook:
+            return 400, json.dumps({"ok": False, "error_code": 400, "description": "bad webhook"}).encode()
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def build_application(request):
+    return Application.builder().token("1:TEST").request(request).get_updates_request(FakeRequest()).build()
+
+
+def update_body(update_id, user_id=5):
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Тест"},
+            "text": "/start",
+        },
+    }).encode()
+
+
+async def post(reader, writer, body, secret=SECRET, path=PATH):
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readuntil(b"\r\n\r\n")).split(b" ", 2)[1])
+    return status
+
+
+def test_webhook_delivers_updates_quickly():
+    """Обновления с верным секретом попадают в обработчики без задержки опроса."""
+    n = 200
+
+    async def scenario():
+        application = build_application(FakeRequest())
+        sent, handled = {}, {}
+        done = asyncio.Event()
+
+        async def record(update, context):
+            handled[update.update_id] = time.perf_counter()
+            if len(handled) == n:
+                done.set()
+
+        application.add_handler(TypeHandler(Update, record))
+        await application.initialize()
+        await application.start()
+        server = webhook.WebhookServer(application, PATH, SECRET)
+        await server.start("127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            assert await post(reader, writer, update_body(0), secret="wrong") == 403
+            assert await post(reader, writer, update_body(0), path="/other") == 404
+            assert await post(reader, writer, b"{not json") == 400
+            # Все запросы идут по одному keep‑alive соединению, как у Telegram.
+            for update_id in range(1, n + 1):
+                sent[update_id] = time.perf_counter()
+                assert await post(reader, writer, update_body(update_id)) == 200
+            await asyncio.wait_for(done.wait(), 10)
+            writer.close()
+        finally:
+            await server.stop()
+            await application.stop()
+            await application.shutdown()
+        return sorted(handled[i] - sent[i] for i in sent)
+
+    latencies = asyncio.run(scenario())
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"\nwebhook → handler: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    assert len(latencies) == n
+    assert p99 < 500
+
+
+def test_serve_sets_webhook_and_falls_back(monkeypatch):
+    """serve() регистрирует вебхук с секретом; при отказе Telegram возвращает False."""
+    monkeypatch.setattr(config, "WEBHOOK_URL", "https://example.com/telegram/webhook")
+    monkeypatch.setattr(config, "WEBHOOK_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "WEBHOOK_PORT", 0)
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", SECRET)
+
+    refusing = FakeRequest(refuse_webhook=True)
+    assert asyncio.run(webhook.serve(build_application(refusing))) is False
+
+    request = FakeRequest()
+
+    async def run_and_stop():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, stop.set)
+        return await webhook.serve(build_application(request), stop)
+
+    assert asyncio.run(run_and_stop()) is True
+    (params,) = [params for name, params in request.calls if name == "setWebhook"]
+    assert params["url"] == config.WEBHOOK_URL and params["secret_token"] == SECRET
@@ -43,33 +43,10 @@ router.beforeEach(async (to, from, next) => {
   }
 
   const authStore = useAuthStore()
-  
-  // Для Mini App получаем UID из Telegram WebApp
-  if (authStore.isTelegramReady && authStore.telegramUser?.id) {
-    const uid = authStore.telegramUser.id.toString()
-    
-    // Check subscription if not already checked
-    if (!authStore.subscriptionChecked) {
-      await authStore.checkSubscription(uid)
-    }
 
-    if (!authStore.isSubscribed) {
-      return next({ name: 'forbidden' })
-    }
-    
-    return next()
-  }
-  
-  // Fallback: Extract UID from query parameters
-  const uid = to.query.uid as string
-  if (!uid) {
-    return next({ name: 'forbidden' })
-  }
-
-  // Check subscription if not already checked
-  if (!authStore.subscriptionChecked) {
-    await authStore.checkSubscription(uid)
-  }
+  // Доступ даёт только токен сессии, полученный по initData из Telegram;
+  // uid в адресе больше ничего не открывает.
+  await authStore.checkSubscription()
 
   if (!authStore.isSubscribed) {
     return next({ name: 'forbidden' })
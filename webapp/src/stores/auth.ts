@@ -7,86 +7,102 @@ export const useAuthStore = defineStore('auth', () => {
   const isSubscribed = ref(false)
   const subscriptionChecked = ref(false)
   const loading = ref(false)
-  
-  const { user: telegramUser, isReady: isTelegramReady } = useTelegram()
-  
-  // Получаем UID из Telegram или из URL параметров
-  const currentUserId = computed(() => {
-    if (telegramUser.value?.id) {
-      console.log('Using Telegram user ID:', telegramUser.value.id)
-      return telegramUser.value.id.toString()
-    }
-    
-    // Fallback: получаем из URL параметров
-    const urlParams = new URLSearchParams(window.location.search)
-    const uidFromUrl = urlParams.get('uid') || ''
-    console.log('Using URL UID:', uidFromUrl)
-    return uidFromUrl
-  })
+  // Подписанный токен сессии из /api/session и время его истечения (с)
+  const token = ref<string | null>(null)
+  const expiresAt = ref(0)
+
+  const { webApp, user: telegramUser, isReady: isTelegramReady } = useTelegram()
+
+  // UID из Telegram; только для отображения, доступ даёт токен сессии
+  const currentUserId = computed(() => telegramUser.value?.id?.toString() || '')
+
+  let pending: Promise<void> | null = null
 
-  const checkSubscription = async (uid?: string) => {
-    // Если передан конкретный UID, используем его
-    if (uid) {
+  // Обмениваем initData Telegram на токен сессии.  Подписка проверяется
+  // только здесь, запросы к книгам и главам проверяют лишь токен.
+  const authenticate = () => {
+    if (pending) {
+      return pending
+    }
+    pending = (async () => {
+      // onMounted композиции не вызывается в хранилище, поэтому читаем и window
+      const initData = webApp.value?.initData || window.Telegram?.WebApp?.initData || ''
+      if (!initData) {
+        console.log('No Telegram initData available')
+        token.value = null
+        isSubscribed.value = false
+        subscriptionChecked.value = true
+        return
+      }
       loading.value = true
       try {
-        const response = await axios.get(`/api/verify/${uid}`)
-        isSubscribed.value = response.data.subscribed
+        const response = await axios.post('/api/session', { initData })
+        token.value = response.data.token
+        expiresAt.value = response.data.expires_at
+        isSubscribed.value = true
       } catch (error) {
-        console.error('Subscription check failed:', error)
+        console.error('Session request failed:', error)
+        token.value = null
         isSubscribed.value = false
       } finally {
         subscriptionChecked.value = true
         loading.value = false
       }
-      return
-    }
+    })().finally(() => {
+      pending = null
+    })
+    return pending
+  }
+
+  const hasValidToken = () => !!token.value && expiresAt.value > Date.now() / 1000 + 5
 
-    // Ждем инициализации Telegram WebApp
-    if (!isTelegramReady.value) {
-      console.log('Waiting for Telegram WebApp initialization...')
+  const checkSubscription = async () => {
+    if (subscriptionChecked.value && (!isSubscribed.value || hasValidToken())) {
       return
     }
+    await authenticate()
+  }
 
-    const userId = currentUserId.value
-    console.log('Checking subscription for user ID:', userId)
-    
-    if (!userId) {
-      console.log('No user ID available')
-      return
+  // Добавляем токен к запросам API; при 401 (токен истёк) получаем новый
+  // и повторяем запрос один раз.
+  axios.interceptors.request.use((config) => {
+    if (token.value && config.url?.startsWith('/api/') && config.url !== '/api/session') {
+      config.headers.Authorization = `Bearer ${token.value}`
     }
-    
-    if (subscriptionChecked.value) {
-      console.log('Subscription already checked')
-      return
+    return config
+  })
+  axios.interceptors.response.use(undefined, async (error) => {
+    const config = error.config
+    if (error.response?.status !== 401 || !config || config._retried || config.url === '/api/session') {
+      throw error
     }
-
-    loading.value = true
-    try {
-      const response = await axios.get(`/api/verify/${userId}`)
-      isSubscribed.value = response.data.subscribed
-    } catch (error) {
-      console.error('Subscription check failed:', error)
-      isSubscribed.value = false
-    } finally {
-      subscriptionChecked.value = true
-      loading.value = false
+    config._retried = true
+    token.value = null
+    await authenticate()
+    if (!token.value) {
+      throw error
     }
-  }
+    return axios(config)
+  })
 
   const reset = () => {
     isSubscribed.value = false
     subscriptionChecked.value = false
     loading.value = false
+    token.value = null
+    expiresAt.value = 0
   }
 
   return {
     isSubscribed,
     subscriptionChecked,
     loading,
+    token,
     currentUserId,
     telegramUser,
     isTelegramReady,
+    authenticate,
     checkSubscription,
     reset,
   }
-})
\ No newline at end of file
+})
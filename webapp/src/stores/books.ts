@@ -7,6 +7,7 @@ export interface Book {
   title: string
   description: string
   cover_url: string | null
+  chapter_count?: number
   chapters: Chapter[]
 }
 
@@ -14,8 +15,16 @@ export interface Chapter {
   id: number
   title: string
   content: string
+  page?: number
+  pages?: number
+  chapterId?: number
+  prevChapterId?: number | null
+  nextChapterId?: number | null
 }
 
+// Number of chapters fetched ahead of the reader in one request.
+const PREFETCH_COUNT = 3
+
 export const useBooksStore = defineStore('books', () => {
   const books = ref<Book[]>([])
   const currentBook = ref<Book | null>(null)
@@ -51,12 +60,38 @@ export const useBooksStore = defineStore('books', () => {
     }
   }
 
+  // Chapters fetched ahead of the reader, by "bookId:chapterId".
+  const prefetched = new Map<string, Chapter>()
+
+  const prefetchChapters = async (bookId: number, fromId: number) => {
+    if (prefetched.has(`${bookId}:${fromId}`)) return
+    try {
+      // One round trip for the next few chapters in reading order.
+      const response = await axios.get(`/api/book/${bookId}/chapters`, {
+        params: { from: fromId, count: PREFETCH_COUNT },
+      })
+      for (const chapter of response.data.chapters as Chapter[]) {
+        prefetched.set(`${bookId}:${chapter.chapterId}`, chapter)
+      }
+    } catch (err) {
+      console.warn('Failed to prefetch chapters:', err)
+    }
+  }
+
   const fetchChapter = async (bookId: number, chapterId: number) => {
-    loading.value = true
     error.value = null
+    const cached = prefetched.get(`${bookId}:${chapterId}`)
+    if (cached) {
+      prefetched.delete(`${bookId}:${chapterId}`)
+      currentChapter.value = cached
+      if (cached.nextChapterId) prefetchChapters(bookId, cached.nextChapterId)
+      return
+    }
+    loading.value = true
     try {
       const response = await axios.get(`/api/book/${bookId}/chapter/${chapterId}`)
       currentChapter.value = response.data
+      if (response.data.nextChapterId) prefetchChapters(bookId, response.data.nextChapterId)
     } catch (err) {
       error.value = 'Глава не найдена'
       console.error('Failed to fetch chapter:', err)